@@ -3,7 +3,11 @@ module segmentation_processor #(
     parameter INPUT_WIDTH = 224,
     parameter INPUT_HEIGHT = 224,
     parameter INPUT_CHANNELS = 3,
-    parameter NUM_CLASSES = 21
+    parameter NUM_CLASSES = 21,
+    // Network parameters
+    parameter ENCODER_STAGE1_CHANNELS = 64,
+    parameter ENCODER_STAGE2_CHANNELS = 128,
+    parameter ENCODER_STAGE3_CHANNELS = 256
 )(
     input wire clk,
     input wire rst,
@@ -12,11 +16,6 @@ module segmentation_processor #(
     output reg [7:0] output_buffer [0:INPUT_WIDTH*INPUT_HEIGHT-1],
     output reg done
 );
-    // Network parameters
-    localparam ENCODER_STAGE1_CHANNELS = 64;
-    localparam ENCODER_STAGE2_CHANNELS = 128;
-    localparam ENCODER_STAGE3_CHANNELS = 256;
-    
     // Processing states
     localparam IDLE = 3'd0;
     localparam PREPROCESS = 3'd1;
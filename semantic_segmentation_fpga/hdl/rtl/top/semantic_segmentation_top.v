@@ -25,11 +25,11 @@ module semantic_segmentation_top (
     output wire [9:0] leds
 );
 
-    // Network parameters
-    localparam INPUT_WIDTH = 224;
-    localparam INPUT_HEIGHT = 224;
-    localparam INPUT_CHANNELS = 3;
-    localparam NUM_CLASSES = 21; // For Pascal VOC dataset
+    // Network parameters (overridable for reduced-size simulation)
+    parameter INPUT_WIDTH = 224;
+    parameter INPUT_HEIGHT = 224;
+    parameter INPUT_CHANNELS = 3;
+    parameter NUM_CLASSES = 21; // For Pascal VOC dataset
     
     // Clock and reset signals
     wire sys_clk;
@@ -5,6 +5,9 @@ module tb_decoder;
     parameter INPUT_WIDTH = 16;
     parameter INPUT_HEIGHT = 16;
     parameter NUM_CLASSES = 21;
+    parameter STAGE1_CHANNELS = 64;
+    parameter STAGE2_CHANNELS = 128;
+    parameter STAGE3_CHANNELS = 256;
     
     // Testbench signals
     reg clk;
@@ -13,22 +16,25 @@ module tb_decoder;
     wire done;
     
     // Input bottleneck feature map
-    reg [15:0] bottleneck_feature_map [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*256-1];
+    reg [15:0] bottleneck_feature_map [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*STAGE3_CHANNELS-1];
     
     // Skip connections
-    reg [15:0] skip1 [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*64-1];
-    reg [15:0] skip2 [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*128-1];
-    reg [15:0] skip3 [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*256-1];
+    reg [15:0] skip1 [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*STAGE1_CHANNELS-1];
+    reg [15:0] skip2 [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*STAGE2_CHANNELS-1];
+    reg [15:0] skip3 [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*STAGE3_CHANNELS-1];
     
     // Output feature maps
-    wire [15:0] stage1_output [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*128-1];
-    wire [15:0] stage2_output [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*64-1];
+    wire [15:0] stage1_output [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*STAGE2_CHANNELS-1];
+    wire [15:0] stage2_output [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*STAGE1_CHANNELS-1];
     wire [15:0] stage3_output [0:INPUT_WIDTH*INPUT_HEIGHT*NUM_CLASSES-1];
     
     // DUT instantiation
     decoder #(
         .INPUT_WIDTH(INPUT_WIDTH/8),  // Start from bottleneck size
         .INPUT_HEIGHT(INPUT_HEIGHT/8),
+        .STAGE1_CHANNELS(STAGE1_CHANNELS),
+        .STAGE2_CHANNELS(STAGE2_CHANNELS),
+        .STAGE3_CHANNELS(STAGE3_CHANNELS),
         .NUM_CLASSES(NUM_CLASSES)
     ) dut (
         .clk(clk),
@@ -56,9 +62,9 @@ module tb_decoder;
         integer bottleneck_size, stage1_size, stage2_size, stage3_size;
         
         // Calculate sizes
-        bottleneck_size = (INPUT_WIDTH/8) * (INPUT_HEIGHT/8) * 256;
-        stage1_size = (INPUT_WIDTH/4) * (INPUT_HEIGHT/4) * 128;
-        stage2_size = (INPUT_WIDTH/2) * (INPUT_HEIGHT/2) * 64;
+        bottleneck_size = (INPUT_WIDTH/8) * (INPUT_HEIGHT/8) * STAGE3_CHANNELS;
+        stage1_size = (INPUT_WIDTH/4) * (INPUT_HEIGHT/4) * STAGE2_CHANNELS;
+        stage2_size = (INPUT_WIDTH/2) * (INPUT_HEIGHT/2) * STAGE1_CHANNELS;
         stage3_size = INPUT_WIDTH * INPUT_HEIGHT * NUM_CLASSES;
         
         // Initialize input with a simple pattern
@@ -110,13 +116,13 @@ module tb_decoder;
         integer i, j, c;
         integer stage1_size, stage2_size, stage3_size;
         real stage1_sum, stage2_sum, stage3_sum;
-        real class_sums[0:20]; // For 21 classes
+        real class_sums[0:NUM_CLASSES-1];
         integer max_class_idx;
         real max_class_val;
         begin
             // Calculate expected sizes
-            stage1_size = (INPUT_WIDTH/4) * (INPUT_HEIGHT/4) * 128;
-            stage2_size = (INPUT_WIDTH/2) * (INPUT_HEIGHT/2) * 64;
+            stage1_size = (INPUT_WIDTH/4) * (INPUT_HEIGHT/4) * STAGE2_CHANNELS;
+            stage2_size = (INPUT_WIDTH/2) * (INPUT_HEIGHT/2) * STAGE1_CHANNELS;
             stage3_size = INPUT_WIDTH * INPUT_HEIGHT * NUM_CLASSES;
             
             // Calculate average values to check for non-zero activation
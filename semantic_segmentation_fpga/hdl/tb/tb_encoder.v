@@ -5,6 +5,9 @@ module tb_encoder;
     parameter INPUT_WIDTH = 16;
     parameter INPUT_HEIGHT = 16;
     parameter INPUT_CHANNELS = 3;
+    parameter STAGE1_CHANNELS = 64;
+    parameter STAGE2_CHANNELS = 128;
+    parameter STAGE3_CHANNELS = 256;
     
     // Testbench signals
     reg clk;
@@ -14,20 +17,23 @@ module tb_encoder;
     
     // Input and output feature maps
     reg [15:0] input_feature_map [0:INPUT_WIDTH*INPUT_HEIGHT*INPUT_CHANNELS-1];
-    wire [15:0] stage1_output [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*64-1];
-    wire [15:0] stage2_output [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*128-1];
-    wire [15:0] stage3_output [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*256-1];
+    wire [15:0] stage1_output [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*STAGE1_CHANNELS-1];
+    wire [15:0] stage2_output [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*STAGE2_CHANNELS-1];
+    wire [15:0] stage3_output [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*STAGE3_CHANNELS-1];
     
     // Skip connections for later use in decoder
-    wire [15:0] skip1 [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*64-1];
-    wire [15:0] skip2 [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*128-1];
-    wire [15:0] skip3 [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*256-1];
+    wire [15:0] skip1 [0:(INPUT_WIDTH/2)*(INPUT_HEIGHT/2)*STAGE1_CHANNELS-1];
+    wire [15:0] skip2 [0:(INPUT_WIDTH/4)*(INPUT_HEIGHT/4)*STAGE2_CHANNELS-1];
+    wire [15:0] skip3 [0:(INPUT_WIDTH/8)*(INPUT_HEIGHT/8)*STAGE3_CHANNELS-1];
     
     // DUT instantiation
     encoder #(
         .INPUT_WIDTH(INPUT_WIDTH),
         .INPUT_HEIGHT(INPUT_HEIGHT),
-        .INPUT_CHANNELS(INPUT_CHANNELS)
+        .INPUT_CHANNELS(INPUT_CHANNELS),
+        .STAGE1_CHANNELS(STAGE1_CHANNELS),
+        .STAGE2_CHANNELS(STAGE2_CHANNELS),
+        .STAGE3_CHANNELS(STAGE3_CHANNELS)
     ) dut (
         .clk(clk),
         .rst(rst),
@@ -105,9 +111,9 @@ module tb_encoder;
         real stage1_sum, stage2_sum, stage3_sum;
         begin
             // Calculate expected sizes
-            stage1_size = (INPUT_WIDTH/2) * (INPUT_HEIGHT/2) * 64;
-            stage2_size = (INPUT_WIDTH/4) * (INPUT_HEIGHT/4) * 128;
-            stage3_size = (INPUT_WIDTH/8) * (INPUT_HEIGHT/8) * 256;
+            stage1_size = (INPUT_WIDTH/2) * (INPUT_HEIGHT/2) * STAGE1_CHANNELS;
+            stage2_size = (INPUT_WIDTH/4) * (INPUT_HEIGHT/4) * STAGE2_CHANNELS;
+            stage3_size = (INPUT_WIDTH/8) * (INPUT_HEIGHT/8) * STAGE3_CHANNELS;
             
             // Calculate average values to check for non-zero activation
             stage1_sum = 0;
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Golden-Vector Comparison of RTL Simulations against the NumPy Model
+
+Runs encoder_stage1, encoder or segmentation_processor under iverilog
+with known weights and inputs, dumps their buffers with $writememh when
+``done`` rises, and compares every buffer against golden_model.py.
+
+For each test case the harness:
+
+- writes the input frame with the image converter's resize and
+  $readmemh formatter (images) or a seeded random frame (--random)
+- generates a wrapper testbench that loads the weights from .memh files
+  into the kernel/bias memories of every stage, overriding the RTL's
+  $random initialization, and pulses ``start``
+- compiles it against the RTL it instantiates and runs vvp
+- reads the dumps (x/z words count as mismatches) and compares them with
+  the golden buffers in one vectorized pass per buffer
+
+The report lists, per buffer, the mismatching and unknown words and the
+maximum absolute error. For buffers with mismatches a heatmap PNG is
+written with the mismatch count per pixel, summed over channels. Test
+cases run concurrently, so full-frame checks of several inputs take
+about as long as the slowest one.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from run_regression import RTL_DIR, SIM_DIR, TB_DIR, dependencies, iverilog_version, module_index
+from sim_profiles import Profile, get_profile, parameter_value, read_hierarchy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+from cityscapes_data_converter import RESAMPLE_FILTERS, resize_image, save_memory_file
+from golden_model import (ENCODER_CHANNELS, NUM_CLASSES, load_weights, random_weights,
+                          read_memory_dump, run_network)
+
+# Spatial downscaling of each buffer relative to the input frame. Every
+# buffer is channel-major except scaled_input, which holds the frame as-is.
+BUFFER_SCALES = {
+    'scaled_input': 1,
+    'encoder_stage1_conv': 1, 'encoder_stage1': 2,
+    'encoder_stage2_conv': 2, 'encoder_stage2': 4,
+    'encoder_stage3_conv': 4, 'encoder_stage3': 8,
+    'bottleneck': 8,
+    'decoder_stage1': 4, 'decoder_stage2': 2,
+    'logits': 1, 'output_buffer': 1,
+}
+
+# Per DUT: weight memories (layer -> instance path), dumps (buffer -> signal path)
+DUTS = {
+    'encoder_stage1': {
+        'input': ('input_data', 16),
+        'weights': {'encoder_stage1': 'dut'},
+        'dumps': {'encoder_stage1_conv': 'dut.conv_output', 'encoder_stage1': 'dut.pool_output'},
+        'rtl_preprocess': False,
+    },
+    'encoder': {
+        'input': ('input_data', 16),
+        'weights': {f'encoder_stage{n}': f'dut.stage{n}_inst' for n in (1, 2, 3)},
+        'dumps': dict(kv for n in (1, 2, 3) for kv in ((f'encoder_stage{n}_conv', f'dut.stage{n}_conv'),
+                                                       (f'encoder_stage{n}', f'dut.stage{n}_output'))),
+        'rtl_preprocess': False,
+    },
+    'segmentation_processor': {
+        'input': ('input_buffer', 8),
+        'weights': {**{f'encoder_stage{n}': f'dut.encoder_inst.stage{n}_inst' for n in (1, 2, 3)},
+                    **{f'decoder_stage{n}': f'dut.decoder_inst.stage{n}_inst' for n in (1, 2, 3)}},
+        'dumps': {**{name: f'dut.{name}' for name in
+                     ('scaled_input', 'encoder_stage1', 'encoder_stage2', 'encoder_stage3',
+                      'bottleneck', 'decoder_stage1', 'decoder_stage2', 'logits', 'output_buffer')},
+                  **{f'encoder_stage{n}_conv': f'dut.encoder_inst.stage{n}_conv' for n in (1, 2, 3)}},
+        'rtl_preprocess': True,
+    },
+}
+
+TestCase = namedtuple('TestCase', ['name', 'dut', 'image'])
+BufferReport = namedtuple('BufferReport', ['buffer', 'words', 'mismatches', 'unknown',
+                                           'max_error', 'first_mismatch', 'heatmap'])
+CaseResult = namedtuple('CaseResult', ['name', 'dut', 'status', 'message', 'buffers', 'sim_time'])
+
+def wrapper_testbench(dut, weights, parameters, width, height, max_cycles):
+    """Verilog source of a testbench that loads weights, runs the DUT and dumps its buffers
+
+    ``parameters`` ({name: value}) are passed to the DUT instance.
+    """
+    spec = DUTS[dut]
+    port, bits = spec['input']
+    lines = ['`timescale 1ns/1ps', '', f'module golden_{dut};',
+             '    reg clk = 0;', '    reg rst = 1;', '    reg start = 0;', '    wire done;',
+             f'    reg [{bits - 1}:0] {port} [0:{width * height * 3 - 1}];', '']
+
+    for layer in spec['weights']:
+        kernel, bias = weights[layer]
+        lines.append(f'    reg [7:0] {layer}_kernel [0:{kernel.size - 1}];')
+        lines.append(f'    reg [7:0] {layer}_bias [0:{bias.size - 1}];')
+
+    overrides = ', '.join(f'.{name}({value})' for name, value in parameters.items())
+    lines += ['', f'    {dut} #({overrides}) dut (',
+              '        .clk(clk), .rst(rst), .start(start),',
+              f'        .{port}({port}),', '        .done(done)', '    );', '',
+              '    always #10 clk = ~clk;', '',
+              '    integer i, j, k, cycles;',
+              '    initial begin',
+              f'        $readmemh("input.memh", {port});']
+
+    for layer in spec['weights']:
+        lines += [f'        $readmemh("{layer}_kernel.memh", {layer}_kernel);',
+                  f'        $readmemh("{layer}_bias.memh", {layer}_bias);']
+    # Overwrite the $random weights after the DUT's own initial blocks
+    lines.append('        #1;')
+    for layer, path in spec['weights'].items():
+        kernel, bias = weights[layer]
+        in_ch, taps, out_ch = kernel.shape
+        lines += [f'        for (i = 0; i < {in_ch}; i = i + 1)',
+                  f'            for (j = 0; j < {taps}; j = j + 1)',
+                  f'                for (k = 0; k < {out_ch}; k = k + 1)',
+                  f'                    {path}.kernel[i][j][k] = {layer}_kernel[(i*{taps} + j)*{out_ch} + k];',
+                  f'        for (k = 0; k < {out_ch}; k = k + 1)',
+                  f'            {path}.bias[k] = {layer}_bias[k];']
+
+    lines += ['        repeat (4) @(posedge clk);', '        rst = 0;',
+              '        @(posedge clk);', '        start = 1;', '        @(posedge clk);',
+              '        start = 0;',
+              '        cycles = 0;',
+              f'        while (!done && cycles < {max_cycles}) begin',
+              '            @(posedge clk);', '            cycles = cycles + 1;', '        end',
+              '        if (!done)',
+              '            $display("TIMEOUT: done not asserted after %0d cycles", cycles);',
+              '        else',
+              '            $display("DONE after %0d cycles", cycles);']
+    for buffer, path in spec['dumps'].items():
+        lines.append(f'        $writememh("{buffer}.memh", {path});')
+    lines += ['        $finish;', '    end', 'endmodule', '']
+    return '\n'.join(lines)
+
+def compare_buffer(name, rtl_path, golden, width, height, heatmap_dir=None):
+    """Compare one dumped buffer against its golden values"""
+    values, known = read_memory_dump(rtl_path)
+    expected = np.asarray(golden, dtype=np.int64)
+    words = len(expected)
+
+    # Words the dump does not cover are unknown as well
+    actual = np.zeros(words, dtype=np.int64)
+    valid = np.zeros(words, dtype=bool)
+    count = min(words, len(values))
+    actual[:count] = values[:count]
+    valid[:count] = known[:count]
+
+    mismatch = ~valid | (actual != expected)
+    errors = np.where(valid, np.abs(actual - expected), 0)
+    unknown = int((~valid).sum())
+    mismatches = int(mismatch.sum())
+    first = int(np.argmax(mismatch)) if mismatches else None
+
+    heatmap = None
+    if mismatches and heatmap_dir:
+        scale = BUFFER_SCALES.get(name, 1)
+        h, w = height // scale, width // scale
+        if h * w and words % (h * w) == 0:
+            channels = words // (h * w)
+            if name == 'scaled_input':
+                counts = mismatch.reshape(h, w, channels).sum(axis=2)
+            else:
+                counts = mismatch.reshape(channels, h, w).sum(axis=0)
+            image = (counts * (255.0 / max(channels, 1))).astype(np.uint8)
+            zoom = max(1, 256 // max(h, w))
+            heatmap = os.path.join(heatmap_dir, f"{name}_mismatch.png")
+            Image.fromarray(image.repeat(zoom, axis=0).repeat(zoom, axis=1)).save(heatmap)
+
+    return BufferReport(name, words, mismatches, unknown, int(errors.max()) if words else 0,
+                        first, heatmap)
+
+def run_case(case, weights, profile, hierarchy, index, args):
+    """Simulate one test case and compare its dumps; returns a CaseResult"""
+    work_dir = os.path.join(args.sim_dir, 'golden', profile.name, case.name)
+    os.makedirs(work_dir, exist_ok=True)
+    width, height = profile.width, profile.height
+    spec = DUTS[case.dut]
+    parameters = {name: parameter_value(profile, case.dut, name)
+                  for name in hierarchy[0][case.dut]
+                  if parameter_value(profile, case.dut, name) is not None}
+
+    input_dtype = np.uint16 if spec['input'][1] == 16 else np.uint8
+    save_memory_file(case.image.ravel().astype(input_dtype), os.path.join(work_dir, 'input.memh'),
+                     'readmemh')
+    for layer in spec['weights']:
+        kernel, bias = weights[layer]
+        save_memory_file(kernel.view(np.uint8).ravel(),
+                         os.path.join(work_dir, f"{layer}_kernel.memh"), 'readmemh')
+        save_memory_file(bias.view(np.uint8), os.path.join(work_dir, f"{layer}_bias.memh"),
+                         'readmemh')
+
+    testbench = os.path.join(work_dir, f"golden_{case.dut}.v")
+    with open(testbench, 'w') as f:
+        f.write(wrapper_testbench(case.dut, weights, parameters, width, height, args.max_cycles))
+    executable = os.path.join(work_dir, 'sim.vvp')
+
+    start = time.perf_counter()
+    compiled = subprocess.run([args.iverilog, '-g2012', '-o', executable, *args.flags, testbench,
+                               *dependencies(testbench, index)], capture_output=True, text=True)
+    if compiled.returncode != 0:
+        return CaseResult(case.name, case.dut, 'compile_error', compiled.stdout + compiled.stderr,
+                          [], time.perf_counter() - start)
+    try:
+        simulated = subprocess.run([args.vvp, '-n', executable], cwd=work_dir,
+                                   capture_output=True, text=True, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        return CaseResult(case.name, case.dut, 'timeout', f"Timed out after {args.timeout}s", [],
+                          time.perf_counter() - start)
+    sim_time = time.perf_counter() - start
+    output = simulated.stdout + simulated.stderr
+    with open(os.path.join(work_dir, 'sim.log'), 'w') as f:
+        f.write(output)
+
+    golden = run_network(case.image, weights, profile.num_classes, spec['rtl_preprocess'])
+    reports = []
+    for buffer in spec['dumps']:
+        dump = os.path.join(work_dir, f"{buffer}.memh")
+        if not os.path.exists(dump):
+            return CaseResult(case.name, case.dut, 'failed', f"{buffer}.memh was not written",
+                              reports, sim_time)
+        reports.append(compare_buffer(buffer, dump, golden[buffer], width, height, work_dir))
+
+    if 'TIMEOUT' in output:
+        status, message = 'failed', 'done not asserted within --max-cycles'
+    elif any(r.mismatches for r in reports):
+        status, message = 'failed', f"{sum(r.mismatches > 0 for r in reports)} buffers differ"
+    else:
+        status, message = 'passed', ''
+    return CaseResult(case.name, case.dut, status, message, reports, sim_time)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare RTL simulation buffers against the bit-accurate golden model')
+
+    parser.add_argument('inputs', nargs='*', help='Input images (default: --random frames only)')
+    parser.add_argument('--dut', nargs='+', choices=sorted(DUTS), default=['encoder_stage1'],
+                        help='Designs to test (default: encoder_stage1)')
+    parser.add_argument('--random', type=int, default=0,
+                        help='Number of seeded random input frames (default: 1 without inputs)')
+    parser.add_argument('--size', type=int, nargs=2, default=[16, 16], metavar=('WIDTH', 'HEIGHT'),
+                        help='Frame size, a multiple of 8 (default: 16 16)')
+    parser.add_argument('--profile', help='Simulation profile from scripts/sim/profiles.json; '
+                             'sets the frame size, channel widths and class count')
+    parser.add_argument('--resample', choices=sorted(RESAMPLE_FILTERS), default='lanczos',
+                        help='Resampling filter for image inputs (default: lanczos)')
+    parser.add_argument('--weights', help='Weights .npz or weight_exporter.py output directory '
+                             '(default: random weights from --seed)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for random weights and frames')
+    parser.add_argument('--sim-dir', default=SIM_DIR,
+                        help='Work directory; cases go to <sim-dir>/golden (default: simulation)')
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='Test cases run concurrently (0 = all cores, default: 0)')
+    parser.add_argument('--timeout', type=float, default=3600,
+                        help='Simulation timeout per case in seconds (default: 3600)')
+    parser.add_argument('--max-cycles', type=int, default=1 << 30,
+                        help='Clock cycles to wait for done before dumping (default: 2^30)')
+    parser.add_argument('--flag', action='append', default=[], dest='flags',
+                        help='Extra iverilog argument (repeatable)')
+    parser.add_argument('--iverilog', default='iverilog', help='iverilog executable')
+    parser.add_argument('--vvp', default='vvp', help='vvp executable')
+    parser.add_argument('--json', help='Write the comparison report as JSON here')
+
+    args = parser.parse_args()
+
+    try:
+        if args.profile:
+            profile = get_profile(args.profile)
+        else:
+            profile = Profile(f"{args.size[0]}x{args.size[1]}", *args.size, ENCODER_CHANNELS,
+                              NUM_CLASSES)
+    except Exception as e:
+        print(f"Error processing profile {args.profile}: {e}")
+        sys.exit(1)
+    width, height = profile.width, profile.height
+    if width % 8 or height % 8:
+        print(f"Error: frame size {width}x{height} must be a multiple of 8")
+        sys.exit(1)
+    if iverilog_version(args.iverilog) is None:
+        print(f"Error: {args.iverilog} not found")
+        sys.exit(1)
+
+    try:
+        if args.weights:
+            weights = load_weights(args.weights, profile.num_classes, profile.channels)
+        else:
+            weights = random_weights(args.seed, num_classes=profile.num_classes,
+                                     channels=profile.channels)
+        images = [(os.path.splitext(os.path.basename(path))[0],
+                   resize_image(path, (width, height), args.resample)) for path in args.inputs]
+    except Exception as e:
+        print(f"Error processing inputs: {e}")
+        sys.exit(1)
+
+    rng = np.random.default_rng(args.seed)
+    for index in range(args.random or (0 if images else 1)):
+        images.append((f"random{index}", rng.integers(0, 256, (height, width, 3), dtype=np.uint8)))
+
+    index = module_index(RTL_DIR)
+    hierarchy = read_hierarchy(RTL_DIR, TB_DIR)
+    cases = [TestCase(f"{dut}_{name}", dut, image) for dut in args.dut for name, image in images]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs or os.cpu_count()) as executor:
+        futures = [executor.submit(run_case, case, weights, profile, hierarchy, index, args)
+                   for case in cases]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            print(f"{result.status.upper():<14}{result.name:<40}{result.sim_time:8.2f}s  "
+                  f"{result.message if result.status != 'compile_error' else 'Compilation failed'}")
+            if result.status == 'compile_error':
+                print(result.message)
+            for report in result.buffers:
+                location = '' if report.first_mismatch is None else f"first at {report.first_mismatch}"
+                print(f"    {report.buffer:<22}{report.mismatches:>9}/{report.words:<9} "
+                      f"unknown {report.unknown:<9} max error {report.max_error:<7}{location}")
+    wall_time = time.perf_counter() - start
+
+    passed = sum(r.status == 'passed' for r in results)
+    print(f"{passed}/{len(results)} cases match the golden model ({profile.name}) "
+          f"in {wall_time:.2f}s")
+
+    if args.json:
+        report = {'profile': profile.name, 'size': [width, height],
+                  'channels': list(profile.channels), 'wall_time_s': round(wall_time, 3),
+                  'cases': [{'name': r.name, 'dut': r.dut, 'status': r.status,
+                             'message': r.message, 'sim_time_s': round(r.sim_time, 3),
+                             'buffers': [b._asdict() for b in r.buffers]} for r in results]}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if passed == len(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Parallel Regression Runner for the Icarus Verilog Testbenches
+
+Discovers hdl/tb/tb_*.v, compiles every testbench against only the RTL
+files it instantiates (directly or through other modules), and runs the
+simulations concurrently, each with its own working directory and a
+timeout. A compiled .vvp is reused while the hash of its sources and
+compiler options is unchanged.
+
+A test fails when compilation fails, vvp exits non-zero or times out,
+or the simulation prints a line matching FAIL_PATTERN. Results can be
+written as JUnit XML (for CI) and JSON, with wall-clock times per test.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+RTL_DIR = os.path.join(PROJECT_DIR, 'hdl', 'rtl')
+TB_DIR = os.path.join(PROJECT_DIR, 'hdl', 'tb')
+SIM_DIR = os.path.join(PROJECT_DIR, 'simulation')
+
+CACHE_NAME = '.regression_cache.json'
+
+# Simulation output lines that mark a failed check
+FAIL_PATTERN = re.compile(r'^\s*(ERROR|FAIL)', re.M)
+
+TestResult = namedtuple('TestResult', ['name', 'status', 'compile_time', 'run_time', 'cached',
+                                       'message', 'output'])
+
+def _strip_comments(source):
+    return re.sub(r'/\*.*?\*/|//[^\n]*', '', source, flags=re.S)
+
+def module_index(rtl_dir=RTL_DIR):
+    """{module name: defining file} for every .v file under rtl_dir"""
+    index = {}
+    for root, _, files in os.walk(rtl_dir):
+        for file in sorted(files):
+            if file.endswith('.v'):
+                path = os.path.join(root, file)
+                with open(path) as f:
+                    for name in re.findall(r'\bmodule\s+(\w+)', _strip_comments(f.read())):
+                        index[name] = path
+    return index
+
+def dependencies(testbench, index):
+    """RTL files needed by a testbench, following module instantiations"""
+    needed, pending, seen = [], [testbench], set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with open(path) as f:
+            source = _strip_comments(f.read())
+        # An instantiation is a known module name followed by #( or an instance name
+        for name in re.findall(r'\b(\w+)\s*(?:#\s*\(|\w+\s*\()', source):
+            if name in index and index[name] not in seen:
+                pending.append(index[name])
+        if path != testbench:
+            needed.append(path)
+    return sorted(needed)
+
+def iverilog_version(iverilog='iverilog'):
+    """First line of ``iverilog -V``, part of the compile cache key"""
+    try:
+        output = subprocess.run([iverilog, '-V'], capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    return output.splitlines()[0] if output else ''
+
+def source_hash(files, flags, version):
+    """Hash of the source contents, compiler flags and compiler version"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([flags, version]).encode())
+    for path in files:
+        with open(path, 'rb') as f:
+            digest.update(path.encode() + b'\0' + f.read())
+    return digest.hexdigest()
+
+def load_cache(sim_dir):
+    try:
+        with open(os.path.join(sim_dir, CACHE_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, sim_dir):
+    path = os.path.join(sim_dir, CACHE_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def run_test(testbench, index, sim_dir, cache, flags=(), timeout=600, iverilog='iverilog',
+             vvp='vvp', version=None, profile=None, hierarchy=None):
+    """Compile (unless cached) and simulate one testbench; returns a TestResult
+
+    Each test runs in ``sim_dir/<name>`` (``sim_dir/<profile>/<name>`` with
+    a profile from sim_profiles.py) so VCD and other output files of
+    concurrent tests do not collide.
+    """
+    name = os.path.splitext(os.path.basename(testbench))[0]
+    work_dir = os.path.join(sim_dir, *([profile.name] if profile else []), name)
+    os.makedirs(work_dir, exist_ok=True)
+    executable = os.path.join(work_dir, f"{name}.vvp")
+
+    sources = [testbench] + dependencies(testbench, index)
+    flags = list(flags)
+    if profile:
+        # Imported here: sim_profiles needs NumPy and imports this module
+        from sim_profiles import iverilog_overrides
+        profile_flags, defparam_file = iverilog_overrides(profile, name, hierarchy, work_dir)
+        flags += profile_flags
+        sources += [defparam_file] if defparam_file else []
+    key = source_hash(sources, flags, version)
+    cache_name = f"{profile.name}/{name}" if profile else name
+    cached = cache.get(cache_name) == key and os.path.exists(executable)
+
+    compile_time = 0.0
+    if not cached:
+        start = time.perf_counter()
+        compiled = subprocess.run([iverilog, '-g2012', '-s', name, '-o', executable,
+                                   *flags, *sources], capture_output=True, text=True)
+        compile_time = time.perf_counter() - start
+        if compiled.returncode != 0:
+            cache.pop(cache_name, None)
+            return TestResult(name, 'compile_error', compile_time, 0.0, False,
+                              'Compilation failed', compiled.stdout + compiled.stderr)
+        cache[cache_name] = key
+
+    start = time.perf_counter()
+    try:
+        simulated = subprocess.run([vvp, '-n', executable], cwd=work_dir, capture_output=True,
+                                   text=True, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout.decode(errors='replace') if isinstance(e.stdout, bytes) else (e.stdout or '')
+        return TestResult(name, 'timeout', compile_time, time.perf_counter() - start, cached,
+                          f"Timed out after {timeout}s", output)
+    run_time = time.perf_counter() - start
+    output = simulated.stdout + simulated.stderr
+
+    with open(os.path.join(work_dir, f"{name}.log"), 'w') as f:
+        f.write(output)
+
+    if simulated.returncode != 0:
+        return TestResult(name, 'failed', compile_time, run_time, cached,
+                          f"vvp exited with {simulated.returncode}", output)
+    failure = FAIL_PATTERN.search(output)
+    if failure:
+        line = output[failure.start():].splitlines()[0].strip()
+        return TestResult(name, 'failed', compile_time, run_time, cached, line, output)
+    return TestResult(name, 'passed', compile_time, run_time, cached, '', output)
+
+def write_junit(results, path, wall_time):
+    """Write results as a JUnit XML test suite"""
+    failures = sum(r.status in ('failed', 'timeout') for r in results)
+    errors = sum(r.status == 'compile_error' for r in results)
+    suite = ET.Element('testsuite', name='rtl_regression', tests=str(len(results)),
+                       failures=str(failures), errors=str(errors), time=f"{wall_time:.3f}")
+    for result in results:
+        case = ET.SubElement(suite, 'testcase', classname='hdl.tb', name=result.name,
+                             time=f"{result.compile_time + result.run_time:.3f}")
+        if result.status == 'compile_error':
+            ET.SubElement(case, 'error', message=result.message).text = result.output
+        elif result.status != 'passed':
+            ET.SubElement(case, 'failure', message=result.message).text = result.output
+        ET.SubElement(case, 'system-out').text = result.output
+    ET.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
+
+def write_json(results, path, wall_time):
+    """Write results (without simulation output) as JSON"""
+    report = {'wall_time_s': round(wall_time, 3),
+              'tests': [{key: (round(value, 3) if isinstance(value, float) else value)
+                         for key, value in result._asdict().items() if key != 'output'}
+                        for result in results]}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compile and run the Icarus Verilog testbenches in parallel')
+
+    parser.add_argument('tests', nargs='*',
+                        help='Testbench names or substrings to run (default: all tb_*.v)')
+    parser.add_argument('--tb-dir', default=TB_DIR, help='Testbench directory (default: hdl/tb)')
+    parser.add_argument('--rtl-dir', default=RTL_DIR, help='RTL directory (default: hdl/rtl)')
+    parser.add_argument('--sim-dir', default=SIM_DIR,
+                        help='Build and output directory (default: simulation)')
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='Tests run concurrently (0 = all cores, default: 0)')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Simulation timeout per test in seconds (default: 600)')
+    parser.add_argument('--flag', action='append', default=[], dest='flags',
+                        help='Extra iverilog argument, e.g. --flag=-DSMALL (repeatable)')
+    parser.add_argument('--profile',
+                        help='Simulation profile from scripts/sim/profiles.json, e.g. tiny')
+    parser.add_argument('--iverilog', default='iverilog', help='iverilog executable')
+    parser.add_argument('--vvp', default='vvp', help='vvp executable')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the compile cache')
+    parser.add_argument('--junit', help='Write a JUnit XML report here')
+    parser.add_argument('--json', help='Write a JSON report here')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Print the simulation output of failed tests')
+
+    args = parser.parse_args()
+
+    testbenches = sorted(os.path.join(args.tb_dir, file) for file in os.listdir(args.tb_dir)
+                         if file.startswith('tb_') and file.endswith('.v'))
+    if args.tests:
+        testbenches = [tb for tb in testbenches
+                       if any(pattern in os.path.basename(tb) for pattern in args.tests)]
+    if not testbenches:
+        print(f"No testbenches found in {args.tb_dir}")
+        sys.exit(1)
+
+    version = iverilog_version(args.iverilog)
+    if version is None:
+        print(f"Error: {args.iverilog} not found")
+        sys.exit(1)
+
+    profile = hierarchy = None
+    if args.profile:
+        from sim_profiles import get_profile, read_hierarchy
+        try:
+            profile = get_profile(args.profile)
+        except Exception as e:
+            print(f"Error processing profile {args.profile}: {e}")
+            sys.exit(1)
+        hierarchy = read_hierarchy(args.rtl_dir, args.tb_dir)
+
+    os.makedirs(args.sim_dir, exist_ok=True)
+    index = module_index(args.rtl_dir)
+    cache = {} if args.rebuild else load_cache(args.sim_dir)
+    jobs = args.jobs or os.cpu_count()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_test, tb, index, args.sim_dir, cache, args.flags,
+                                   args.timeout, args.iverilog, args.vvp, version, profile,
+                                   hierarchy)
+                   for tb in testbenches]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            build = 'cached' if result.cached else f"compile {result.compile_time:.2f}s"
+            print(f"{result.status.upper():<14}{result.name:<32}{build:<18}"
+                  f"run {result.run_time:.2f}s  {result.message}")
+            if args.verbose and result.status != 'passed':
+                print(result.output)
+    wall_time = time.perf_counter() - start
+    save_cache(cache, args.sim_dir)
+
+    passed = sum(r.status == 'passed' for r in results)
+    serial = sum(r.compile_time + r.run_time for r in results)
+    print(f"{passed}/{len(results)} passed{f' (profile {profile.name})' if profile else ''} "
+          f"in {wall_time:.2f}s "
+          f"(sum of test times {serial:.2f}s, {jobs} jobs)")
+
+    if args.junit:
+        write_junit(results, args.junit, wall_time)
+    if args.json:
+        write_json(results, args.json, wall_time)
+    sys.exit(0 if passed == len(results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Reduced-Resolution Simulation Profiles
+
+A profile (scripts/sim/profiles.json) fixes the frame size, the encoder
+channel widths and the class count of one simulation configuration, e.g.
+``tiny`` (16x16, 8 channels) for iterating in seconds and ``full``
+(224x224, 64/128/256) for nightly runs. From one profile this script
+derives everything a simulation at that scale needs:
+
+- parameter overrides for each testbench: ``-P`` flags for parameters of
+  the testbench module itself, and a generated module with ``defparam``
+  statements for parameters further down the hierarchy that no parent
+  passes explicitly (e.g. the channel widths of segmentation_processor).
+  Testbenches that declare the feature map ports of the encoder or
+  decoder size them from their own STAGE{1,2,3}_CHANNELS parameters, so
+  the channel widths reach both sides of the port through ``-P``
+- a stimulus frame at the profile size (an image through the converter's
+  resize, or a seeded random frame) and random weights with the profile's
+  channel widths, as $readmemh files
+- the golden buffers for that stimulus from golden_model.py
+
+run_regression.py and golden_compare.py take ``--profile`` and use the
+same overrides, so the same checks run at every scale.
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from run_regression import RTL_DIR, SIM_DIR, TB_DIR
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+from cityscapes_data_converter import RESAMPLE_FILTERS, resize_image, save_memory_file
+from golden_model import random_weights, run_network
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles.json')
+
+# Name of the generated module holding the defparam statements
+DEFPARAM_MODULE = 'profile_defparams'
+
+Profile = namedtuple('Profile', ['name', 'width', 'height', 'channels', 'num_classes'])
+
+def load_profiles(path=PROFILES_FILE):
+    """{name: Profile} from a profiles JSON file"""
+    with open(path) as f:
+        config = json.load(f)
+    profiles = {}
+    for name, entry in config.items():
+        profile = Profile(name, entry['width'], entry['height'], tuple(entry['channels']),
+                          entry.get('num_classes', 21))
+        if profile.width % 8 or profile.height % 8 or len(profile.channels) != 3:
+            raise ValueError(f"Profile {name}: size must be a multiple of 8 "
+                             f"and channels must list 3 stages")
+        profiles[name] = profile
+    return profiles
+
+def get_profile(name, path=PROFILES_FILE):
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ValueError(f"Unknown profile {name} (available: {', '.join(profiles)})")
+    return profiles[name]
+
+def parameter_value(profile, module, parameter):
+    """Value of a module parameter under a profile, or None if the profile leaves it alone"""
+    w, h = profile.width, profile.height
+    c1, c2, c3 = profile.channels
+    classes = profile.num_classes
+
+    # Layer modules: (input width, input height, in, skip, out channels)
+    layers = {
+        'encoder_stage1': (w, h, None, None, c1),
+        'encoder_stage2': (w // 2, h // 2, c1, None, c2),
+        'encoder_stage3': (w // 4, h // 4, c2, None, c3),
+        'decoder_stage1': (w // 8, h // 8, c3, c3, c2),
+        'decoder_stage2': (w // 4, h // 4, c2, c2, c1),
+        'decoder_stage3': (w // 2, h // 2, c1, c1, classes),
+    }
+    if module in layers:
+        width, height, in_ch, skip_ch, out_ch = layers[module]
+        values = {'INPUT_WIDTH': width, 'INPUT_HEIGHT': height, 'INPUT_CHANNELS': in_ch,
+                  'SKIP_CHANNELS': skip_ch, 'OUTPUT_CHANNELS': out_ch}
+    elif module == 'bottleneck':
+        values = {'INPUT_WIDTH': w // 8, 'INPUT_HEIGHT': h // 8, 'CHANNELS': c3}
+    elif module == 'tb_bottleneck':
+        values = {'FEATURE_WIDTH': w // 8, 'FEATURE_HEIGHT': h // 8, 'CHANNELS': c3}
+    else:
+        values = {'INPUT_WIDTH': w, 'INPUT_HEIGHT': h, 'IMAGE_WIDTH': w, 'IMAGE_HEIGHT': h,
+                  'NUM_CLASSES': classes}
+        for stage, channels in enumerate(profile.channels, 1):
+            values[f'STAGE{stage}_CHANNELS'] = channels
+            values[f'ENCODER_STAGE{stage}_CHANNELS'] = channels
+    return values.get(parameter)
+
+def read_hierarchy(*directories):
+    """Overridable parameters and instantiations of every module in the Verilog sources
+
+    Returns ({module: [parameter]}, {module: [(child module, instance,
+    parameters passed with #(...))]}).
+    """
+    files = [os.path.join(root, file) for directory in directories
+             for root, _, names in os.walk(directory) for file in sorted(names) if file.endswith('.v')]
+    bodies = {}
+    for path in files:
+        with open(path) as f:
+            source = re.sub(r'/\*.*?\*/|//[^\n]*', '', f.read(), flags=re.S)
+        for name, body in re.findall(r'\bmodule\s+(\w+)(.*?)\bendmodule', source, re.S):
+            bodies[name] = body
+
+    parameters, children = {}, {}
+    for name, body in bodies.items():
+        parameters[name] = re.findall(r'\bparameter\s+(?:\[[^\]]*\]\s*)?(\w+)', body)
+        children[name] = []
+        pattern = r'\b(\w+)\s*(#\s*\((?:[^()]|\([^()]*\))*\))?\s*(\w+)\s*\('
+        for child, overrides, instance in re.findall(pattern, body):
+            if child in bodies:
+                children[name].append((child, instance, set(re.findall(r'\.(\w+)\s*\(', overrides))))
+    return parameters, children
+
+def testbench_overrides(profile, top, hierarchy):
+    """(root parameter overrides, defparam overrides) as [(name, value)] for a top module
+
+    Root parameters can be set with ``iverilog -P``; the others are set by
+    hierarchical name, only where the parent does not pass them explicitly.
+    """
+    parameters, children = hierarchy
+    root = [(parameter, value) for parameter in parameters.get(top, [])
+            for value in [parameter_value(profile, top, parameter)] if value is not None]
+
+    defparams = []
+    def walk(module, path):
+        for child, instance, passed in children.get(module, []):
+            for parameter in parameters.get(child, []):
+                value = parameter_value(profile, child, parameter)
+                if value is not None and parameter not in passed:
+                    defparams.append((f"{path}.{instance}.{parameter}", value))
+            walk(child, f"{path}.{instance}")
+    walk(top, top)
+    return root, defparams
+
+def iverilog_overrides(profile, top, hierarchy, work_dir):
+    """iverilog arguments and extra source file applying a profile to a top module
+
+    Returns (flags, defparam file or None). The defparam file is written to
+    ``work_dir`` and elaborated as a second root module.
+    """
+    root, defparams = testbench_overrides(profile, top, hierarchy)
+    flags = [f"-P{top}.{parameter}={value}" for parameter, value in root]
+    if not defparams:
+        return flags, None
+
+    path = os.path.join(work_dir, f"{DEFPARAM_MODULE}.v")
+    lines = [f"// Generated by sim_profiles.py for profile {profile.name}",
+             f"module {DEFPARAM_MODULE};"]
+    lines += [f"    defparam {name} = {value};" for name, value in defparams]
+    lines += ["endmodule", ""]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    return flags + ['-s', DEFPARAM_MODULE], path
+
+def profile_weights(profile, seed=0):
+    """Random int8 weights shaped for the profile's channel widths"""
+    return random_weights(seed, num_classes=profile.num_classes, channels=profile.channels)
+
+def write_profile(profile, output_dir, tb_dir=TB_DIR, rtl_dir=RTL_DIR, image=None, seed=0,
+                  resample='lanczos'):
+    """Write overrides, stimulus, weights and golden buffers of a profile to output_dir"""
+    hierarchy = read_hierarchy(rtl_dir, tb_dir)
+    testbenches = sorted(os.path.splitext(file)[0] for file in os.listdir(tb_dir)
+                         if file.startswith('tb_') and file.endswith('.v'))
+
+    overrides = {}
+    for testbench in testbenches:
+        work_dir = os.path.join(output_dir, testbench)
+        os.makedirs(work_dir, exist_ok=True)
+        flags, defparam_file = iverilog_overrides(profile, testbench, hierarchy, work_dir)
+        with open(os.path.join(work_dir, 'iverilog.flags'), 'w') as f:
+            f.write('\n'.join(flags + ([defparam_file] if defparam_file else [])) + '\n')
+        overrides[testbench] = flags
+
+    size = (profile.width, profile.height)
+    if image:
+        frame = resize_image(image, size, resample)
+    else:
+        frame = np.random.default_rng(seed).integers(0, 256, (profile.height, profile.width, 3),
+                                                    dtype=np.uint8)
+    weights = profile_weights(profile, seed)
+    buffers = run_network(frame, weights, profile.num_classes)
+
+    for folder in ('stimulus', 'weights', 'golden'):
+        os.makedirs(os.path.join(output_dir, folder), exist_ok=True)
+    save_memory_file(frame.ravel(), os.path.join(output_dir, 'stimulus', 'input.memh'), 'readmemh')
+    for layer, (kernel, bias) in weights.items():
+        save_memory_file(kernel.view(np.uint8).ravel(),
+                         os.path.join(output_dir, 'weights', f"{layer}_kernel.memh"), 'readmemh')
+        save_memory_file(bias.view(np.uint8),
+                         os.path.join(output_dir, 'weights', f"{layer}_bias.memh"), 'readmemh')
+    for name, buffer in buffers.items():
+        dtype = np.uint8 if name == 'output_buffer' else np.uint16
+        save_memory_file(buffer.astype(dtype), os.path.join(output_dir, 'golden', f"{name}.memh"),
+                         'readmemh')
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate parameter overrides and scaled test data for a simulation profile')
+
+    parser.add_argument('profile', nargs='?', help='Profile name from the profiles file')
+    parser.add_argument('--output-dir', help='Output directory (default: simulation/profiles/<profile>)')
+    parser.add_argument('--profiles', default=PROFILES_FILE,
+                        help='Profiles JSON file (default: scripts/sim/profiles.json)')
+    parser.add_argument('--input', help='Stimulus image (default: random frame from --seed)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for random frames and weights')
+    parser.add_argument('--resample', choices=sorted(RESAMPLE_FILTERS), default='lanczos',
+                        help='Resampling filter for --input (default: lanczos)')
+    parser.add_argument('--tb-dir', default=TB_DIR, help='Testbench directory (default: hdl/tb)')
+    parser.add_argument('--rtl-dir', default=RTL_DIR, help='RTL directory (default: hdl/rtl)')
+    parser.add_argument('--list', action='store_true', help='List the available profiles')
+
+    args = parser.parse_args()
+
+    try:
+        profiles = load_profiles(args.profiles)
+    except Exception as e:
+        print(f"Error processing {args.profiles}: {e}")
+        sys.exit(1)
+
+    if args.list or not args.profile:
+        with open(args.profiles) as f:
+            descriptions = json.load(f)
+        for name, profile in profiles.items():
+            channels = '/'.join(map(str, profile.channels))
+            print(f"{name:<10}{profile.width}x{profile.height}, channels {channels}, "
+                  f"{profile.num_classes} classes  {descriptions[name].get('description', '')}")
+        return
+
+    if args.profile not in profiles:
+        print(f"Error: unknown profile {args.profile} (available: {', '.join(profiles)})")
+        sys.exit(1)
+    profile = profiles[args.profile]
+    output_dir = args.output_dir or os.path.join(SIM_DIR, 'profiles', profile.name)
+
+    try:
+        overrides = write_profile(profile, output_dir, args.tb_dir, args.rtl_dir, args.input,
+                                  args.seed, args.resample)
+    except Exception as e:
+        print(f"Error processing profile {profile.name}: {e}")
+        sys.exit(1)
+
+    for testbench, flags in overrides.items():
+        print(f"{testbench}: {' '.join(flags) or '(no overrides)'}")
+    print(f"Wrote profile {profile.name} to {os.path.normpath(output_dir)}")
+
+if __name__ == "__main__":
+    main()
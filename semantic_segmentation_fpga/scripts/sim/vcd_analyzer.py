@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Streaming VCD Analyzer for State-Machine Timing and Utilization
+
+Reads a testbench VCD dump (plain or .gz) in a single pass and follows the
+``state`` register of every instance of the selected modules (by default
+segmentation_processor, encoder_stage1..3, image_loader and
+result_display). For each instance it reports:
+
+- time and clock cycles spent in every state, and how often it was entered
+- idle cycles (IDLE state) and utilization (share of time not idle)
+- ``start`` to ``done`` handshake latency (count, min, mean, max)
+
+Only the header and a fixed set of per-instance counters are kept in
+memory; value changes are processed line by line and signals that are
+not tracked are skipped without being decoded, so multi-GB dumps need
+no more memory than small ones.
+
+VCD scopes name instances, not modules, so the module of each scope is
+resolved from the instantiations in the RTL and testbench sources, and
+state codes are named after the module's state localparams.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import argparse
+
+from run_regression import RTL_DIR, TB_DIR
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+from performance_model import parse_modules
+
+DEFAULT_MODULES = ['segmentation_processor', 'encoder_stage1', 'encoder_stage2',
+                   'encoder_stage3', 'image_loader', 'result_display']
+
+TIME_UNITS = {'s': 1.0, 'ms': 1e-3, 'us': 1e-6, 'ns': 1e-9, 'ps': 1e-12, 'fs': 1e-15}
+
+# First bytes of VCD value change lines
+SCALAR_CODES = frozenset(b'01xXzZ')
+VECTOR_CODES = frozenset(b'bB')
+
+# Rising clock edges used to measure a scope's clock period before it is
+# no longer tracked
+CLOCK_EDGES = 8
+
+
+def source_modules(*directories):
+    """({module: state names by value}, {(parent module, instance): module}) from Verilog sources"""
+    states, instances = {}, {}
+    files = [os.path.join(root, file) for directory in directories
+             for root, _, names in os.walk(directory) for file in sorted(names) if file.endswith('.v')]
+    for path in files:
+        for name, module in parse_modules(path).items():
+            values = module['parameters']
+            states[name] = {values[state]: state for state in module['states'] if state in values}
+
+    known = set(states)
+    for path in files:
+        with open(path) as f:
+            source = re.sub(r'/\*.*?\*/|//[^\n]*', '', f.read(), flags=re.S)
+        for parent, body in re.findall(r'\bmodule\s+(\w+)(.*?)\bendmodule', source, re.S):
+            # module_type [#( ... )] instance_name (
+            pattern = r'\b(\w+)\s*(?:#\s*\((?:[^()]|\([^()]*\))*\))?\s*(\w+)\s*\('
+            for child, instance in re.findall(pattern, body):
+                if child in known:
+                    instances[(parent, instance)] = child
+    return states, instances
+
+class StateTracker:
+    """Per-instance accumulators, updated for every tracked value change"""
+
+    def __init__(self, path, module, state_names):
+        self.path = path
+        self.module = module
+        self.state_names = state_names
+        self.state = None
+        self.entered = None
+        self.durations = {}
+        self.visits = {}
+        self.first_time = None
+        self.start = None
+        self.done = None
+        self.start_time = None
+        self.latency_stats = [0, 0, None, None]   # count, sum, min, max
+        self.clock_level = None
+        self.clock_rises = []
+
+    def name(self, value):
+        if value is None:
+            return 'X'
+        return self.state_names.get(value, str(value))
+
+    def set_state(self, value, time):
+        if self.first_time is None:
+            self.first_time = time
+        if value == self.state and self.entered is not None:
+            return
+        self.close(time)
+        self.state, self.entered = value, time
+        self.visits[value] = self.visits.get(value, 0) + 1
+
+    def close(self, time):
+        if self.entered is not None:
+            self.durations[self.state] = self.durations.get(self.state, 0) + time - self.entered
+            self.entered = time
+
+    def set_start(self, level, time):
+        if level == 1 and self.start != 1:
+            self.start_time = time
+        self.start = level
+
+    def set_done(self, level, time):
+        if level == 1 and self.done != 1 and self.start_time is not None:
+            latency = time - self.start_time
+            stats = self.latency_stats
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] = latency if stats[2] is None else min(stats[2], latency)
+            stats[3] = latency if stats[3] is None else max(stats[3], latency)
+            self.start_time = None
+        self.done = level
+
+    def clock(self, level, time):
+        """Record a clock level; returns True once the period is known"""
+        if level == 1 and self.clock_level == 0:
+            self.clock_rises.append(time)
+        self.clock_level = level
+        return len(self.clock_rises) >= CLOCK_EDGES
+
+    def period(self):
+        rises = self.clock_rises
+        if len(rises) < 2:
+            return None
+        return min(b - a for a, b in zip(rises, rises[1:]))
+
+def _parse_value(text):
+    """Integer value of a VCD scalar/vector value, or None if it has x/z bits"""
+    if text.startswith((b'b', b'B')):
+        text = text[1:]
+        return None if re.search(rb'[xXzZ]', text) else int(text, 2)
+    return None if text in (b'x', b'X', b'z', b'Z') else int(text)
+
+def read_header(f):
+    """Parse the VCD header up to $enddefinitions
+
+    Returns (timescale in seconds, [(scope path, [(id, reference)])]).
+    """
+    timescale, scopes, stack = 1e-9, [], []
+    current = {}
+    tokens = []
+    for line in f:
+        tokens.extend(line.split())
+        if not tokens or tokens[-1] != b'$end':
+            continue
+        keyword, args = tokens[0], tokens[1:-1]
+        tokens = []
+        if keyword == b'$timescale':
+            match = re.fullmatch(r'(\d+)\s*([a-z]+)', b''.join(args).decode())
+            timescale = int(match.group(1)) * TIME_UNITS[match.group(2)]
+        elif keyword == b'$scope':
+            stack.append(args[-1].decode())
+            current[tuple(stack)] = []
+            scopes.append((tuple(stack), current[tuple(stack)]))
+        elif keyword == b'$upscope':
+            stack.pop()
+        elif keyword == b'$var':
+            # $var type size id reference [range] $end
+            current[tuple(stack)].append((args[2], args[3].decode()))
+        elif keyword == b'$enddefinitions':
+            break
+    return timescale, scopes
+
+def analyze(path, modules=DEFAULT_MODULES, clock='clk', source_dirs=(RTL_DIR, TB_DIR)):
+    """Stream a VCD file; returns (timescale, end time, [StateTracker])"""
+    states, instances = source_modules(*source_dirs)
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rb') as f:
+        timescale, scopes = read_header(f)
+
+        # Resolve each scope's module through the instantiation hierarchy
+        scope_modules, trackers = {}, []
+        handlers = {}   # id -> list of (tracker, method)
+        for scope, variables in scopes:
+            if len(scope) == 1:
+                module = scope[0]
+            else:
+                module = instances.get((scope_modules.get(scope[:-1]), scope[-1]))
+            scope_modules[scope] = module
+            if module not in modules:
+                continue
+            signals = dict((reference, code) for code, reference in variables)
+            if 'state' not in signals:
+                continue
+            tracker = StateTracker('.'.join(scope), module, states.get(module, {}))
+            trackers.append(tracker)
+            for reference, method in (('state', tracker.set_state), ('start', tracker.set_start),
+                                      ('done', tracker.set_done), (clock, tracker.clock)):
+                if reference in signals:
+                    handlers.setdefault(signals[reference], []).append((tracker, method))
+
+        # Timestamps are only decoded when a tracked signal changes
+        timestamp = b'#0'
+        for line in f:
+            first = line[0]
+            if first == 35:   # '#'
+                timestamp = line
+                continue
+            if first in VECTOR_CODES:
+                value, _, code = line.partition(b' ')
+                code = code.rstrip()
+            elif first in SCALAR_CODES:
+                value, code = line[:1], line[1:].rstrip()
+            else:
+                continue   # real values, $dumpvars/$end and other keywords
+            targets = handlers.get(code)
+            if targets is None:
+                continue
+            time = int(timestamp[1:])
+            value = _parse_value(value)
+            for tracker, method in list(targets):
+                if method == tracker.clock:
+                    if method(value, time):
+                        targets.remove((tracker, method))
+                        if not targets:
+                            del handlers[code]
+                else:
+                    method(value, time)
+
+    time = int(timestamp[1:])
+    for tracker in trackers:
+        tracker.close(time)
+    return timescale, time, trackers
+
+def tracker_report(tracker, timescale, end_time):
+    """Summary dict of one instance"""
+    period = tracker.period()
+    first = tracker.first_time or 0
+    total = max(end_time - first, 0)
+
+    def cycles(duration):
+        return round(duration / period) if period else None
+
+    idle_values = [v for v, name in tracker.state_names.items() if name == 'IDLE'] or [0]
+    idle = sum(tracker.durations.get(v, 0) for v in idle_values)
+    count, latency_sum, latency_min, latency_max = tracker.latency_stats
+    return {
+        'instance': tracker.path,
+        'module': tracker.module,
+        'clock_period_ns': period * timescale * 1e9 if period else None,
+        'observed_ns': total * timescale * 1e9,
+        'observed_cycles': cycles(total),
+        'idle_cycles': cycles(idle),
+        'utilization': (total - idle) / total if total else 0.0,
+        'handshakes': count,
+        'latency_cycles': {
+            'min': cycles(latency_min) if count else None,
+            'mean': cycles(latency_sum / count) if count else None,
+            'max': cycles(latency_max) if count else None,
+        },
+        'states': [{'state': tracker.name(value), 'cycles': cycles(duration),
+                    'time_ns': duration * timescale * 1e9,
+                    'share': duration / total if total else 0.0,
+                    'visits': tracker.visits.get(value, 0)}
+                   for value, duration in sorted(tracker.durations.items(),
+                                                 key=lambda item: (item[0] is None, item[0] or 0))],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report state timing, idle cycles and start/done latency from a VCD dump')
+
+    parser.add_argument('vcd', help='VCD file written by a testbench (.vcd or .vcd.gz)')
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES,
+                        help='Modules whose state registers are analyzed '
+                             '(default: ' + ' '.join(DEFAULT_MODULES) + ')')
+    parser.add_argument('--clock', default='clk',
+                        help='Clock signal name inside each instance (default: clk)')
+    parser.add_argument('--rtl-dir', default=RTL_DIR, help='RTL directory (default: hdl/rtl)')
+    parser.add_argument('--tb-dir', default=TB_DIR, help='Testbench directory (default: hdl/tb)')
+    parser.add_argument('--json', help='Write the report as JSON here')
+
+    args = parser.parse_args()
+
+    try:
+        timescale, end_time, trackers = analyze(args.vcd, args.modules, args.clock,
+                                                (args.rtl_dir, args.tb_dir))
+    except Exception as e:
+        print(f"Error processing {args.vcd}: {e}")
+        sys.exit(1)
+
+    if not trackers:
+        print(f"No state registers of {', '.join(args.modules)} found in {args.vcd}")
+        sys.exit(1)
+
+    reports = [tracker_report(tracker, timescale, end_time) for tracker in trackers]
+    for report in reports:
+        latency = report['latency_cycles']
+        print(f"{report['instance']} ({report['module']})")
+        print(f"  observed {report['observed_cycles']} cycles, idle {report['idle_cycles']}, "
+              f"utilization {report['utilization']:.1%}")
+        if report['handshakes']:
+            print(f"  start->done: {report['handshakes']}x, min {latency['min']}, "
+                  f"mean {latency['mean']}, max {latency['max']} cycles")
+        for state in report['states']:
+            print(f"    {state['state']:<14}{state['cycles'] if state['cycles'] is not None else '-':>12} "
+                  f"cycles {state['share']:7.1%}  {state['visits']:>6} visits")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'vcd': args.vcd, 'end_time_ns': end_time * timescale * 1e9,
+                       'instances': reports}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
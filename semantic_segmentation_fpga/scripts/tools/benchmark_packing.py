@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for SDRAM word packing
+
+Compares the original per-word Python packing loop against the vectorized
+convert_to_binary() in cityscapes_data_converter.py, checks that both produce
+byte-identical .bin output (and that both byte orders give the expected raw
+bytes) and extrapolates the cost to full Cityscapes splits.
+"""
+
+import argparse
+import time
+import numpy as np
+
+from cityscapes_data_converter import convert_to_binary
+
+# Number of images in each Cityscapes split (fine annotations)
+CITYSCAPES_SPLITS = {'train': 2975, 'val': 500, 'test': 1525}
+
+def convert_to_binary_loop(image_data):
+    """Original per-word packing loop, kept as the reference implementation"""
+    flat_data = image_data.reshape(-1)
+    
+    padding = (4 - (len(flat_data) % 4)) % 4
+    if padding:
+        flat_data = np.pad(flat_data, (0, padding), 'constant')
+    
+    words = flat_data.reshape(-1, 4)
+    
+    binary_data = np.zeros(words.shape[0], dtype=np.uint32)
+    for i in range(words.shape[0]):
+        binary_data[i] = (int(words[i, 0]) |
+                         (int(words[i, 1]) << 8) |
+                         (int(words[i, 2]) << 16) |
+                         (int(words[i, 3]) << 24))
+    
+    return binary_data
+
+def check_byteorder():
+    """Raise SystemExit unless both byte orders write the expected .bin bytes"""
+    data = np.arange(1, 13, dtype=np.uint8)
+    expected = {
+        'little': bytes.fromhex('0102030405060708090a0b0c'),
+        'big': bytes.fromhex('04030201080706050c0b0a09'),
+    }
+    for byteorder, raw in expected.items():
+        output = convert_to_binary(data, 4, byteorder).tobytes()
+        if output != raw:
+            raise SystemExit(f"{byteorder}-endian packing wrote {output.hex()}, "
+                             f"expected {raw.hex()}")
+
+def time_per_call(func, image_data, repeat):
+    """Return the best wall-clock time of a single call over several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(image_data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark SDRAM word packing (loop vs. vectorized)')
+    
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'), help='Image size (default: 224 224)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timing runs per implementation (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the test image')
+    
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    image_data = rng.integers(0, 256, size=(args.size[1], args.size[0], 3), dtype=np.uint8)
+    
+    check_byteorder()
+
+    # Both paths must produce the same bytes on disk
+    if convert_to_binary_loop(image_data).tobytes() != convert_to_binary(image_data).tobytes():
+        raise SystemExit("Mismatch between loop and vectorized packing output")
+    
+    loop_time = time_per_call(convert_to_binary_loop, image_data, args.repeat)
+    vector_time = time_per_call(convert_to_binary, image_data, args.repeat)
+    
+    print(f"Image: {args.size[0]}x{args.size[1]}x3 "
+          f"({image_data.size // 4} words), output byte-identical")
+    print(f"{'':<12}{'loop':>12}{'vectorized':>14}{'speedup':>10}")
+    print(f"{'per image':<12}{loop_time * 1e3:>10.3f}ms{vector_time * 1e3:>12.3f}ms"
+          f"{loop_time / vector_time:>9.0f}x")
+    for split, count in CITYSCAPES_SPLITS.items():
+        print(f"{split + ' split':<12}{loop_time * count:>11.2f}s{vector_time * count:>13.4f}s"
+              f"{'':>10}")
+
+if __name__ == "__main__":
+    main()
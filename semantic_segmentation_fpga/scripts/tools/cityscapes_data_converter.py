@@ -4,107 +4,668 @@ Cityscapes Data Converter for FPGA Semantic Segmentation
 
 This script converts Cityscapes dataset images to a binary format
 suitable for loading into the FPGA's SDRAM.
+
+With --labels it converts the *_gtFine_labelIds.png ground truth instead:
+label IDs are mapped to classes through the case statement of
+cityscapes_class_mapping.v and letterboxed with nearest sampling at the
+same geometry as the images, into class-index PNGs named after their
+images (as quantization_sweep.py --labels expects).
 """
 
 import os
+import re
 import sys
+import csv
+import json
+import hashlib
 import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
 from PIL import Image
 
-def resize_image(image, target_size=(224, 224)):
+try:
+    import cv2
+except ImportError:  # OpenCV is only needed for the cv2 resize backend
+    cv2 = None
+
+from packed_dataset import PackedDatasetWriter
+
+# NumPy type codes for the supported SDRAM word sizes (in bytes)
+WORD_DTYPES = {1: 'u1', 2: 'u2', 4: 'u4', 8: 'u8'}
+
+# Output formats and their file extensions ('mem', 'readmemh' and 'ihex' are
+# text memory initialization files, see format_memory())
+FORMAT_EXTENSIONS = {
+    'binary': '.bin',
+    'mem': '.mem',
+    'readmemh': '.memh',
+    'ihex': '.hex',
+}
+
+# Lookup table from nibble value to lowercase ASCII hex digit
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+# Per-run conversion report written to the output directory
+MANIFEST_NAME = 'manifest.csv'
+
+# Sidecar index of converted sources, keyed by path relative to the input
+CACHE_NAME = '.convert_cache.json'
+CACHE_VERSION = 2
+
+# Resampling filters selectable for the resize step, per backend
+RESAMPLE_FILTERS = {
+    'nearest': Image.NEAREST,
+    'bilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS,
+    'area': Image.BOX,
+}
+
+if cv2 is not None:
+    CV2_INTERPOLATIONS = {
+        'nearest': cv2.INTER_NEAREST,
+        'bilinear': cv2.INTER_LINEAR,
+        'bicubic': cv2.INTER_CUBIC,
+        'lanczos': cv2.INTER_LANCZOS4,
+        'area': cv2.INTER_AREA,
+    }
+
+RESIZE_BACKENDS = ['pil', 'cv2']
+
+# Placement of the resized image in the letterbox canvas: scale factor,
+# (x, y) offset of the top-left corner and (width, height) of the content
+LetterboxGeometry = namedtuple('LetterboxGeometry', ['scale', 'offset', 'size'])
+
+# Per-process letterbox buffers reused across images, keyed by target size
+_FRAME_BUFFERS = {}
+
+# labelId -> class mapping used by the RTL
+CLASS_MAPPING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'hdl',
+                                  'rtl', 'network', 'cityscapes_class_mapping.v')
+
+# Label value of letterbox padding, excluded from evaluation
+IGNORE_LABEL = 255
+
+# Ground-truth suffix, replaced by the image suffix so label paths mirror image paths
+LABEL_SUFFIX = '_gtFine_labelIds'
+IMAGE_SUFFIX = '_leftImg8bit'
+
+# Outcome of converting one image; status is 'ok', 'cached' or 'error'
+ConversionResult = namedtuple('ConversionResult',
+                              ['input', 'output', 'status', 'error', 'source_hash'])
+
+def resize_image(image, target_size=(224, 224), resample='lanczos', backend='pil', out=None):
     """Resize image to target size while preserving aspect ratio"""
-    img = Image.open(image)
-    width, height = img.size
+    if backend == 'cv2':
+        img = cv2.imread(image, cv2.IMREAD_COLOR) if cv2 is not None else None
+        if img is None and cv2 is not None:
+            raise IOError(f"cannot identify image file '{image}'")
+        return letterbox(img, target_size, resample, backend, out, channel_order='bgr')
+    return letterbox(Image.open(image), target_size, resample, backend, out)
+
+def letterbox_geometry(image_size, target_size=(224, 224)):
+    """Scale and placement of an image_size (width, height) image in the letterbox"""
+    width, height = image_size
     
     # Calculate new size while preserving aspect ratio
     ratio = min(target_size[0] / width, target_size[1] / height)
     new_size = (int(width * ratio), int(height * ratio))
     
-    # Resize image
-    img_resized = img.resize(new_size, Image.LANCZOS)
-    
-    # Create new image with black padding
-    padded_img = Image.new("RGB", target_size, (0, 0, 0))
-    
-    # Paste resized image in center
+    # Resized image is centered on the black canvas
     offset = ((target_size[0] - new_size[0]) // 2,
               (target_size[1] - new_size[1]) // 2)
-    padded_img.paste(img_resized, offset)
+    return LetterboxGeometry(ratio, offset, new_size)
+
+def letterbox_into(img, out, resample='lanczos', backend='pil', channel_order='rgb'):
+    """Letterbox an image into a preallocated (height, width, 3) uint8 array
+
+    ``img`` is a PIL image for the ``pil`` backend, or an (H, W, 3) uint8
+    array in ``channel_order`` for the ``cv2`` backend; ``out`` always ends
+    up RGB. The resized pixels are written straight into ``out``, so batch
+    callers can reuse one buffer for every frame. Returns the
+    LetterboxGeometry needed to map results back to the source image.
+    """
+    target_size = (out.shape[1], out.shape[0])
+    
+    if backend == 'pil':
+        if isinstance(img, np.ndarray):
+            img = Image.fromarray(img[:, :, ::-1] if channel_order == 'bgr' else img)
+        geometry = letterbox_geometry(img.size, target_size)
+        resized = img.resize(geometry.size, RESAMPLE_FILTERS[resample])
+        if resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        content = np.asarray(resized)
+    elif backend == 'cv2':
+        if cv2 is None:
+            raise ImportError("The cv2 backend requires OpenCV (opencv-python)")
+        geometry = letterbox_geometry((img.shape[1], img.shape[0]), target_size)
+        content = None
+    else:
+        raise ValueError(f"Unsupported resize backend: {backend}")
+    
+    (left, top), (width, height) = geometry.offset, geometry.size
+    out[:top] = 0
+    out[top + height:] = 0
+    out[top:top + height, :left] = 0
+    out[top:top + height, left + width:] = 0
+    region = out[top:top + height, left:left + width]
+    
+    if content is not None:
+        region[...] = content
+    elif width and height:
+        cv2.resize(img, geometry.size, dst=region, interpolation=CV2_INTERPOLATIONS[resample])
+        if channel_order == 'bgr':
+            cv2.cvtColor(region, cv2.COLOR_BGR2RGB, dst=region)
     
-    return np.array(padded_img)
+    return geometry
+
+def letterbox(img, target_size=(224, 224), resample='lanczos', backend='pil', out=None,
+              channel_order='rgb'):
+    """Resize an image into a black target_size canvas, centered, as an RGB array"""
+    if out is None:
+        out = np.empty((target_size[1], target_size[0], 3), dtype=np.uint8)
+    letterbox_into(img, out, resample, backend, channel_order)
+    return out
+
+def nearest_indices(source, target):
+    """Source index sampled for each of ``target`` outputs by PIL's NEAREST resize"""
+    # PIL advances the sample position by repeated addition; cumsum rounds the same way
+    steps = np.full(target, source / target)
+    steps[0] *= 0.5
+    return np.cumsum(steps).astype(np.intp)
+
+def letterbox_labels(label, target_size=(224, 224), lut=None, fill=IGNORE_LABEL):
+    """Letterbox a 2-D label map with nearest sampling, optionally remapped through ``lut``
+
+    The placement is letterbox_geometry(), so labels stay aligned with the
+    images resize_image() produces; padding is ``fill``. Resampling and
+    remapping are one gather per output pixel.
+    """
+    geometry = letterbox_geometry((label.shape[1], label.shape[0]), target_size)
+    (left, top), (width, height) = geometry.offset, geometry.size
+    out = np.full((target_size[1], target_size[0]), fill, dtype=np.uint8)
+    if width and height:
+        samples = label[nearest_indices(label.shape[0], height)[:, None],
+                        nearest_indices(label.shape[1], width)]
+        out[top:top + height, left:left + width] = samples if lut is None else lut[samples]
+    return out
+
+def _verilog_int(text):
+    """Value of a Verilog integer literal such as 8'd7, 8'hC0 or 12"""
+    _, tick, digits = text.replace('_', '').rpartition("'")
+    if not tick:
+        return int(digits)
+    radix = {'d': 10, 'h': 16, 'b': 2, 'o': 8}[digits[0].lower()]
+    return int(digits[1:], radix)
+
+def parse_class_mapping(path=CLASS_MAPPING_FILE):
+    """(256-entry labelId -> class LUT, {class: (r, g, b)}) from cityscapes_class_mapping.v"""
+    with open(path) as f:
+        source = re.sub(r'/\*.*?\*/|//[^\n]*', '', f.read(), flags=re.S)
+    literal = r"\d*'[dDhHbBoO][0-9a-fA-F_]+|\d+"
+    items = re.findall(rf"((?:(?:{literal})\s*,\s*)*(?:{literal})|default)\s*:\s*begin(.*?)\bend\b",
+                       source, re.S)
+    if not items:
+        raise ValueError(f"No case items found in {path}")
+
+    lut = np.zeros(256, dtype=np.uint8)
+    palette = {}
+    explicit = []
+    for labels, body in items:
+        fields = dict(re.findall(rf"\b(mapped_class_id|r|g|b)\s*=\s*({literal})", body))
+        mapped = _verilog_int(fields['mapped_class_id'])
+        palette.setdefault(mapped, tuple(_verilog_int(fields.get(c, '0')) for c in 'rgb'))
+        if labels == 'default':
+            lut[:] = mapped
+        else:
+            explicit += [(_verilog_int(label), mapped) for label in re.findall(literal, labels)]
+    # Explicit items take precedence over the default, wherever it appears
+    for label, mapped in explicit:
+        lut[label] = mapped
+    return lut, palette
+
+def convert_to_binary(image_data, word_bytes=4, byteorder='little'):
+    """Convert image data to packed SDRAM words (32-bit by default)
+
+    The padded byte buffer is reinterpreted in place as words of
+    ``word_bytes`` bytes, so no per-word packing loop is needed. With the
+    defaults (4-byte little-endian words) the first byte of each group lands
+    in bits [7:0], which is the order ``image_loader.v`` unpacks; with
+    ``byteorder='big'`` it lands in the top byte ([31:24]). Words are
+    returned little-endian, as they are stored in .bin files and SDRAM, so
+    big-endian packing swaps the bytes of each word on disk.
+    """
+    if word_bytes not in WORD_DTYPES:
+        raise ValueError(f"Unsupported word size: {word_bytes} bytes")
+    if byteorder not in ('little', 'big'):
+        raise ValueError(f"Unsupported byte order: {byteorder}")
 
-def convert_to_binary(image_data):
-    """Convert image data to 32-bit binary format for SDRAM"""
     # Flatten RGB channels
-    flat_data = image_data.reshape(-1)
+    flat_data = np.ascontiguousarray(image_data).astype(np.uint8, copy=False).reshape(-1)
     
-    # Ensure the length is a multiple of 4 (for 32-bit words)
-    padding = (4 - (len(flat_data) % 4)) % 4
+    # Ensure the length is a multiple of the word size
+    padding = (word_bytes - (len(flat_data) % word_bytes)) % word_bytes
     if padding:
-        flat_data = np.pad(flat_data, (0, padding), 'constant')
+        flat_data = np.concatenate((flat_data, np.zeros(padding, dtype=np.uint8)))
     
-    # Reshape to 32-bit words
-    words = flat_data.reshape(-1, 4)
+    # Reinterpret the byte buffer as words (zero-copy when no padding is needed)
+    words = flat_data.view('<' + WORD_DTYPES[word_bytes])
+    if byteorder == 'big':
+        words = words.byteswap()
+    return words
+
+def _hex_digits(values, ndigits):
+    """Format unsigned integers as ASCII hex digits (one extra axis of ndigits)"""
+    shifts = np.arange(4 * (ndigits - 1), -1, -4, dtype=np.uint64)
+    nibbles = (values[..., None] >> shifts) & np.uint64(0xF)
+    return HEX_DIGITS[nibbles]
+
+def _text_lines(columns, count):
+    """Assemble fixed-width text lines from (n, k) uint8 arrays or single byte strings"""
+    width = sum(col.shape[1] if isinstance(col, np.ndarray) else len(col) for col in columns)
+    lines = np.empty((count, width), dtype=np.uint8)
+    pos = 0
+    for col in columns:
+        if isinstance(col, np.ndarray):
+            lines[:, pos:pos + col.shape[1]] = col
+            pos += col.shape[1]
+        else:
+            lines[:, pos:pos + len(col)] = np.frombuffer(col, dtype=np.uint8)
+            pos += len(col)
+    return lines.tobytes()
+
+def _intel_hex_record(address, record_type, data):
+    """Format a single Intel HEX record"""
+    body = bytes([len(data), address >> 8, address & 0xFF, record_type]) + bytes(data)
+    return f":{body.hex().upper()}{-sum(body) & 0xFF:02X}\n".encode()
+
+def format_memory(binary_data, mem_format='mem'):
+    """Format packed words as a memory initialization text image
+
+    The whole file is built in one vectorized pass:
+
+    - ``mem``: ``AAAAAAAA: DDDDDDDD`` lines (word address and data)
+    - ``readmemh``: one data word per line, as read by Verilog ``$readmemh``
+    - ``ihex``: Intel HEX with one word per record at its word address, as
+      used by Quartus memory initialization (extended linear address
+      records are inserted every 64K words)
+    """
+    binary_data = np.asarray(binary_data)
+    word_bytes = binary_data.dtype.itemsize
+    values = binary_data.astype(np.uint64)
+    count = len(values)
+    if count == 0:
+        return b':00000001FF\n' if mem_format == 'ihex' else b''
+    
+    if mem_format == 'mem':
+        # Same widths as the f"{i:08x}: {word:08x}" lines written previously
+        addresses = np.arange(count, dtype=np.uint64)
+        return _text_lines([_hex_digits(addresses, max(8, len(f"{count - 1:x}"))), b': ',
+                            _hex_digits(values, max(8, 2 * word_bytes)), b'\n'], count)
     
-    # Convert to 32-bit binary values
-    binary_data = np.zeros(words.shape[0], dtype=np.uint32)
-    for i in range(words.shape[0]):
-        # Pack 4 bytes into a 32-bit word
-        binary_data[i] = (int(words[i, 0]) |
-                         (int(words[i, 1]) << 8) |
-                         (int(words[i, 2]) << 16) |
-                         (int(words[i, 3]) << 24))
+    if mem_format == 'readmemh':
+        return _text_lines([_hex_digits(values, 2 * word_bytes), b'\n'], count)
     
-    return binary_data
+    if mem_format == 'ihex':
+        # Data bytes are stored most significant first within each record
+        shifts = np.arange(8 * (word_bytes - 1), -1, -8, dtype=np.uint64)
+        data = (values[:, None] >> shifts) & np.uint64(0xFF)
+        chunks = []
+        for base in range(0, count, 0x10000):
+            if base:
+                chunks.append(_intel_hex_record(0, 0x04, (base >> 16).to_bytes(2, 'big')))
+            block = data[base:base + 0x10000]
+            addresses = np.arange(len(block), dtype=np.uint64)
+            checksum = (word_bytes + (addresses >> np.uint64(8)) + (addresses & np.uint64(0xFF))
+                        + block.sum(axis=1))
+            checksum = (-checksum.astype(np.int64)) & 0xFF
+            columns = [b':', f"{word_bytes:02X}".encode(), _hex_digits(addresses, 4), b'00',
+                       _hex_digits(block, 2).reshape(len(block), -1),
+                       _hex_digits(checksum.astype(np.uint64), 2), b'\n']
+            chunks.append(_text_lines(columns, len(block)).upper())
+        chunks.append(b':00000001FF\n')
+        return b''.join(chunks)
+    
+    raise ValueError(f"Unsupported memory format: {mem_format}")
 
-def save_memory_file(binary_data, output_file):
+def save_memory_file(binary_data, output_file, mem_format='mem'):
     """Save binary data to memory initialization file"""
-    with open(output_file, 'w') as f:
-        for i, word in enumerate(binary_data):
-            # Write address and data in hex format
-            f.write(f"{i:08x}: {word:08x}\n")
+    with open(output_file, 'wb') as f:
+        f.write(format_memory(binary_data, mem_format))
 
 def save_binary_file(binary_data, output_file):
     """Save binary data to raw binary file"""
     with open(output_file, 'wb') as f:
         binary_data.tofile(f)
 
-def process_directory(input_dir, output_dir, format_type='binary'):
-    """Process all image files in a directory"""
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def frame_buffer(target_size):
+    """Reusable (height, width, 3) letterbox buffer for this process and size"""
+    key = tuple(target_size)
+    if key not in _FRAME_BUFFERS:
+        _FRAME_BUFFERS[key] = np.empty((key[1], key[0], 3), dtype=np.uint8)
+    return _FRAME_BUFFERS[key]
+
+def convert_file(input_path, output_path, format_type='binary', word_bytes=4,
+                 byteorder='little', target_size=(224, 224), resample='lanczos',
+                 backend='pil'):
+    """Convert a single image file and write the result to output_path"""
+    img_data = resize_image(input_path, tuple(target_size), resample, backend,
+                            frame_buffer(target_size))
+    binary_data = convert_to_binary(img_data, word_bytes, byteorder)
+    
+    if format_type == 'binary':
+        save_binary_file(binary_data, output_path)
+    else:
+        save_memory_file(binary_data, output_path, format_type)
+
+def convert_label_file(input_path, output_path, lut, target_size=(224, 224)):
+    """Remap and letterbox one labelIds PNG into a class-index PNG"""
+    label = np.asarray(Image.open(input_path))
+    if label.ndim != 2:
+        raise ValueError(f"Expected a single-channel label map, got shape {label.shape}")
+    Image.fromarray(letterbox_labels(label, target_size, lut)).save(output_path)
+
+def find_images(input_dir, output_dir, format_type='binary'):
+    """List (input_path, output_path) pairs for all images under input_dir"""
+    extension = FORMAT_EXTENSIONS.get(format_type, '.bin')
+    tasks = []
     
     for root, _, files in os.walk(input_dir):
         for file in files:
             if file.lower().endswith(('.png', '.jpg', '.jpeg')):
                 input_path = os.path.join(root, file)
                 rel_path = os.path.relpath(input_path, input_dir)
-                
-                # Create output filename
-                if format_type == 'binary':
-                    output_path = os.path.join(output_dir, 
-                                              os.path.splitext(rel_path)[0] + '.bin')
-                else:
-                    output_path = os.path.join(output_dir, 
-                                              os.path.splitext(rel_path)[0] + '.mem')
-                
-                # Ensure output directory exists
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                
-                # Process image
-                try:
-                    img_data = resize_image(input_path)
-                    binary_data = convert_to_binary(img_data)
-                    
-                    if format_type == 'binary':
-                        save_binary_file(binary_data, output_path)
-                    else:
-                        save_memory_file(binary_data, output_path)
-                    
-                    print(f"Processed: {input_path} -> {output_path}")
-                except Exception as e:
-                    print(f"Error processing {input_path}: {e}")
+                output_path = os.path.join(output_dir,
+                                           os.path.splitext(rel_path)[0] + extension)
+                tasks.append((input_path, output_path))
+    
+    # Sorted so the manifest order does not depend on the file system
+    return sorted(tasks)
+
+def find_labels(input_dir, output_dir):
+    """List (input_path, output_path) pairs for all labelIds PNGs under input_dir"""
+    tasks = []
+    for root, _, files in os.walk(input_dir):
+        for file in files:
+            stem, extension = os.path.splitext(file)
+            if extension.lower() == '.png' and stem.endswith(LABEL_SUFFIX):
+                input_path = os.path.join(root, file)
+                rel_dir = os.path.relpath(root, input_dir)
+                name = stem[:-len(LABEL_SUFFIX)] + IMAGE_SUFFIX + '.png'
+                tasks.append((input_path, os.path.normpath(os.path.join(output_dir, rel_dir, name))))
+    return sorted(tasks)
+
+def hash_bytes(data):
+    """Content hash used as the conversion cache key for a source file"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def load_cache(output_dir):
+    """Load the conversion cache index from output_dir (empty if missing or unreadable)"""
+    cache_file = os.path.join(output_dir, CACHE_NAME)
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+        if cache.get('version') == CACHE_VERSION:
+            return cache['entries']
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+def save_cache(entries, output_dir):
+    """Atomically write the conversion cache index to output_dir"""
+    cache_file = os.path.join(output_dir, CACHE_NAME)
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'entries': entries}, f)
+    os.replace(tmp_file, cache_file)
+
+def _output_matches(entry, output_path, options):
+    """Check that the output is the one the cache entry recorded, with the same options
+
+    The output's size and mtime must both match, so an output rewritten
+    by another run (e.g. with --no-cache and other options) is not trusted.
+    """
+    if entry is None or entry['options'] != options:
+        return False
+    try:
+        output = os.stat(output_path)
+    except OSError:
+        return False
+    return (entry['output_size'] == output.st_size and
+            entry['output_mtime_ns'] == output.st_mtime_ns)
+
+def _is_fresh(entry, input_path, output_path, options):
+    """Check a cache entry against the source stat, output file and options"""
+    if not _output_matches(entry, output_path, options):
+        return False
+    try:
+        source = os.stat(input_path)
+    except OSError:
+        return False
+    return (entry['source_size'] == source.st_size and
+            entry['source_mtime_ns'] == source.st_mtime_ns)
+
+def _cache_entry(result, options):
+    """Build the cache index entry for a successfully converted image"""
+    source = os.stat(result.input)
+    output = os.stat(result.output)
+    return {
+        'source_hash': result.source_hash,
+        'source_size': source.st_size,
+        'source_mtime_ns': source.st_mtime_ns,
+        'output_size': output.st_size,
+        'output_mtime_ns': output.st_mtime_ns,
+        'options': options,
+    }
+
+def run_tasks(worker, tasks, workers=1, chunksize=None):
+    """Yield worker(task) for every task, in task order
+
+    With ``workers`` > 1 the tasks run in a process pool. They are submitted
+    in chunks; a few chunks per worker keeps scheduling overhead low while
+    still balancing the load when image sizes differ.
+    """
+    if workers == 1 or len(tasks) <= 1:
+        yield from map(worker, tasks)
+        return
+    
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(worker, tasks, chunksize=chunksize)
+
+def _convert_task(task, options):
+    """Worker entry point: convert one image and report errors instead of raising
+
+    ``task`` carries the source hash recorded in the cache, or None unless
+    the recorded output is still in place. If the content hash of the
+    source still matches, the decode/resize/pack/write pipeline is skipped.
+    """
+    input_path, output_path, cached_hash = task
+    try:
+        with open(input_path, 'rb') as f:
+            source_hash = hash_bytes(f.read())
+        if source_hash == cached_hash and os.path.exists(output_path):
+            return ConversionResult(input_path, output_path, 'cached', None, source_hash)
+        
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        convert_file(input_path, output_path, **options)
+        return ConversionResult(input_path, output_path, 'ok', None, source_hash)
+    except Exception as e:
+        return ConversionResult(input_path, output_path, 'error', str(e), None)
+
+def write_manifest(results, manifest_file):
+    """Write the ordered conversion results as CSV (input, output, status, error)"""
+    with open(manifest_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['input', 'output', 'status', 'error'])
+        for result in results:
+            writer.writerow([result.input, result.output, result.status, result.error or ''])
+
+def process_directory(input_dir, output_dir, format_type='binary', word_bytes=4,
+                      byteorder='little', workers=1, chunksize=None,
+                      target_size=(224, 224), resample='lanczos', use_cache=True,
+                      backend='pil'):
+    """Process all image files in a directory
+
+    With ``workers`` > 1 the decode/resize/pack/write pipeline runs in a
+    process pool (``workers=0`` uses every core, see run_tasks()), and the
+    manifest written to ``output_dir/manifest.csv`` is identical for any
+    worker count.
+
+    A sidecar index in ``output_dir`` records the content hash of every
+    source together with the conversion options and the size and mtime of
+    its output. Images whose source and output are unchanged are skipped
+    without being read; touched sources are re-hashed and only re-converted
+    when their content or the options differ. With ``use_cache`` False
+    every image is converted and the index is rewritten for the new outputs.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    options = {
+        'format_type': format_type,
+        'word_bytes': word_bytes,
+        'byteorder': byteorder,
+        'target_size': list(target_size),
+        'resample': resample,
+        'backend': backend,
+    }
+    cache = load_cache(output_dir) if use_cache else {}
+    
+    # Resolve up-to-date images here so they never reach the workers
+    results = []
+    pending = []
+    order = {}
+    for index, (input_path, output_path) in enumerate(find_images(input_dir, output_dir,
+                                                                  format_type)):
+        entry = cache.get(os.path.relpath(input_path, input_dir))
+        order[input_path] = index
+        if _is_fresh(entry, input_path, output_path, options):
+            results.append(ConversionResult(input_path, output_path, 'cached',
+                                            None, entry['source_hash']))
+        else:
+            cached_hash = (entry['source_hash'] if _output_matches(entry, output_path, options)
+                           else None)
+            pending.append((input_path, output_path, cached_hash))
+    
+    workers = workers or os.cpu_count() or 1
+    worker = partial(_convert_task, options=options)
+    for result in run_tasks(worker, pending, workers, chunksize):
+        if result.status == 'ok':
+            print(f"Processed: {result.input} -> {result.output}")
+        elif result.status == 'error':
+            print(f"Error processing {result.input}: {result.error}")
+        results.append(result)
+    
+    results.sort(key=lambda result: order[result.input])
+    write_manifest(results, os.path.join(output_dir, MANIFEST_NAME))
+    
+    # Rewritten even without use_cache, so the index never describes outputs
+    # of an earlier run; only images seen in this run are kept
+    save_cache({os.path.relpath(result.input, input_dir): _cache_entry(result, options)
+                for result in results if result.status != 'error'}, output_dir)
+    
+    converted = sum(1 for result in results if result.status == 'ok')
+    cached = sum(1 for result in results if result.status == 'cached')
+    failed = len(results) - converted - cached
+    print(f"Converted {converted}/{len(results)} images "
+          f"({cached} up to date, {failed} errors, {workers} workers)")
+    return results
+
+def _label_task(task, lut, target_size):
+    """Worker entry point for process_labels(): convert one label map"""
+    input_path, output_path = task
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        convert_label_file(input_path, output_path, lut, target_size)
+        return ConversionResult(input_path, output_path, 'ok', None, None)
+    except Exception as e:
+        return ConversionResult(input_path, output_path, 'error', str(e), None)
+
+def process_labels(input_dir, output_dir, workers=1, chunksize=None, target_size=(224, 224),
+                   mapping_file=CLASS_MAPPING_FILE, ignore_void=False):
+    """Convert all Cityscapes labelIds PNGs in a directory into class-index PNGs
+
+    Outputs mirror the input tree with LABEL_SUFFIX renamed to IMAGE_SUFFIX,
+    so converting gtFine/val and leftImg8bit/val gives label paths that
+    match the image paths. With ``ignore_void`` the labels mapped to class 0
+    (unlabeled) become IGNORE_LABEL as well.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    lut, _ = parse_class_mapping(mapping_file)
+    if ignore_void:
+        lut[lut == 0] = IGNORE_LABEL
+
+    workers = workers or os.cpu_count() or 1
+    worker = partial(_label_task, lut=lut, target_size=tuple(target_size))
+    results = []
+    for result in run_tasks(worker, find_labels(input_dir, output_dir), workers, chunksize):
+        if result.status == 'ok':
+            print(f"Processed: {result.input} -> {result.output}")
+        else:
+            print(f"Error processing {result.input}: {result.error}")
+        results.append(result)
+    write_manifest(results, os.path.join(output_dir, MANIFEST_NAME))
+
+    failed = sum(1 for result in results if result.status == 'error')
+    print(f"Converted {len(results) - failed}/{len(results)} label maps "
+          f"({failed} errors, {workers} workers)")
+    return results
+
+def _pack_task(input_path, options):
+    """Worker entry point for pack_directory(): return the packed words of one image"""
+    try:
+        img_data = resize_image(input_path, tuple(options['target_size']), options['resample'],
+                                options['backend'])
+        binary_data = convert_to_binary(img_data, options['word_bytes'], options['byteorder'])
+        return input_path, binary_data, None
+    except Exception as e:
+        return input_path, None, str(e)
+
+def pack_directory(input_dir, output_file, word_bytes=4, byteorder='little', workers=1,
+                   chunksize=None, target_size=(224, 224), resample='lanczos', backend='pil'):
+    """Convert all images in a directory into a single packed dataset container
+
+    Frames are appended in sorted path order as workers finish them; images
+    that fail to convert are reported and left out. The manifest next to the
+    container maps each image to its frame number.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)
+    
+    options = {
+        'word_bytes': word_bytes,
+        'byteorder': byteorder,
+        'target_size': list(target_size),
+        'resample': resample,
+        'backend': backend,
+    }
+    inputs = [input_path for input_path, _ in find_images(input_dir, output_dir)]
+    workers = workers or os.cpu_count() or 1
+    worker = partial(_pack_task, options=options)
+    frame_shape = (target_size[1], target_size[0], 3)
+    
+    results = []
+    with PackedDatasetWriter(output_file, frame_shape, word_bytes, byteorder) as writer:
+        for input_path, binary_data, error in run_tasks(worker, inputs, workers, chunksize):
+            if error is None:
+                frame = writer.append(binary_data)
+                output = f"{output_file}[{frame}]"
+                print(f"Packed: {input_path} -> {output}")
+                results.append(ConversionResult(input_path, output, 'ok', None, None))
+            else:
+                print(f"Error processing {input_path}: {error}")
+                results.append(ConversionResult(input_path, '', 'error', error, None))
+    
+    write_manifest(results, os.path.splitext(output_file)[0] + '_' + MANIFEST_NAME)
+    
+    failed = sum(1 for result in results if result.status == 'error')
+    print(f"Packed {len(results) - failed}/{len(results)} images into {output_file} "
+          f"({failed} errors, {workers} workers)")
+    return results
 
 def main():
     parser = argparse.ArgumentParser(
@@ -112,28 +673,82 @@ def main():
     
     parser.add_argument('input', help='Input image file or directory')
     parser.add_argument('output', help='Output binary file or directory')
-    parser.add_argument('--format', choices=['binary', 'mem'], default='binary',
-                        help='Output format (binary or memory initialization file)')
+    parser.add_argument('--format', choices=sorted(FORMAT_EXTENSIONS) + ['packed'],
+                        default='binary',
+                        help='Output format: raw binary, memory initialization file '
+                             '(mem, readmemh, ihex), or a single packed dataset container')
+    parser.add_argument('--word-bytes', type=int, choices=sorted(WORD_DTYPES), default=4,
+                        help='SDRAM word size in bytes (default: 4)')
+    parser.add_argument('--byteorder', choices=['little', 'big'], default='little',
+                        help='Byte order inside each SDRAM word (default: little)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for directory input (0 = all cores, default: 1)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Images per task submitted to each worker (default: automatic)')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'), help='Target image size (default: 224 224)')
+    parser.add_argument('--resample', choices=sorted(RESAMPLE_FILTERS), default='lanczos',
+                        help='Resampling filter for the resize step (default: lanczos)')
+    parser.add_argument('--backend', choices=RESIZE_BACKENDS, default='pil',
+                        help='Resize implementation: PIL or OpenCV (default: pil)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Convert every image, ignoring the conversion cache '
+                             '(the cache is rewritten for the new outputs)')
+    parser.add_argument('--labels', action='store_true',
+                        help='Convert *_gtFine_labelIds.png ground truth into class-index PNGs '
+                             'named after their images (--format does not apply)')
+    parser.add_argument('--class-mapping', default=CLASS_MAPPING_FILE,
+                        help='Verilog labelId mapping for --labels '
+                             '(default: hdl/rtl/network/cityscapes_class_mapping.v)')
+    parser.add_argument('--ignore-void', action='store_true',
+                        help=f'With --labels, write unlabeled pixels as {IGNORE_LABEL} (ignored '
+                             'by evaluation) instead of class 0')
     
     args = parser.parse_args()
     
-    if os.path.isdir(args.input):
-        process_directory(args.input, args.output, args.format)
+    if args.labels and os.path.isdir(args.input):
+        try:
+            process_labels(args.input, args.output, args.workers, args.chunksize, args.size,
+                           args.class_mapping, args.ignore_void)
+        except Exception as e:
+            print(f"Error processing {args.class_mapping}: {e}")
+            sys.exit(1)
+    elif args.labels:
+        try:
+            lut, _ = parse_class_mapping(args.class_mapping)
+            if args.ignore_void:
+                lut[lut == 0] = IGNORE_LABEL
+            convert_label_file(args.input, args.output, lut, args.size)
+            print(f"Processed: {args.input} -> {args.output}")
+        except Exception as e:
+            print(f"Error processing {args.input}: {e}")
+            sys.exit(1)
+    elif os.path.isdir(args.input) and args.format == 'packed':
+        pack_directory(args.input, args.output, args.word_bytes, args.byteorder,
+                       args.workers, args.chunksize, args.size, args.resample, args.backend)
+    elif os.path.isdir(args.input):
+        process_directory(args.input, args.output, args.format,
+                          args.word_bytes, args.byteorder,
+                          args.workers, args.chunksize,
+                          args.size, args.resample, not args.no_cache, args.backend)
     else:
         # Process single file
         try:
-            img_data = resize_image(args.input)
-            binary_data = convert_to_binary(img_data)
-            
-            if args.format == 'binary':
-                save_binary_file(binary_data, args.output)
+            if args.format == 'packed':
+                img_data = resize_image(args.input, tuple(args.size), args.resample,
+                                        args.backend)
+                binary_data = convert_to_binary(img_data, args.word_bytes, args.byteorder)
+                with PackedDatasetWriter(args.output, img_data.shape, args.word_bytes,
+                                         args.byteorder) as writer:
+                    writer.append(binary_data)
             else:
-                save_memory_file(binary_data, args.output)
-            
+                convert_file(args.input, args.output, args.format,
+                             args.word_bytes, args.byteorder,
+                             args.size, args.resample, args.backend)
             print(f"Processed: {args.input} -> {args.output}")
         except Exception as e:
             print(f"Error processing {args.input}: {e}")
             sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
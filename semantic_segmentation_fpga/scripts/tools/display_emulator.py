@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Host-Side Emulator of result_display.v
+
+Renders class maps into the 640x480 frames the VGA output shows,
+reproducing result_display.v cycle for cycle without simulating its
+800x525 pixel clocks per frame:
+
+- the class map is not scaled: pixel (x, y) of the map lands on screen
+  pixel (x, y) while h_count < IMAGE_WIDTH and v_count < IMAGE_HEIGHT;
+  the rest of the screen is black
+- pixel_addr, pixel_data and the color registers form a two-read
+  pipeline that only advances on displayed pixels, so each screen pixel
+  shows the class read two displayed pixels earlier; column 0 is blanked
+  (h_active is registered) and columns 1 and 2 show the end of the
+  previous line
+- colors come from the class_color_r/g/b table parsed from the RTL;
+  entries the initial block leaves unset (classes 4-20) and class
+  values beyond the table read as ``--undefined-color`` (black, as
+  uninitialized registers power up on the FPGA)
+
+The screen-to-class-map mapping is computed once from the VGA timing, so
+each frame is one gather through a 256-entry RGB lookup table. Frames
+can be scaled up with nearest sampling to the resolution of a capture
+device and are written as PNGs or, with OpenCV, as a video.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:  # OpenCV is only needed for video output
+    cv2 = None
+
+from miou_evaluator import PREDICTION_EXTENSIONS, load_prediction
+from performance_model import RTL_DIR, parse_modules
+
+DISPLAY_FILE = os.path.join(RTL_DIR, 'core', 'result_display.v')
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv')
+
+def parse_palette(path=DISPLAY_FILE, undefined=(0, 0, 0)):
+    """(256, 3) uint8 RGB table of class_color_r/g/b; entries the RTL leaves unset are ``undefined``"""
+    with open(path) as f:
+        source = re.sub(r'//[^\n]*', '', f.read())
+    depth = int(re.search(r'class_color_r\s*\[\s*0\s*:\s*(\d+)\s*\]', source).group(1)) + 1
+    table = np.tile(np.array(undefined, dtype=np.uint8), (256, 1))
+    assigned = re.findall(r"class_color_([rgb])\s*\[\s*(\d+)\s*\]\s*=\s*\d*'([dDhH])([0-9a-fA-F]+)",
+                          source)
+    for channel, index, radix, digits in assigned:
+        if int(index) < depth:
+            table[int(index), 'rgb'.index(channel)] = int(digits, 16 if radix in 'hH' else 10)
+    return table
+
+def display_config(path=DISPLAY_FILE):
+    """IMAGE_WIDTH/HEIGHT defaults and VGA timing of result_display.v"""
+    return parse_modules(path)['result_display']['parameters']
+
+def display_mapping(config, width=None, height=None):
+    """(screen indices, class-map indices) of the displayed pixels, and the carried index
+
+    Pixels are in raster order. A class-map index of ``width * height``
+    stands for the class pixel_data still holds from the previous frame,
+    read from the carried index of that frame.
+    """
+    width = width or config['IMAGE_WIDTH']
+    height = height or config['IMAGE_HEIGHT']
+    h_total, v_total = config['H_TOTAL'], config['V_TOTAL']
+    h_visible, v_visible = config['H_VISIBLE'], config['V_VISIBLE']
+
+    v, h = np.divmod(np.arange(h_total * v_total), h_total)
+    # h_active/v_active hold the counts of the previous vga_clk cycle
+    prev_h, prev_v = np.roll(h, 1), np.roll(v, 1)
+    shown = (prev_h < h_visible) & (prev_v < v_visible) & (h < width) & (v < height)
+    addresses = (v * width + h)[shown]
+
+    # The color of a displayed pixel is read two displayed pixels earlier
+    sources = np.roll(addresses, 2)
+    carried = sources[0]
+    sources[0] = width * height
+    on_screen = (h[shown] < h_visible) & (v[shown] < v_visible)
+    screen = (v[shown] * h_visible + h[shown])[on_screen]
+    return screen, sources[on_screen], carried
+
+class DisplayEmulator:
+    """Renders a sequence of class maps into reused VGA frame buffers"""
+
+    def __init__(self, palette, config, width=None, height=None, scale=1):
+        self.palette = palette
+        self.width = width or config['IMAGE_WIDTH']
+        self.height = height or config['IMAGE_HEIGHT']
+        self.screen, self.sources, self.carried = display_mapping(config, self.width, self.height)
+        self.frame = np.zeros((config['V_VISIBLE'], config['H_VISIBLE'], 3), dtype=np.uint8)
+        self.classes = np.zeros(self.width * self.height + 1, dtype=np.uint8)
+        self.scale = scale
+        # pixel_data before the first frame; the register is not reset
+        self.carry = 0
+
+    def render(self, class_map):
+        """RGB frame shown for one class map (a view of the reused buffer)"""
+        count = self.width * self.height
+        self.classes[:count] = np.asarray(class_map, dtype=np.uint8).ravel()[:count]
+        # The first displayed pixel still shows pixel_data read during the last frame
+        self.classes[count] = self.carry
+        self.carry = self.classes[self.carried]
+        self.frame.reshape(-1, 3)[self.screen] = self.palette[self.classes[self.sources]]
+        if self.scale > 1:
+            return self.frame.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        return self.frame
+
+def find_class_maps(path):
+    """Sorted class-map files of a directory, or the file itself"""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(os.path.join(root, file) for root, _, files in os.walk(path)
+                  for file in files if file.lower().endswith(PREDICTION_EXTENSIONS))
+
+def read_class_maps(files, size):
+    """Yield (name, class map) for every frame, splitting .npy stacks on axis 0
+
+    Multi-channel images (e.g. color masks) are rejected, as they are not
+    class maps.
+    """
+    for path in files:
+        name, extension = os.path.splitext(os.path.basename(path))
+        maps = load_prediction(path, size)
+        if maps.ndim != 2 and (extension.lower() != '.npy' or maps.ndim != 3):
+            raise ValueError(f"{path}: expected a single-channel class map, got shape {maps.shape}")
+        if maps.ndim == 3:
+            for index, class_map in enumerate(maps):
+                yield f"{name}_{index:06d}", class_map
+        else:
+            yield name, maps
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render class maps as the VGA frames result_display.v outputs')
+
+    parser.add_argument('input', help='Class map (.png, .npy, .bin, $writememh dump) or directory')
+    parser.add_argument('output', help='Output directory of PNGs, or a video file (.mp4, .avi, .mkv)')
+    parser.add_argument('--rtl', default=DISPLAY_FILE, help='result_display.v to take the '
+                                                            'palette and timing from')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help='Class map size (default: IMAGE_WIDTH/HEIGHT of the RTL)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Nearest-neighbor upscaling of the output frames (default: 1)')
+    parser.add_argument('--undefined-color', type=int, nargs=3, default=[0, 0, 0],
+                        metavar=('R', 'G', 'B'),
+                        help='Color of classes without a palette entry (default: 0 0 0)')
+    parser.add_argument('--fps', type=float, default=60.0, help='Video frame rate (default: 60)')
+
+    args = parser.parse_args()
+
+    try:
+        config = display_config(args.rtl)
+        palette = parse_palette(args.rtl, args.undefined_color)
+    except Exception as e:
+        print(f"Error processing {args.rtl}: {e}")
+        sys.exit(1)
+    width, height = args.size or (config['IMAGE_WIDTH'], config['IMAGE_HEIGHT'])
+    emulator = DisplayEmulator(palette, config, width, height, max(1, args.scale))
+
+    files = find_class_maps(args.input)
+    if not files:
+        print(f"No class maps found in {args.input}")
+        sys.exit(1)
+
+    video = args.output.lower().endswith(VIDEO_EXTENSIONS)
+    writer = None
+    if video:
+        if cv2 is None:
+            print("Error: video output requires OpenCV (opencv-python)")
+            sys.exit(1)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    else:
+        os.makedirs(args.output, exist_ok=True)
+
+    count = 0
+    render_time = 0.0
+    start = time.perf_counter()
+    try:
+        for name, class_map in read_class_maps(files, (width, height)):
+            begin = time.perf_counter()
+            frame = emulator.render(class_map)
+            render_time += time.perf_counter() - begin
+            if video:
+                if writer is None:
+                    fourcc = cv2.VideoWriter_fourcc(*('mp4v' if args.output.endswith('.mp4')
+                                                      else 'MJPG'))
+                    writer = cv2.VideoWriter(args.output, fourcc, args.fps,
+                                             (frame.shape[1], frame.shape[0]))
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+            else:
+                Image.fromarray(frame).save(os.path.join(args.output, f"{name}.png"),
+                                            compress_level=1)
+            count += 1
+    except Exception as e:
+        print(f"Error processing {args.input}: {e}")
+        sys.exit(1)
+    finally:
+        if writer is not None:
+            writer.release()
+
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {count} frames to {args.output} in {elapsed:.2f}s "
+          f"({count / elapsed if elapsed else 0:.1f} FPS, emulation alone "
+          f"{count / render_time if render_time else 0:.0f} FPS)")
+
+if __name__ == "__main__":
+    main()
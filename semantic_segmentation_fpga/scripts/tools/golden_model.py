@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Bit-Accurate Golden Model of the FPGA Segmentation Datapath
+
+A NumPy reference for hdl/rtl/network and segmentation_processor.v that
+produces the same 16-bit buffers the RTL writes, so testbench outputs can
+be checked without simulating the network cycle by cycle.
+
+The model follows the RTL arithmetic exactly rather than an idealized
+Q8.8 network:
+
+- Pixels enter as {8'h0, pixel}. Convolutions accumulate in a signed
+  32-bit ``sum`` starting from the sign-extended 8-bit bias. Because
+  ``input_data`` is unsigned, ``input * kernel`` is evaluated unsigned, so
+  the signed 8-bit kernel acts as its zero-extended value (0..255).
+- Encoder stages keep ``sum[15:0]`` (wrap-around, no saturation) and ReLU
+  zeroes values with bit 15 set. Decoder stages 1-2 zero the output when
+  ``sum[31]`` is set and keep ``sum[15:0]`` otherwise. Decoder stage 3 is
+  a 1x1 convolution (kernel tap 0) whose logits are ``sum[15:0]``.
+- Buffers are written channel-major (channel, row, column) but the next
+  step indexes them as (row, column, channel). The model reinterprets the
+  flat buffers the same way instead of transposing them.
+- Decoder skip buffers are indexed at the upsampled resolution and read
+  past their end; iverilog returns X there, the model uses 0.
+- The argmax in POSTPROCESS uses non-blocking assignments, so each pixel
+  compares against the score left by the previous pixel, picks the last
+  class above it, and the class is written one pixel late. The registers
+  are uninitialized before the first pixel; the model treats them as 0.
+- PREPROCESS lasts a single cycle, so only ``scaled_input[0]`` receives
+  a pixel and the rest of the buffer keeps its reset value of 0. This is
+  modelled with ``rtl_preprocess=True`` (``--rtl-preprocess``); by
+  default the whole image is used, which is what the encoder and decoder
+  testbenches drive directly.
+
+Convolutions run as one matrix multiply per kernel tap (im2col over the
+3x3 window) in float64, which is exact for every sum these layer sizes
+can produce (< 2**53).
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+
+from cityscapes_data_converter import RESAMPLE_FILTERS, resize_image, save_memory_file
+
+# Channel widths of encoder_stage1..3 (segmentation_processor.v)
+ENCODER_CHANNELS = (64, 128, 256)
+NUM_CLASSES = 21
+
+# Layers with kernel/bias memories, in execution order
+LAYERS = ('encoder_stage1', 'encoder_stage2', 'encoder_stage3',
+          'decoder_stage1', 'decoder_stage2', 'decoder_stage3')
+
+def layer_shapes(input_channels=3, num_classes=NUM_CLASSES, channels=ENCODER_CHANNELS):
+    """(input channels, output channels) of each layer's kernel memory"""
+    c1, c2, c3 = channels
+    return {
+        'encoder_stage1': (input_channels, c1),
+        'encoder_stage2': (c1, c2),
+        'encoder_stage3': (c2, c3),
+        'decoder_stage1': (c3 + c3, c2),
+        'decoder_stage2': (c2 + c2, c1),
+        'decoder_stage3': (c1 + c1, num_classes),
+    }
+
+def random_weights(seed=0, input_channels=3, num_classes=NUM_CLASSES, channels=ENCODER_CHANNELS):
+    """Random int8 weights shaped like the RTL memories
+
+    Returns {layer: (kernel[in_ch][9][out_ch], bias[out_ch])}. The values do
+    not reproduce the RTL's $random initialization.
+    """
+    rng = np.random.default_rng(seed)
+    weights = {}
+    for name, (in_ch, out_ch) in layer_shapes(input_channels, num_classes, channels).items():
+        kernel = rng.integers(-128, 128, size=(in_ch, 9, out_ch), dtype=np.int8)
+        bias = rng.integers(-128, 128, size=out_ch, dtype=np.int8)
+        weights[name] = (kernel, bias)
+    return weights
+
+def read_memory_dump(path):
+    """Read a $readmemh/$writememh file as (values, known)
+
+    ``//`` comments and ``@address`` lines are honoured. Words containing
+    x or z digits read as 0 with ``known`` False; addresses never written
+    are left as unknown 0 as well.
+    """
+    with open(path, 'rb') as f:
+        text = re.sub(rb'//[^\n]*|/\*.*?\*/', b' ', f.read(), flags=re.S)
+    words = text.replace(b'_', b'').lower().split()
+
+    if b'@' in text:
+        data, addresses, address = [], [], 0
+        for word in words:
+            if word.startswith(b'@'):
+                address = int(word[1:], 16)
+            else:
+                data.append(word)
+                addresses.append(address)
+                address += 1
+        words, addresses = data, np.array(addresses, dtype=np.int64)
+    else:
+        addresses = np.arange(len(words), dtype=np.int64)
+
+    size = int(addresses.max()) + 1 if len(words) else 0
+    values = np.zeros(size, dtype=np.uint64)
+    known = np.zeros(size, dtype=bool)
+    if not words:
+        return values, known
+
+    # Decode every word at once: right-align the digits and look them up
+    width = max(map(len, words))
+    joined = b''.join(words)
+    if len(joined) != width * len(words):
+        joined = b''.join(word.rjust(width, b'0') for word in words)
+    digits = np.frombuffer(joined, dtype=np.uint8).reshape(-1, width)
+    lookup = np.full(256, 255, dtype=np.uint8)
+    for char in b'0123456789abcdef':
+        lookup[char] = int(chr(char), 16)
+    nibbles = lookup[digits]
+    valid = (nibbles != 255).all(axis=1)
+    shifts = np.arange(4 * (width - 1), -1, -4, dtype=np.uint64)
+    decoded = (np.where(valid[:, None], nibbles, 0).astype(np.uint64) << shifts).sum(axis=1)
+
+    values[addresses] = decoded
+    known[addresses] = valid
+    return values, known
+
+def read_memory_file(path, dtype=np.uint16):
+    """Read a $readmemh file; unknown (x/z) words read as 0"""
+    return read_memory_dump(path)[0].astype(dtype)
+
+def load_weights(path, num_classes=NUM_CLASSES, channels=ENCODER_CHANNELS):
+    """Load weights from an .npz file or a weight_exporter.py output directory
+
+    The .npz holds ``<layer>_kernel`` and ``<layer>_bias`` arrays; the
+    directory holds ``<layer>_kernel.memh`` and ``<layer>_bias.memh``,
+    shaped by ``num_classes`` and ``channels``.
+    """
+    if os.path.isdir(path):
+        weights = {}
+        for name, (in_ch, out_ch) in layer_shapes(3, num_classes, channels).items():
+            kernel = read_memory_file(os.path.join(path, f"{name}_kernel.memh"), np.uint8)
+            bias = read_memory_file(os.path.join(path, f"{name}_bias.memh"), np.uint8)
+            weights[name] = (kernel.view(np.int8).reshape(in_ch, 9, out_ch), bias.view(np.int8))
+        return weights
+    with np.load(path) as data:
+        return {name: (data[f"{name}_kernel"].astype(np.int8),
+                       data[f"{name}_bias"].astype(np.int8))
+                for name in LAYERS}
+
+def save_weights(weights, path):
+    """Save weights in the format read by load_weights()"""
+    arrays = {}
+    for name, (kernel, bias) in weights.items():
+        arrays[f"{name}_kernel"] = kernel
+        arrays[f"{name}_bias"] = bias
+    np.savez(path, **arrays)
+
+def relu16(values):
+    """ReLU on 16-bit buffers: zero every value with bit 15 set"""
+    return np.where(values & 0x8000, 0, values).astype(np.uint16)
+
+def conv_sums(x, kernel, bias, taps=9):
+    """Exact RTL convolution sums as an int64 (height, width, out_ch) array
+
+    ``x`` is (height, width, in_ch), ``kernel`` is int8 [in_ch][9][out_ch].
+    With ``taps=1`` only kernel tap 0 is used at the centre pixel (1x1
+    convolution); otherwise out-of-image taps are skipped (zero padding).
+    """
+    height, width, channels = x.shape
+    weights = np.asarray(kernel, dtype=np.int8).view(np.uint8).astype(np.float64)
+    out_ch = weights.shape[2]
+
+    if taps == 1:
+        sums = x.reshape(-1, channels).astype(np.float64) @ weights[:, 0, :]
+    else:
+        padded = np.zeros((height + 2, width + 2, channels), dtype=np.float64)
+        padded[1:-1, 1:-1] = x
+        sums = np.zeros((height * width, out_ch), dtype=np.float64)
+        for tap in range(9):
+            kh, kw = divmod(tap, 3)
+            window = padded[kh:kh + height, kw:kw + width].reshape(-1, channels)
+            sums += window @ weights[:, tap, :]
+
+    sums = sums.astype(np.int64) + np.asarray(bias, dtype=np.int8).astype(np.int64)
+    return sums.reshape(height, width, out_ch)
+
+def encoder_stage(input_data, width, height, kernel, bias):
+    """encoder_stageN: 3x3 conv, ReLU, 2x2 max pool
+
+    Returns the flat (conv_output, pool_output) buffers, both channel-major;
+    conv_output holds the values after the in-place RELU state.
+    """
+    in_ch, out_ch = kernel.shape[0], kernel.shape[2]
+    x = np.asarray(input_data, dtype=np.uint16).reshape(height, width, in_ch)
+    conv = relu16(conv_sums(x, kernel, bias) & 0xFFFF)
+    conv_output = conv.transpose(2, 0, 1).ravel()
+
+    # POOL indexes conv_output as (row, column, channel)
+    pool_h, pool_w = height // 2, width // 2
+    hwc = conv_output.reshape(height, width, out_ch)[:pool_h * 2, :pool_w * 2]
+    pooled = hwc.reshape(pool_h, 2, pool_w, 2, out_ch).max(axis=(1, 3))
+    return conv_output, pooled.transpose(2, 0, 1).ravel()
+
+def bottleneck(input_data):
+    """bottleneck: pass-through with ReLU"""
+    return relu16(np.asarray(input_data, dtype=np.uint16))
+
+def decoder_stage(input_data, skip_data, width, height, kernel, bias, logits=False):
+    """decoder_stageN: 2x nearest upsample, concat with skip, conv
+
+    ``width``/``height`` are the stage's input size. Returns the flat
+    (upsample_output, stage_output) buffers; with ``logits`` the stage is
+    decoder_stage3 (1x1 conv, no ReLU).
+    """
+    total_ch = kernel.shape[0]
+    in_ch = len(input_data) // (width * height)
+    skip_ch = total_ch - in_ch
+    out_h, out_w = height * 2, width * 2
+
+    x = np.asarray(input_data, dtype=np.uint16).reshape(height, width, in_ch)
+    upsample_output = x.repeat(2, axis=0).repeat(2, axis=1).transpose(2, 0, 1).ravel()
+
+    # CONCAT indexes both sources as (row, column, channel) at the output size
+    skip = np.zeros(out_h * out_w * skip_ch, dtype=np.uint16)
+    count = min(len(skip_data), len(skip))
+    skip[:count] = skip_data[:count]
+    concat = np.concatenate([upsample_output.reshape(out_h, out_w, in_ch),
+                             skip.reshape(out_h, out_w, skip_ch)], axis=2)
+    concat_data = concat.transpose(2, 0, 1).ravel()
+
+    # CONV indexes concat_data as (row, column, channel) as well
+    x = concat_data.reshape(out_h, out_w, total_ch)
+    if logits:
+        out = conv_sums(x, kernel, bias, taps=1) & 0xFFFF
+    else:
+        sums = conv_sums(x, kernel, bias)
+        out = np.where(sums & 0x80000000, 0, sums & 0xFFFF)
+    return upsample_output, out.astype(np.uint16).transpose(2, 0, 1).ravel()
+
+# Below this many unsettled pixels, segmentation_argmax finishes them one by one
+ARGMAX_SEQUENTIAL_PIXELS = 64
+
+def segmentation_argmax(logits, num_classes=NUM_CLASSES):
+    """POSTPROCESS argmax of segmentation_processor.v, including its register timing
+
+    Each pixel compares against the score the previous pixel left in
+    max_score and keeps the last class above it (score and class 0 if
+    none is), so the registers form a scan rather than a per-pixel argmax.
+    With the suffix maxima of each pixel's scores that class is the count
+    of suffix maxima above the previous score, minus one.
+
+    The scan is solved as a fixed point: every pixel is first evaluated as
+    if the previous score were 0, then only pixels whose predecessor
+    changed are re-evaluated, all at once, until nothing changes. The few
+    long dependency chains left at the end are finished sequentially. The
+    class is output one pixel late.
+    """
+    scores = np.asarray(logits, dtype=np.int32).reshape(-1, num_classes)
+    count = len(scores)
+    suffix_max = np.maximum.accumulate(scores[:, ::-1], axis=1)[:, ::-1]
+    # Score held after a pixel for each state (state num_classes: nothing found)
+    held = np.concatenate([scores, np.zeros((count, 1), dtype=np.int32)], axis=1).ravel()
+
+    def step(pixels, previous_scores):
+        above = (suffix_max[pixels] > previous_scores[:, None]).sum(axis=1)
+        return np.where(above > 0, above - 1, num_classes)
+
+    states = step(np.arange(count), np.zeros(count, dtype=np.int32))
+    if count:
+        # Larger than any 16-bit score: the uninitialized first comparison never succeeds
+        states[0] = num_classes
+    pending = np.arange(1, count)
+    while len(pending) > ARGMAX_SEQUENTIAL_PIXELS:
+        new = step(pending, held[(pending - 1) * (num_classes + 1) + states[pending - 1]])
+        changed = new != states[pending]
+        states[pending[changed]] = new[changed]
+        pending = pending[changed] + 1
+        pending = pending[pending < count]
+    for pixel in pending.tolist():
+        while pixel < count:
+            previous = held[(pixel - 1) * (num_classes + 1) + states[pixel - 1]]
+            new = step(np.array([pixel]), np.array([previous]))[0]
+            if new == states[pixel]:
+                break
+            states[pixel] = new
+            pixel += 1
+
+    # The class register is written one pixel late and starts at 0
+    classes = np.zeros(count, dtype=np.uint8)
+    classes[1:] = np.where(states[:-1] < num_classes, states[:-1], 0)
+    return classes
+
+def preprocess(image, rtl_preprocess=False):
+    """scaled_input of segmentation_processor.v: {8'h0, pixel} per byte
+
+    With ``rtl_preprocess`` only the first byte is copied, as the
+    one-cycle PREPROCESS state does.
+    """
+    scaled = np.asarray(image, dtype=np.uint16).ravel()
+    if rtl_preprocess:
+        first = scaled[:1]
+        scaled = np.zeros_like(scaled)
+        scaled[:1] = first
+    return scaled
+
+def run_network(image, weights, num_classes=NUM_CLASSES, rtl_preprocess=False):
+    """Run a (height, width, channels) uint8 image through the whole datapath
+
+    Returns a dict of the flat buffers named after the registers in
+    segmentation_processor.v (plus each stage's conv/upsample buffers),
+    ending with ``output_buffer``, the per-pixel class map.
+    """
+    height, width = image.shape[:2]
+    buffers = {'scaled_input': preprocess(image, rtl_preprocess)}
+
+    data = buffers['scaled_input']
+    size = (width, height)
+    for stage in range(1, 4):
+        name = f'encoder_stage{stage}'
+        conv, data = encoder_stage(data, size[0], size[1], *weights[name])
+        buffers[f'{name}_conv'] = conv
+        buffers[name] = data
+        size = (size[0] // 2, size[1] // 2)
+
+    data = buffers['bottleneck'] = bottleneck(data)
+    for stage, skip in ((1, 'encoder_stage3'), (2, 'encoder_stage2'), (3, 'encoder_stage1')):
+        name = f'decoder_stage{stage}'
+        upsample, data = decoder_stage(data, buffers[skip], size[0], size[1], *weights[name],
+                                       logits=stage == 3)
+        buffers[f'{name}_upsample'] = upsample
+        buffers['logits' if stage == 3 else name] = data
+        size = (size[0] * 2, size[1] * 2)
+
+    buffers['output_buffer'] = segmentation_argmax(buffers['logits'], num_classes)
+    return buffers
+
+def load_input(path, target_size=(224, 224), resample='lanczos'):
+    """Load a network input: a raw .bin frame from the converter or any image file"""
+    width, height = target_size
+    if path.endswith('.bin'):
+        data = np.fromfile(path, dtype=np.uint8)
+        if len(data) < width * height * 3:
+            raise ValueError(f"{path}: {len(data)} bytes, expected {width * height * 3}")
+        return data[:width * height * 3].reshape(height, width, 3)
+    return resize_image(path, target_size, resample)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the bit-accurate golden model of the FPGA segmentation datapath')
+
+    parser.add_argument('input', help='Input image, or a little-endian .bin frame from the converter')
+    parser.add_argument('--output-dir', help='Write every buffer as a $readmemh file here')
+    parser.add_argument('--weights', help='Weights .npz or weight_exporter.py output directory '
+                             '(default: random weights from --seed)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for random weights when --weights is not given (default: 0)')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'), help='Network input size (default: 224 224)')
+    parser.add_argument('--resample', choices=sorted(RESAMPLE_FILTERS), default='lanczos',
+                        help='Resampling filter for image inputs (default: lanczos)')
+    parser.add_argument('--rtl-preprocess', action='store_true',
+                        help='Copy only the first input byte, like the one-cycle PREPROCESS state')
+
+    args = parser.parse_args()
+
+    try:
+        image = load_input(args.input, tuple(args.size), args.resample)
+        weights = load_weights(args.weights) if args.weights else random_weights(args.seed)
+    except Exception as e:
+        print(f"Error processing {args.input}: {e}")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    buffers = run_network(image, weights, rtl_preprocess=args.rtl_preprocess)
+    elapsed = time.perf_counter() - start_time
+
+    classes = np.bincount(buffers['output_buffer'], minlength=NUM_CLASSES)
+    print(f"Processed: {args.input} ({args.size[0]}x{args.size[1]}, {elapsed:.3f}s)")
+    print("Class histogram: " + ", ".join(f"{c}: {n}" for c, n in enumerate(classes) if n))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for name, buffer in buffers.items():
+            dtype = np.uint8 if name == 'output_buffer' else np.uint16
+            save_memory_file(buffer.astype(dtype), os.path.join(args.output_dir, f"{name}.memh"),
+                             'readmemh')
+        print(f"Wrote {len(buffers)} buffers to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
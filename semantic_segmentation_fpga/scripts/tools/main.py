@@ -1,79 +1,526 @@
 import cv2
+import sys
+import json
 import time
+import queue
+import argparse
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+import numpy as np
 from ultralytics import YOLO
 import torch
 
+from overlay import OverlayRenderer
+from realtime import KeyframeScheduler, MaskPropagator, analysis_image, results_to_class_map
+from sinks import ENCODER_COMMAND, SINKS, AsyncSink, open_sink
 
-# Define paths to the YOLO model and input video
+
+# Default paths to the YOLO model and input video
 MODEL_PATH = r"C:\Capstone-Project-1\last.pt"
 VIDEO_PATH = r"C:\Capstone-Project-1\DEMOVIDEO.mp4"
 
+# Pipelined mode: a reader thread and a writer thread overlap decoding and
+# encoding with batched inference on the main thread
+BATCH_SIZE = 4    # Frames per inference call
+QUEUE_SIZE = 4    # Batches buffered between pipeline stages
+SINK_QUEUE_SIZE = 8  # Frames buffered in front of the output sink thread
 
-def main():
-    # Check if GPU is available and use it if possible
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+CONFIDENCE = 0.33  # Default confidence threshold
 
-    # Load the YOLO model for segmentation
-    model = YOLO(MODEL_PATH).to(device)
+# Untimed inference calls before processing, so first-call setup (CUDA
+# context, cuDNN autotuning, lazy initialization) is not benchmarked
+WARMUP_ITERATIONS = 5
 
-    # Open the input video file
-    cap = cv2.VideoCapture(VIDEO_PATH)
-    if not cap.isOpened():
-        print(f"Error: Could not open video {VIDEO_PATH}")
-        return
+# Stages timed by StageTimer, in pipeline order; 'output' is the time spent
+# handing frames to the sink (waiting while its queue is full) and 'encode'
+# the time the sink thread spends writing them
+STAGES = ('decode', 'inference', 'rasterize', 'track', 'plot', 'output', 'encode', 'display')
 
-    # Get video properties for output configuration
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
 
-    # Set up the output video writer
-    output_path = str(Path(VIDEO_PATH).with_name(Path(VIDEO_PATH).stem + "_segmented.mp4"))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec for MP4
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+class StageTimer:
+    """Collect per-stage latency samples and summarize them as percentiles
+
+    Each stage is only recorded from one thread, so the pipelined mode can
+    share a single timer between its reader, inference and writer threads.
+    """
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start)
+
+    def summary(self):
+        """Latency statistics in milliseconds for every stage that was timed"""
+        summary = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1e3
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            summary[stage] = {
+                'count': len(ms),
+                'mean_ms': round(float(ms.mean()), 3),
+                'p50_ms': round(float(p50), 3),
+                'p90_ms': round(float(p90), 3),
+                'p99_ms': round(float(p99), 3),
+                'max_ms': round(float(ms.max()), 3),
+            }
+        return summary
+
+
+def read_frame(cap, timer):
+    """Read the next frame, timing the decode"""
+    with timer.measure('decode'):
+        return cap.read()
+
+
+def read_batches(cap, batch_queue, batch_size, stop, timer, max_frames=None):
+    """Read frames into batches and put them on a bounded queue (None marks the end)"""
+    try:
+        batch = []
+        frame_count = 0
+        while not stop.is_set() and (max_frames is None or frame_count < max_frames):
+            ret, frame = read_frame(cap, timer)
+            if not ret:  # Exit if no more frames are available
+                break
+            frame_count += 1
+            batch.append(frame)
+            if len(batch) == batch_size:
+                batch_queue.put(batch)
+                batch = []
+        if batch:
+            batch_queue.put(batch)
+    finally:
+        batch_queue.put(None)
+
+
+def annotate(results, frame_count, start_time, renderer=None, frame=None, class_map=None):
+    """Draw segmentation results and the running FPS on a frame
+
+    Without a renderer, Ultralytics' results.plot() draws a new frame;
+    otherwise the renderer draws in place into ``frame`` (by default the
+    result's original image), reusing ``class_map`` if given.
+    """
+    if renderer is None:
+        return draw_fps(results.plot(), frame_count, start_time)
+    return draw_fps(renderer.render(results, frame, class_map), frame_count, start_time)
+
+
+def output_class_map(out, results):
+    """Class map to write if ``out`` is a mask sink, otherwise None"""
+    if out is None or not out.masks:
+        return None
+    return results_to_class_map(results, results.orig_img.shape)
+
 
+def write_output(out, annotated_frame, class_map, timer):
+    """Hand an annotated frame, or the class map to a mask sink, to the output sink"""
+    if out is not None:
+        with timer.measure('output'):
+            out.write(class_map if out.masks else annotated_frame)
+
+
+def draw_fps(frame, frame_count, start_time):
+    """Calculate and display the running FPS on a frame"""
+    elapsed_time = time.time() - start_time
+    fps_text = f"FPS: {frame_count / elapsed_time:.2f}"
+    cv2.putText(frame, fps_text, (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)  # Red text at top-left
+    return frame
+
+
+def write_results(out, result_queue, display_queue, start_time, timer, errors, renderer=None):
+    """Annotate and encode inference results in frame order (None marks the end)
+
+    On failure the error is recorded in ``errors`` and the queue is still
+    drained, so the inference loop never blocks on a dead writer.
+    """
+    frame_count = 0
+    while True:
+        batch_results = result_queue.get()
+        if batch_results is None:
+            break
+        if errors:
+            continue
+        try:
+            frame_count = write_batch(out, batch_results, display_queue,
+                                      frame_count, start_time, timer, renderer)
+        except Exception as e:
+            errors.append(e)
+
+
+def write_batch(out, batch_results, display_queue, frame_count, start_time, timer,
+                renderer=None):
+    """Annotate, output and publish one batch of results; return the new frame count
+
+    Frames are only annotated if they are displayed or the sink takes
+    annotated frames.
+    """
+    for results in batch_results:
+        frame_count += 1
+        with timer.measure('plot'):
+            class_map = output_class_map(out, results)
+            annotated_frame = None
+            if class_map is None or display_queue is not None:
+                annotated_frame = annotate(results, frame_count, start_time, renderer,
+                                           class_map=class_map)
+        write_output(out, annotated_frame, class_map, timer)
+
+        if annotated_frame is not None and display_queue is not None:
+            # Keep only the newest frame for display; the main thread shows it
+            try:
+                display_queue.get_nowait()
+            except queue.Empty:
+                pass
+            display_queue.put(annotated_frame)
+    return frame_count
+
+
+def show(frame, timer):
+    """Display a frame; return True if 'q' was pressed"""
+    with timer.measure('display'):
+        cv2.imshow("Segmentation", frame)
+        return cv2.waitKey(1) & 0xFF == ord('q')
+
+
+def run_sequential(model, cap, out, device, timer, conf=CONFIDENCE, display=True,
+                   max_frames=None, renderer=None):
+    """Decode, segment, annotate and encode one frame at a time; return the frame count"""
     # Variables for FPS calculation
     frame_count = 0
     start_time = time.time()
 
     # Process the video frame by frame
-    while True:
-        ret, frame = cap.read()
+    while max_frames is None or frame_count < max_frames:
+        ret, frame = read_frame(cap, timer)
         if not ret:  # Exit if no more frames are available
             break
 
         # Perform segmentation on the current frame
-        results = model(frame, conf=0.33, device=device)  # Confidence threshold of 0.33
+        with timer.measure('inference'):
+            results = model(frame, conf=conf, device=device, verbose=False)
 
-        # Annotate the frame with segmentation results
-        annotated_frame = results[0].plot()
-
-        # Calculate and display FPS on the frame
+        # Annotate the frame with segmentation results and FPS
         frame_count += 1
-        elapsed_time = time.time() - start_time
-        fps_text = f"FPS: {frame_count / elapsed_time:.2f}"
-        cv2.putText(annotated_frame, fps_text, (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)  # Red text at top-left
+        with timer.measure('plot'):
+            class_map = output_class_map(out, results[0])
+            annotated_frame = None
+            if class_map is None or display:
+                annotated_frame = annotate(results[0], frame_count, start_time, renderer,
+                                           frame, class_map)
+
+        # Write the annotated frame (or class map) to the output sink
+        write_output(out, annotated_frame, class_map, timer)
+
+        # Display the frame in a window; exit if 'q' is pressed
+        if display and show(annotated_frame, timer):
+            break
+
+    return frame_count
 
-        # Write the annotated frame to the output video
-        out.write(annotated_frame)
 
-        # Display the frame in a window
-        cv2.imshow("Segmentation", annotated_frame)
+def run_pipelined(model, cap, out, device, timer, conf=CONFIDENCE, display=True,
+                  max_frames=None, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE, renderer=None):
+    """Overlap decoding, batched inference and annotation/encoding
 
-        # Exit if 'q' is pressed
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+    A reader thread fills a bounded queue with batches of frames, the main
+    thread runs the model on each batch, and a writer thread annotates the
+    results and hands them to the output sink (which encodes on a thread
+    of its own). Queues are FIFO with one producer and one consumer
+    each, so frames are written in their original order. Returns the number
+    of frames processed.
+    """
+    batch_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+    display_queue = queue.Queue(maxsize=1) if display else None
+    stop = threading.Event()
+    write_errors = []
+    frame_count = 0
+    start_time = time.time()
+
+    reader = threading.Thread(target=read_batches,
+                              args=(cap, batch_queue, batch_size, stop, timer, max_frames),
+                              daemon=True)
+    writer = threading.Thread(target=write_results,
+                              args=(out, result_queue, display_queue, start_time, timer,
+                                    write_errors, renderer),
+                              daemon=True)
+    reader.start()
+    writer.start()
+
+    try:
+        while True:
+            batch = batch_queue.get()
+            if batch is None:
+                break
+
+            # Perform segmentation on the whole batch in one call
+            with timer.measure('inference'):
+                batch_results = model(batch, conf=conf, device=device, verbose=False)
+            result_queue.put(batch_results)
+            frame_count += len(batch)
+
+            if display:
+                # Display the newest annotated frame (GUI calls stay on the main thread)
+                try:
+                    if show(display_queue.get_nowait(), timer):
+                        break
+                except queue.Empty:
+                    pass
+    finally:
+        # Stop the reader and drain its queue so it can exit
+        stop.set()
+        while reader.is_alive():
+            try:
+                batch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        result_queue.put(None)
+        writer.join()
+
+    if write_errors:
+        raise write_errors[0]
+    return frame_count
+
+
+def run_realtime(model, cap, out, device, timer, conf=CONFIDENCE, display=True,
+                 max_frames=None, target_fps=30.0, max_interval=10, scene_threshold=0.08,
+                 flow=False, renderer=None):
+    """Hold a target frame rate by running the model on keyframes only
+
+    Intermediate frames reuse the last keyframe's masks (optionally warped
+    along optical flow, see realtime.py). The keyframe interval adapts to
+    the measured model and reuse latencies, and a scene change forces a new
+    keyframe. Returns (frame count, keyframe count).
+    """
+    renderer = renderer or OverlayRenderer()
+    scheduler = KeyframeScheduler(target_fps, max_interval, scene_threshold)
+    propagator = MaskPropagator(flow)
+    frame_count = 0
+    start_time = time.time()
+
+    while max_frames is None or frame_count < max_frames:
+        ret, frame = read_frame(cap, timer)
+        if not ret:  # Exit if no more frames are available
+            break
+
+        frame_start = time.perf_counter()
+        gray = analysis_image(frame)
+        keyframe = scheduler.is_keyframe(gray)
+        if keyframe:
+            with timer.measure('inference'):
+                results = model(frame, conf=conf, device=device, verbose=False)
+            with timer.measure('rasterize'):
+                class_map = results_to_class_map(results[0], frame.shape)
+            propagator.reset(class_map, gray)
+        else:
+            with timer.measure('track'):
+                class_map = propagator.propagate(gray)
+
+        frame_count += 1
+        annotated_frame = None
+        if out is None or not out.masks or display:
+            with timer.measure('plot'):
+                annotated_frame = draw_fps(renderer.blend(frame, class_map), frame_count,
+                                           start_time)
+        # Both kinds of frames are timed over the same steps, so their latencies
+        # differ by model + rasterization versus mask propagation only
+        scheduler.update(gray, keyframe, time.perf_counter() - frame_start)
+
+        write_output(out, annotated_frame, class_map, timer)
+
+        # Display the frame in a window; exit if 'q' is pressed
+        if display and show(annotated_frame, timer):
             break
 
-    # Clean up: release video capture, writer, and close windows
+    return frame_count, scheduler.keyframes
+
+
+def warm_up(model, width, height, device, conf, iterations, batch_size):
+    """Run the model on blank frames so lazy initialization is not benchmarked"""
+    blank = np.zeros((height, width, 3), dtype=np.uint8)
+    batch = [blank] * batch_size if batch_size > 1 else blank
+    for _ in range(iterations):
+        model(batch, conf=conf, device=device, verbose=False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run YOLO segmentation on a video and benchmark the pipeline')
+
+    parser.add_argument('--model', default=MODEL_PATH, help='YOLO segmentation model (.pt)')
+    parser.add_argument('--video', default=VIDEO_PATH, help='Input video file')
+    parser.add_argument('--sink', choices=SINKS, default='video',
+                        help="Output: 'video' (cv2.VideoWriter), 'pipe' (raw frames to "
+                             "--encoder), 'png' (frame sequence), 'masks' (PNGs of class ids, "
+                             "background 255, instead of video) or 'null' (discard) (default: video)")
+    parser.add_argument('--encoder', default=ENCODER_COMMAND,
+                        help='Encoder command of the pipe sink; {width}, {height}, {fps} and '
+                             '{output} are filled in (default: ffmpeg with libx264)')
+    parser.add_argument('--sink-queue', type=int, default=SINK_QUEUE_SIZE,
+                        help=f'Frames buffered in front of the sink thread '
+                             f'(default: {SINK_QUEUE_SIZE})')
+    parser.add_argument('--output', default=None,
+                        help='Output video, or directory of the png and masks sinks '
+                             '(default: <video>_segmented.mp4, <video>_segmented or '
+                             '<video>_masks)')
+    parser.add_argument('--device', default=None,
+                        help='Inference device, e.g. cpu or cuda:0 (default: cuda if available)')
+    parser.add_argument('--conf', type=float, default=CONFIDENCE,
+                        help=f'Confidence threshold (default: {CONFIDENCE})')
+    parser.add_argument('--sequential', action='store_true',
+                        help='Process one frame at a time instead of the pipelined mode')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Run the model on adaptive keyframes only and reuse masks in between')
+    parser.add_argument('--target-fps', type=float, default=None,
+                        help='Frame rate to hold in realtime mode (default: video FPS or 30)')
+    parser.add_argument('--max-interval', type=int, default=10,
+                        help='Maximum frames between keyframes in realtime mode (default: 10)')
+    parser.add_argument('--scene-threshold', type=float, default=0.08,
+                        help='Scene change (0-1) that forces a keyframe in realtime mode '
+                             '(default: 0.08)')
+    parser.add_argument('--flow', action='store_true',
+                        help='Warp reused masks along optical flow in realtime mode')
+    parser.add_argument('--overlay', choices=['fast', 'ultralytics'], default='fast',
+                        help="Overlay renderer: 'fast' blends a class map in place (see "
+                             "overlay.py), 'ultralytics' uses results.plot() (default: fast)")
+    parser.add_argument('--alpha', type=float, default=0.5,
+                        help='Mask opacity of the fast overlay (default: 0.5)')
+    parser.add_argument('--boxes', action='store_true',
+                        help='Draw instance boxes with the fast overlay')
+    parser.add_argument('--labels', action='store_true',
+                        help='Draw class labels and confidences with the fast overlay')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'Frames per inference call in pipelined mode (default: {BATCH_SIZE})')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help=f'Batches buffered between pipeline stages (default: {QUEUE_SIZE})')
+    parser.add_argument('--no-display', action='store_true',
+                        help='Do not open a display window (headless)')
+    parser.add_argument('--no-write', action='store_true',
+                        help='Do not open an output sink')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='Stop after this many frames')
+    parser.add_argument('--warmup', type=int, default=WARMUP_ITERATIONS,
+                        help=f'Untimed warmup inference calls before processing, 0 to disable '
+                             f'(default: {WARMUP_ITERATIONS})')
+    parser.add_argument('--json', metavar='PATH', default=None,
+                        help="Write benchmark results as JSON to PATH ('-' for stdout)")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Check if GPU is available and use it if possible
+    if args.device:
+        device = torch.device(args.device)
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}", file=sys.stderr if args.json == '-' else sys.stdout)
+
+    # Load the YOLO model for segmentation
+    model = YOLO(args.model).to(device)
+
+    # Open the input video file
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {args.video}")
+        sys.exit(1)
+
+    # Get video properties for output configuration
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    # Set up the output sink on its own thread
+    timer = StageTimer()
+    out = None
+    suffix = {'png': '_segmented', 'masks': '_masks'}.get(args.sink, '_segmented.mp4')
+    output_path = args.output or str(Path(args.video).with_name(Path(args.video).stem + suffix))
+    if not args.no_write:
+        try:
+            sink = open_sink(args.sink, output_path, fps if fps > 0 else 30.0, (width, height),
+                             args.encoder)
+        except Exception as e:
+            print(f"Error: Could not open {args.sink} output {output_path}: {e}")
+            sys.exit(1)
+        out = AsyncSink(sink, args.sink_queue, timer)
+
+    batch_size = 1 if args.sequential or args.realtime else max(1, args.batch_size)
+    if args.warmup:
+        warm_up(model, width, height, device, args.conf, args.warmup, batch_size)
+
+    renderer = None
+    if args.overlay == 'fast' or args.realtime:
+        renderer = OverlayRenderer(args.alpha, boxes=args.boxes, labels=args.labels)
+
+    display = not args.no_display
+    keyframes = None
+    start_time = time.perf_counter()
+    if args.realtime:
+        target_fps = args.target_fps or (fps if fps and fps > 0 else 30.0)
+        frame_count, keyframes = run_realtime(model, cap, out, device, timer, args.conf,
+                                              display, args.max_frames, target_fps,
+                                              args.max_interval, args.scene_threshold,
+                                              args.flow, renderer)
+    elif args.sequential:
+        frame_count = run_sequential(model, cap, out, device, timer, args.conf, display,
+                                     args.max_frames, renderer)
+    else:
+        frame_count = run_pipelined(model, cap, out, device, timer, args.conf, display,
+                                    args.max_frames, batch_size, max(1, args.queue_size),
+                                    renderer)
+    # Frames still queued for the sink count towards the wall time
+    if out is not None:
+        out.close()
+    wall_time = time.perf_counter() - start_time
+
+    # Clean up: release video capture and close windows
     cap.release()
-    out.release()
-    cv2.destroyAllWindows()
+    if display:
+        cv2.destroyAllWindows()
+
+    if args.realtime:
+        mode = 'realtime'
+    else:
+        mode = 'sequential' if args.sequential else 'pipelined'
+    report = {
+        'model': args.model,
+        'video': args.video,
+        'device': str(device),
+        'mode': mode,
+        'batch_size': batch_size,
+        'overlay': 'fast' if renderer is not None else 'ultralytics',
+        'warmup': args.warmup,
+        'display': display,
+        'write': out is not None,
+        'sink': args.sink if out is not None else None,
+        'frames': frame_count,
+        'wall_time_s': round(wall_time, 4),
+        'fps': round(frame_count / wall_time, 3) if wall_time > 0 else 0.0,
+        'keyframes': keyframes,
+        'stages': timer.summary(),
+    }
 
-    # Print the location of the saved output video
-    print(f"Segmentation completed. Output saved to {output_path}")
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        # Print the location of the saved output video
+        if out is not None and args.sink != 'null':
+            print(f"Segmentation completed. Output saved to {output_path}")
+        print(f"Processed {frame_count} frames in {wall_time:.2f}s ({report['fps']:.2f} FPS)")
 
 # Run the script if executed directly
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Streaming mIoU Evaluator for Predicted Class Maps
+
+Compares predicted class maps against ground-truth class-index labels
+(e.g. from ``cityscapes_data_converter.py --labels``) and reports
+per-class IoU, mIoU and pixel accuracy. Predictions can come from:
+
+- RTL simulations: ``output_buffer`` dumps written with $writememh
+  (.memh/.mem/.hex); pixels with x/z bits count as wrong
+- golden_model.py or any other tool writing .npy arrays or raw .bin bytes
+- class-index PNGs, such as the ``--sink masks`` output of main.py
+  (class ids, background 255)
+
+A prediction is paired with the label at the same relative path (without
+extension) under the label directory; a file named after a buffer, like
+``case/output_buffer.memh``, is named by its directory instead. With
+``--pair-by order`` the predictions and labels are instead paired in
+sorted path order, e.g. main.py's frame_NNNNNN.png masks with the labels
+of the video's frames. Flat
+dumps are reshaped to ``--size``; labels of another size are letterboxed
+onto the prediction with nearest sampling.
+
+Pairs are split into shards that worker processes evaluate one frame at
+a time into their own confusion matrix (one bincount per frame), and the
+matrices are summed at the end, so memory use does not grow with the
+dataset. Predicted classes outside the evaluated range count as false
+negatives of the labeled class.
+"""
+
+import os
+import sys
+import json
+import argparse
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from cityscapes_data_converter import IGNORE_LABEL, letterbox_labels, run_tasks
+from golden_model import NUM_CLASSES, read_memory_dump
+
+PREDICTION_EXTENSIONS = ('.png', '.npy', '.bin', '.memh', '.mem', '.hex')
+
+# Dump names that identify a buffer rather than a frame
+BUFFER_NAMES = ('output_buffer', 'mask', 'classes')
+
+def load_prediction(path, size=(224, 224)):
+    """(height, width) class map of a prediction file; unknown pixels are 255"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.png':
+        values = np.asarray(Image.open(path))
+    elif extension == '.npy':
+        values = np.load(path, mmap_mode='r')
+    elif extension == '.bin':
+        values = np.fromfile(path, dtype=np.uint8)
+    else:
+        values, known = read_memory_dump(path)
+        values = np.where(known, values, IGNORE_LABEL)
+    if values.ndim == 1:
+        if len(values) != size[0] * size[1]:
+            raise ValueError(f"{len(values)} values do not form a {size[0]}x{size[1]} map")
+        values = values.reshape(size[1], size[0])
+    return np.minimum(values, IGNORE_LABEL).astype(np.uint8)
+
+def load_ground_truth(path, shape):
+    """Class-index label PNG letterboxed onto a (height, width) prediction"""
+    label = np.asarray(Image.open(path))
+    if label.ndim != 2:
+        raise ValueError(f"Expected a single-channel label map, got shape {label.shape}")
+    if label.shape != shape:
+        label = letterbox_labels(label, (shape[1], shape[0]))
+    return label
+
+def confusion_matrix(labels, predictions, num_classes=NUM_CLASSES):
+    """(num_classes + 1)^2 counts of (label, prediction) pairs
+
+    Row/column ``num_classes`` collects predictions outside the class range;
+    labels outside it (padding, void) are ignored.
+    """
+    valid = labels < num_classes
+    index = (labels[valid].astype(np.int64) * (num_classes + 1)
+             + np.minimum(predictions[valid], num_classes))
+    size = (num_classes + 1) ** 2
+    return np.bincount(index, minlength=size).reshape(num_classes + 1, num_classes + 1)
+
+def iou_scores(confusion):
+    """Per-class IoU (NaN for classes absent from labels and predictions), mIoU and pixel accuracy
+
+    Takes a confusion_matrix(); out-of-range predictions count as false
+    negatives of the labeled class.
+    """
+    num_classes = confusion.shape[0] - 1
+    tp = np.diag(confusion)[:num_classes].astype(np.float64)
+    union = confusion.sum(axis=0)[:num_classes] + confusion.sum(axis=1)[:num_classes] - tp
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = tp / union
+    total = confusion.sum()
+    accuracy = tp.sum() / total if total else float('nan')
+    return iou, float(np.nanmean(iou)) if np.any(union) else float('nan'), float(accuracy)
+
+def _prediction_files(prediction_dir):
+    """Sorted prediction paths under a directory"""
+    return sorted(os.path.join(root, file) for root, _, files in os.walk(prediction_dir)
+                  for file in files if os.path.splitext(file)[1].lower() in PREDICTION_EXTENSIONS)
+
+def find_pairs(prediction_dir, label_dir, by='name'):
+    """(prediction, label) pairs, plus predictions without a label
+
+    ``by='order'`` pairs the n-th prediction with the n-th label PNG in
+    sorted path order; labels beyond the last prediction are unused.
+    """
+    if by == 'order':
+        predictions = _prediction_files(prediction_dir)
+        labels = sorted(os.path.join(root, file) for root, _, files in os.walk(label_dir)
+                        for file in files if file.lower().endswith('.png'))
+        return list(zip(predictions, labels)), predictions[len(labels):]
+
+    pairs, missing = [], []
+    for root, _, files in os.walk(prediction_dir):
+        for file in files:
+            stem, extension = os.path.splitext(file)
+            if extension.lower() not in PREDICTION_EXTENSIONS:
+                continue
+            path = os.path.join(root, file)
+            rel_stem = os.path.relpath(os.path.join(root, stem), prediction_dir)
+            if stem in BUFFER_NAMES and root != prediction_dir:
+                rel_stem = os.path.relpath(root, prediction_dir)
+            label = os.path.join(label_dir, rel_stem + '.png')
+            if os.path.exists(label):
+                pairs.append((path, label))
+            else:
+                missing.append(path)
+    return sorted(pairs), sorted(missing)
+
+def _evaluate_shard(shard, num_classes, size):
+    """Worker entry point: confusion matrix of a shard and its (path, error) failures"""
+    confusion = np.zeros((num_classes + 1, num_classes + 1), dtype=np.int64)
+    errors = []
+    for prediction_path, label_path in shard:
+        try:
+            predictions = load_prediction(prediction_path, size)
+            labels = load_ground_truth(label_path, predictions.shape)
+            confusion += confusion_matrix(labels, predictions, num_classes)
+        except Exception as e:
+            errors.append((prediction_path, str(e)))
+    return confusion, errors
+
+def evaluate(pairs, num_classes=NUM_CLASSES, size=(224, 224), workers=1, shards_per_worker=4):
+    """Summed confusion matrix over all pairs and the failed predictions"""
+    count = max(1, min(len(pairs), workers * shards_per_worker))
+    shards = [pairs[i::count] for i in range(count)]
+    confusion = np.zeros((num_classes + 1, num_classes + 1), dtype=np.int64)
+    errors = []
+    worker = partial(_evaluate_shard, num_classes=num_classes, size=size)
+    for shard_confusion, shard_errors in run_tasks(worker, shards, workers, chunksize=1):
+        confusion += shard_confusion
+        errors += shard_errors
+    return confusion, errors
+
+def summarize(confusion):
+    """Per-class IoU, mIoU and pixel accuracy of an evaluate() confusion matrix"""
+    num_classes = confusion.shape[0] - 1
+    iou, _, accuracy = iou_scores(confusion)
+    present = confusion[:num_classes].sum(axis=1) > 0
+    return {
+        'miou': float(np.nanmean(iou)) if np.any(~np.isnan(iou)) else float('nan'),
+        'miou_present': float(np.nanmean(iou[present])) if present.any() else float('nan'),
+        'pixel_accuracy': accuracy,
+        'pixels': int(confusion.sum()),
+        'out_of_range': int(confusion[:, num_classes].sum()),
+        'class_iou': [None if np.isnan(v) else float(v) for v in iou],
+        'class_pixels': confusion[:num_classes].sum(axis=1).tolist(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compute per-class IoU and mIoU of predicted class maps against labels')
+
+    parser.add_argument('predictions', help='Directory of predicted class maps '
+                                            '(.png, .npy, .bin, or $writememh dumps)')
+    parser.add_argument('labels', help='Directory of class-index label PNGs mirroring the '
+                                       'prediction paths')
+    parser.add_argument('--pair-by', choices=['name', 'order'], default='name',
+                        help='Pair predictions with labels by relative path, or by sorted '
+                             "order, e.g. for main.py's frame_NNNNNN.png masks (default: name)")
+    parser.add_argument('--num-classes', type=int, default=NUM_CLASSES,
+                        help=f'Classes evaluated, e.g. 19 for Cityscapes (default: {NUM_CLASSES})')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help='Size of flat predictions (default: 224 224)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes (0 = all cores, default: 1)')
+    parser.add_argument('--json', help='Write the report, including the confusion matrix, here')
+
+    args = parser.parse_args()
+
+    try:
+        pairs, missing = find_pairs(args.predictions, args.labels, args.pair_by)
+    except Exception as e:
+        print(f"Error processing {args.predictions}: {e}")
+        sys.exit(1)
+    for path in missing:
+        print(f"Warning: no label for {path}")
+    if not pairs:
+        print(f"No predictions with labels found in {args.predictions}")
+        sys.exit(1)
+
+    workers = args.workers or os.cpu_count()
+    confusion, errors = evaluate(pairs, args.num_classes, tuple(args.size), workers)
+    for path, error in errors:
+        print(f"Error processing {path}: {error}")
+    report = summarize(confusion)
+
+    print(f"{'class':>6}{'IoU':>9}{'pixels':>14}")
+    for index, (iou, pixels) in enumerate(zip(report['class_iou'], report['class_pixels'])):
+        print(f"{index:>6}{'-' if iou is None else f'{iou:.2%}':>9}{pixels:>14,}")
+    print(f"{len(pairs) - len(errors)} frames, {report['pixels']:,} labeled pixels: "
+          f"mIoU {report['miou']:.2%} (classes present in labels: {report['miou_present']:.2%}), "
+          f"pixel accuracy {report['pixel_accuracy']:.2%}, "
+          f"{report['out_of_range']:,} predictions outside 0..{args.num_classes - 1}")
+
+    if args.json:
+        report.update(frames=len(pairs) - len(errors), errors=[path for path, _ in errors],
+                      confusion=confusion.tolist())
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Lean overlay rendering for segmentation results
+
+Replaces Ultralytics' results.plot(), which redraws every instance mask,
+box and label into freshly allocated images on each frame. Here the
+instance masks are merged into one class-index map (see
+results_to_class_map), colored through a palette lookup table and
+alpha-blended in place into the frame with integer math:
+
+    out = (frame * (256 - a)) >> 8  +  (color * a + 128) >> 8
+
+Both terms are 256-entry tables precomputed for the alpha ``a`` (in
+1/256 steps), so a frame costs a few OpenCV table lookups and one masked
+saturating add, restricted to the bounding box of the masks. All
+intermediate images are buffers reused across frames. Boxes and labels
+are optional and drawn with plain OpenCV primitives.
+"""
+
+import cv2
+import numpy as np
+
+from realtime import PALETTE, results_to_class_map
+
+
+class OverlayRenderer:
+    """Draw class maps (and optionally boxes and labels) onto frames in place
+
+    One renderer owns its buffers, so it must only be used from one thread
+    at a time.
+    """
+
+    def __init__(self, alpha=0.5, masks=True, boxes=False, labels=False, palette=PALETTE,
+                 thickness=2):
+        self.masks = masks
+        self.boxes = boxes
+        self.labels = labels
+        self.palette = palette
+        self.thickness = thickness
+        self._buffers = {}
+        self.set_alpha(alpha)
+
+    def set_alpha(self, alpha):
+        """Precompute the blend tables for an opacity between 0 and 1"""
+        weight = int(round(min(max(alpha, 0.0), 1.0) * 256))
+        values = np.arange(256, dtype=np.uint32)
+        self._scale_lut = ((values * (256 - weight)) >> 8).astype(np.uint8)
+        colors = (self.palette.astype(np.uint32) * weight + 128) >> 8
+        self._color_luts = [np.ascontiguousarray(colors[:, channel], dtype=np.uint8)
+                            for channel in range(3)]
+
+    def _buffer(self, name, shape):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape[0] < shape[0] or buffer.shape[1] < shape[1]:
+            buffer = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer[:shape[0], :shape[1]]
+
+    def blend(self, frame, class_map):
+        """Blend the palette colors of a class map onto frame in place; class 0 is left as is"""
+        x, y, width, height = cv2.boundingRect(class_map)
+        if not width or not height:
+            return frame
+        classes = class_map[y:y + height, x:x + width]
+        region = frame[y:y + height, x:x + width]
+
+        channels = [cv2.LUT(classes, lut, dst=self._buffer(f'channel{i}', classes.shape))
+                    for i, lut in enumerate(self._color_luts)]
+        colored = cv2.merge(channels, dst=self._buffer('colored', region.shape))
+        scaled = cv2.LUT(region, self._scale_lut, dst=self._buffer('scaled', region.shape))
+        mask = cv2.compare(classes, 0, cv2.CMP_GT, dst=self._buffer('mask', classes.shape))
+        cv2.add(scaled, colored, dst=region, mask=mask)
+        return frame
+
+    def class_map(self, results, shape):
+        """Class-index map of a result in a reused buffer"""
+        return results_to_class_map(results, shape, out=self._buffer('class_map', shape[:2]))
+
+    def draw_boxes(self, frame, results):
+        """Draw instance boxes and/or class labels with their confidence"""
+        if results.boxes is None or len(results.boxes) == 0:
+            return frame
+        corners = results.boxes.xyxy.cpu().numpy().astype(np.int32)
+        classes = results.boxes.cls.cpu().numpy().astype(np.int64)
+        confidences = results.boxes.conf.cpu().numpy()
+        names = getattr(results, 'names', None) or {}
+        for (x1, y1, x2, y2), cls, confidence in zip(corners, classes, confidences):
+            color = tuple(int(c) for c in self.palette[min(cls + 1, 255)])
+            if self.boxes:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, self.thickness)
+            if self.labels:
+                text = f"{names.get(cls, cls)} {confidence:.2f}"
+                cv2.putText(frame, text, (x1, max(y1 - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.5, color, 1, cv2.LINE_AA)
+        return frame
+
+    def render(self, results, frame=None, class_map=None):
+        """Draw a result onto its original image (or ``frame``) in place and return it
+
+        A class map already rasterized from the result can be passed in.
+        """
+        if frame is None:
+            frame = results.orig_img
+        if self.masks:
+            if class_map is None:
+                class_map = self.class_map(results, frame.shape)
+            self.blend(frame, class_map)
+        if self.boxes or self.labels:
+            self.draw_boxes(frame, results)
+        return frame
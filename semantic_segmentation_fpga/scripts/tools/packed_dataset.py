@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Packed Dataset Container for FPGA Semantic Segmentation
+
+Stores many converted frames in a single file instead of one .bin per
+image, so a whole dataset can be copied to SDRAM or streamed into a
+simulation with one open and sequential reads.
+
+File layout (all header and index fields little-endian):
+
+    offset 0     64-byte header
+    offset 64    frame payloads, each starting on an ALIGNMENT boundary
+    index_offset frame_count x (offset: u64, nbytes: u64)
+
+Payloads are the packed SDRAM words produced by convert_to_binary(), so a
+payload copied to the board is identical to the corresponding .bin file.
+Words are stored little-endian; the big_endian flag records the byte
+order inside each word (first pixel byte in the top byte).
+The index is written last, which lets a writer append frames without
+knowing the frame count in advance.
+"""
+
+import os
+import struct
+import argparse
+import numpy as np
+
+MAGIC = b'SSFPACK\0'
+VERSION = 1
+
+# magic, version, word_bytes, big_endian, width, height, channels,
+# frame_count, index_offset
+HEADER_FORMAT = '<8sIIIIIIQQ'
+HEADER_SIZE = 64
+
+# Payload alignment in bytes (one 32-bit SDRAM word)
+ALIGNMENT = 4
+
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('nbytes', '<u8')])
+
+def _word_dtype(word_bytes):
+    """NumPy dtype of the packed words stored in the payloads"""
+    return np.dtype(f'<u{word_bytes}')
+
+class PackedDatasetWriter:
+    """Append packed frames to a container file
+
+    Use as a context manager; the index and final header are written on
+    close(). Until then the header records zero frames and no index, so an
+    interrupted write is never mistaken for a complete container. Leaving
+    the context with an exception closes the file without finalizing it.
+    """
+
+    def __init__(self, path, frame_shape=(224, 224, 3), word_bytes=4, byteorder='little'):
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.word_bytes = word_bytes
+        self.big_endian = byteorder == 'big'
+        self.alignment = max(ALIGNMENT, word_bytes)
+        self.index = []
+        self._file = open(path, 'wb')
+        self._write_header(0, 0)
+        self._file.seek(HEADER_SIZE)
+
+    def _write_header(self, frame_count, index_offset):
+        height, width, channels = self.frame_shape
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.word_bytes,
+                             int(self.big_endian), width, height, channels,
+                             frame_count, index_offset)
+        self._file.seek(0)
+        self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    def _align(self):
+        padding = -self._file.tell() % self.alignment
+        if padding:
+            self._file.write(b'\0' * padding)
+
+    def append(self, binary_data):
+        """Append one frame of packed words and return its frame number"""
+        binary_data = np.asarray(binary_data)
+        if binary_data.itemsize != self.word_bytes:
+            raise ValueError(f"Expected {self.word_bytes}-byte words, "
+                             f"got {binary_data.itemsize}-byte words")
+        self._align()
+        offset = self._file.tell()
+        self._file.write(binary_data.astype(_word_dtype(self.word_bytes), copy=False).tobytes())
+        self.index.append((offset, binary_data.nbytes))
+        return len(self.index) - 1
+
+    def close(self):
+        """Write the offset index and the final header"""
+        if self._file.closed:
+            return
+        self._align()
+        index_offset = self._file.tell()
+        np.array(self.index, dtype=INDEX_DTYPE).tofile(self._file)
+        self._write_header(len(self.index), index_offset)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+class PackedDataset:
+    """Read-only, memory-mapped view of a packed dataset container
+
+    Only the header and index are read on open. Frames are returned as
+    zero-copy views into a numpy.memmap of the file, so accessing frame N
+    is O(1) and touches only the pages of that frame.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"{path}: file too short for a packed dataset header")
+        (magic, version, self.word_bytes, big_endian, width, height, channels,
+         frame_count, index_offset) = struct.unpack_from(HEADER_FORMAT, header)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a packed dataset (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported container version {version}")
+        if index_offset == 0:
+            raise ValueError(f"{path}: incomplete packed dataset (the writer did not finish)")
+
+        self.frame_shape = (height, width, channels)
+        self.big_endian = bool(big_endian)
+        self.dtype = _word_dtype(self.word_bytes)
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        self.index = np.ndarray((frame_count,), dtype=INDEX_DTYPE, buffer=self._data,
+                                offset=index_offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, frame):
+        return self.words(frame)
+
+    def __iter__(self):
+        for frame in range(len(self)):
+            yield self.words(frame)
+
+    def raw(self, frame):
+        """Payload bytes of a frame as a uint8 view"""
+        if not -len(self) <= frame < len(self):
+            raise IndexError(f"frame {frame} out of range ({len(self)} frames)")
+        offset, nbytes = self.index[frame]
+        return self._data[offset:offset + nbytes]
+
+    def words(self, frame):
+        """Packed SDRAM words of a frame (same content as the .bin file)"""
+        return self.raw(frame).view(self.dtype)
+
+    def image(self, frame):
+        """Frame pixels as a (height, width, channels) uint8 array
+
+        A view for little-endian packing; big-endian words are swapped back
+        into a copy.
+        """
+        pixels = int(np.prod(self.frame_shape))
+        data = self.raw(frame)
+        if self.big_endian:
+            data = self.words(frame).byteswap().view(np.uint8)
+        return data[:pixels].reshape(self.frame_shape)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Inspect or extract frames from a packed dataset container')
+
+    parser.add_argument('input', help='Packed dataset file')
+    parser.add_argument('--extract', type=int, metavar='FRAME',
+                        help='Write the given frame as a raw .bin file')
+    parser.add_argument('--output', help='Output file for --extract')
+
+    args = parser.parse_args()
+
+    dataset = PackedDataset(args.input)
+    height, width, channels = dataset.frame_shape
+    print(f"{args.input}: {len(dataset)} frames, {width}x{height}x{channels}, "
+          f"{dataset.word_bytes}-byte {'big' if dataset.big_endian else 'little'}"
+          f"-endian words, {os.path.getsize(args.input)} bytes")
+
+    if args.extract is not None:
+        output = args.output or f"frame_{args.extract:06d}.bin"
+        with open(output, 'wb') as f:
+            f.write(dataset.raw(args.extract).tobytes())
+        print(f"Extracted frame {args.extract} -> {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Analytical Cycle-Count Model of the Segmentation Pipeline
+
+Reads the stage parameters from the RTL (frame size and channels from
+semantic_segmentation_top.v and segmentation_processor.v, BURST_LEN from
+image_loader.v, the VGA timing from result_display.v and the clocks from
+pll.v) and counts the cycles every state machine state takes per frame.
+
+By default the counts follow the RTL as written: every counter state
+handles one element per cycle and takes count + 1 cycles, so a CONV
+state computes a whole 3x3 x in_ch dot product in one cycle. The what-if
+options replace that with a resource-bound datapath:
+
+- ``mac_units``: CONV states are limited to that many multiply-accumulates
+  per cycle, and feature-memory reads to ``mem_ports`` words per cycle.
+- ``line_buffers``: every input word is read once per group of output
+  channels instead of once per kernel tap. The element-wise states
+  (ReLU, pool, upsample, concat) are fused into the convolutions.
+- ``overlap``: ``none`` runs load, process and display back to back as
+  the top-level FSM does. ``frame`` pipelines them across frames.
+  ``layer`` also streams every layer concurrently.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import argparse
+from collections import namedtuple
+
+RTL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'hdl', 'rtl')
+
+# Cycles between a child's FINISH state and the parent leaving its wait state
+HANDSHAKE_CYCLES = 2
+
+OVERLAP_MODES = ['none', 'frame', 'layer']
+
+StateCycles = namedtuple('StateCycles', ['module', 'state', 'cycles', 'clock_hz'])
+
+def _evaluate(expression, values):
+    """Evaluate a constant Verilog integer expression over known parameters"""
+    expression = re.sub(r"\d*'[sS]?[dD](\d+)", r'\1', expression)
+    expression = re.sub(r"\d*'[sS]?[hH]([0-9a-fA-F]+)", lambda m: str(int(m.group(1), 16)),
+                        expression)
+    expression = re.sub(r'\b[A-Za-z_]\w*\b', lambda m: str(values[m.group(0)]), expression)
+    if not re.fullmatch(r'[\d\s+\-*/()]*', expression):
+        raise ValueError(f"Unsupported expression: {expression}")
+    return eval(expression.replace('/', '//'), {'__builtins__': {}})
+
+def parse_modules(path):
+    """{module: {'parameters': {...}, 'states': [...]}} for every module in a Verilog file
+
+    Parameter defaults and localparams are evaluated in order. States are
+    the localparams assigned sized constants (e.g. ``localparam CONV = 3'd1``).
+    """
+    with open(path) as f:
+        source = re.sub(r'//.*', '', f.read())
+
+    modules = {}
+    for name, body in re.findall(r'\bmodule\s+(\w+)(.*?)\bendmodule', source, re.S):
+        values, states = {}, []
+        declarations = re.findall(r'\b(parameter|localparam)\s+(\w+)\s*=\s*([^,;\n]+)', body)
+        for kind, param, expression in declarations:
+            try:
+                values[param] = _evaluate(expression, values)
+            except (KeyError, ValueError):
+                continue
+            if kind == 'localparam' and re.fullmatch(r"\s*\d+'[dDbBhH]\w+\s*", expression):
+                states.append(param)
+        modules[name] = {'parameters': values, 'states': states}
+    return modules
+
+def parse_pll_clocks(path):
+    """(system, VGA) clock frequencies from the half periods in the pll.v simulation model"""
+    with open(path) as f:
+        source = f.read()
+    halves = {name: int(delay) for delay, name in re.findall(r'always\s+#(\d+)\s+r_(c\d)', source)}
+    # Delays are in ns (`timescale 1ns in the testbenches)
+    return 1e9 / (2 * halves['c0']), 1e9 / (2 * halves['c1'])
+
+def load_rtl_config(rtl_dir=RTL_DIR):
+    """Collect the parameters the model needs from the RTL sources"""
+    top = parse_modules(os.path.join(rtl_dir, 'top', 'semantic_segmentation_top.v'))
+    processor = parse_modules(os.path.join(rtl_dir, 'core', 'segmentation_processor.v'))
+    loader = parse_modules(os.path.join(rtl_dir, 'core', 'image_loader.v'))
+    display = parse_modules(os.path.join(rtl_dir, 'core', 'result_display.v'))
+    states = {}
+    for path in ('core/image_loader.v', 'core/segmentation_processor.v', 'core/result_display.v',
+                 'network/encoder.v', 'network/encoder_stages.v', 'network/bottleneck.v',
+                 'network/decoder.v', 'network/decoder_stages.v'):
+        for name, module in parse_modules(os.path.join(rtl_dir, path)).items():
+            states[name] = module['states']
+
+    top_params = top['semantic_segmentation_top']['parameters']
+    proc_params = processor['segmentation_processor']['parameters']
+    vga = display['result_display']['parameters']
+    sys_clock, vga_clock = parse_pll_clocks(os.path.join(rtl_dir, 'core', 'pll.v'))
+    return {
+        'width': top_params['INPUT_WIDTH'],
+        'height': top_params['INPUT_HEIGHT'],
+        'channels': top_params['INPUT_CHANNELS'],
+        'num_classes': top_params['NUM_CLASSES'],
+        'encoder_channels': [proc_params[f'ENCODER_STAGE{i}_CHANNELS'] for i in (1, 2, 3)],
+        'burst_len': loader['image_loader']['parameters']['BURST_LEN'],
+        'h_total': vga['H_TOTAL'],
+        'v_total': vga['V_TOTAL'],
+        'sys_clock_hz': sys_clock,
+        'vga_clock_hz': vga_clock,
+        'states': states,
+    }
+
+def _conv_cycles(outputs, in_ch, taps, input_words, out_ch, mac_units, line_buffers, mem_ports):
+    """Cycles of a CONV state; outputs/input_words are element counts of the layer"""
+    if mac_units is None:
+        return outputs + 1
+    compute = math.ceil(outputs * in_ch * taps / mac_units)
+    # mac_units output channels are computed in parallel from one input word
+    passes = math.ceil(out_ch / mac_units)
+    reads = input_words * passes * (1 if line_buffers else taps)
+    return max(compute, math.ceil(reads / mem_ports)) + 1
+
+def frame_cycles(config, mac_units=None, line_buffers=False, mem_ports=2):
+    """Per-state cycle counts of one frame, in execution order"""
+    width, height, channels = config['width'], config['height'], config['channels']
+    c1, c2, c3 = config['encoder_channels']
+    sys_clock = config['sys_clock_hz']
+    fused = line_buffers and mac_units is not None
+
+    def elementwise(count):
+        return 0 if fused else count + 1
+
+    stages = []
+    burst_len = config['burst_len']
+    # READ_DATA moves one byte per cycle, so a burst delivers burst_len bytes
+    bursts = math.ceil(width * height * channels / burst_len)
+    stages.append(StateCycles('image_loader', 'INIT', 1, sys_clock))
+    stages.append(StateCycles('image_loader', 'READ_CMD', bursts, sys_clock))
+    stages.append(StateCycles('image_loader', 'READ_DATA', bursts * burst_len, sys_clock))
+    stages.append(StateCycles('image_loader', 'WAIT_NEXT', bursts, sys_clock))
+    stages.append(StateCycles('image_loader', 'FINISH', 1 + HANDSHAKE_CYCLES, sys_clock))
+
+    # PREPROCESS lasts one cycle: next_state moves to ENCODE unconditionally
+    stages.append(StateCycles('segmentation_processor', 'PREPROCESS', 1, sys_clock))
+
+    size = (width, height)
+    for stage, (in_ch, out_ch) in enumerate(((channels, c1), (c1, c2), (c2, c3)), 1):
+        module = f'encoder_stage{stage}'
+        outputs = size[0] * size[1] * out_ch
+        pooled = size[0] // 2 * (size[1] // 2) * out_ch
+        stages.append(StateCycles(module, 'CONV', _conv_cycles(
+            outputs, in_ch, 9, size[0] * size[1] * in_ch, out_ch, mac_units, line_buffers,
+            mem_ports), sys_clock))
+        stages.append(StateCycles(module, 'RELU', elementwise(outputs), sys_clock))
+        stages.append(StateCycles(module, 'POOL', elementwise(pooled), sys_clock))
+        stages.append(StateCycles(module, 'FINISH', 1 + HANDSHAKE_CYCLES, sys_clock))
+        size = (size[0] // 2, size[1] // 2)
+
+    stages.append(StateCycles('bottleneck', 'PROCESSING',
+                              elementwise(size[0] * size[1] * c3), sys_clock))
+    stages.append(StateCycles('bottleneck', 'FINISH', 1 + HANDSHAKE_CYCLES, sys_clock))
+
+    decoders = ((c3, c3, c2, 9), (c2, c2, c1, 9), (c1, c1, config['num_classes'], 1))
+    for stage, (in_ch, skip_ch, out_ch, taps) in enumerate(decoders, 1):
+        module = f'decoder_stage{stage}'
+        out_pixels = size[0] * 2 * size[1] * 2
+        stages.append(StateCycles(module, 'UPSAMPLE', elementwise(out_pixels * in_ch), sys_clock))
+        stages.append(StateCycles(module, 'CONCAT',
+                                  elementwise(out_pixels * (in_ch + skip_ch)), sys_clock))
+        stages.append(StateCycles(module, 'CONV', _conv_cycles(
+            out_pixels * out_ch, in_ch + skip_ch, taps, out_pixels * (in_ch + skip_ch), out_ch,
+            mac_units, line_buffers, mem_ports), sys_clock))
+        stages.append(StateCycles(module, 'FINISH', 1 + HANDSHAKE_CYCLES, sys_clock))
+        size = (size[0] * 2, size[1] * 2)
+
+    stages.append(StateCycles('segmentation_processor', 'POSTPROCESS',
+                              width * height + 1, sys_clock))
+
+    # DISPLAY scans one full VGA frame on the pixel clock
+    stages.append(StateCycles('result_display', 'DISPLAY',
+                              config['h_total'] * config['v_total'], config['vga_clock_hz']))
+    stages.append(StateCycles('result_display', 'FINISH', 1 + HANDSHAKE_CYCLES, sys_clock))
+    return stages
+
+def frame_macs(config):
+    """Multiply-accumulates of all convolutions in one frame"""
+    width, height = config['width'], config['height']
+    c1, c2, c3 = config['encoder_channels']
+    layers = [(width, height, config['channels'], c1, 9), (width // 2, height // 2, c1, c2, 9),
+              (width // 4, height // 4, c2, c3, 9), (width // 4, height // 4, 2 * c3, c2, 9),
+              (width // 2, height // 2, 2 * c2, c1, 9),
+              (width, height, 2 * c1, config['num_classes'], 1)]
+    return sum(w * h * in_ch * out_ch * taps for w, h, in_ch, out_ch, taps in layers)
+
+def summarize(stages, overlap='none'):
+    """Group state times into top-level phases and compute latency and throughput"""
+    def seconds(entry):
+        return entry.cycles / entry.clock_hz
+
+    phases = {'load': 0.0, 'process': 0.0, 'display': 0.0}
+    layers = {}
+    for entry in stages:
+        phase = ('load' if entry.module == 'image_loader' else
+                 'display' if entry.module == 'result_display' else 'process')
+        phases[phase] += seconds(entry)
+        layers[entry.module] = layers.get(entry.module, 0.0) + seconds(entry)
+
+    latency = sum(phases.values())
+    if overlap == 'none':
+        period = latency
+    elif overlap == 'frame':
+        period = max(phases.values())
+    else:
+        period = max(layers.values())
+    return {
+        'phases_ms': {name: value * 1e3 for name, value in phases.items()},
+        'modules_ms': {name: value * 1e3 for name, value in layers.items()},
+        'latency_ms': latency * 1e3,
+        'period_ms': period * 1e3,
+        'fps': 1.0 / period if period > 0 else 0.0,
+        'bottleneck': max(layers if overlap == 'layer' else phases,
+                          key=(layers if overlap == 'layer' else phases).get),
+    }
+
+def check_states(config, stages):
+    """Warn about modeled states that the RTL no longer declares"""
+    for entry in stages:
+        declared = config['states'].get(entry.module)
+        if declared is not None and entry.state not in declared:
+            print(f"Warning: {entry.module} has no state {entry.state} in the RTL")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Estimate per-state cycles, frame latency and throughput of the RTL pipeline')
+
+    parser.add_argument('--rtl-dir', default=RTL_DIR, help='RTL source directory (default: hdl/rtl)')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help='Override the frame size from the RTL')
+    parser.add_argument('--clock-mhz', type=float, help='Override the system clock from pll.v')
+    parser.add_argument('--burst-len', type=int, help='Override BURST_LEN of image_loader.v')
+    parser.add_argument('--mac-units', type=int, default=None,
+                        help='Limit CONV states to this many MACs per cycle '
+                             '(default: one output per cycle, as written)')
+    parser.add_argument('--mem-ports', type=int, default=2,
+                        help='Feature-memory words read per cycle with --mac-units (default: 2)')
+    parser.add_argument('--line-buffers', action='store_true',
+                        help='Reuse inputs across kernel taps and fuse element-wise states '
+                             '(with --mac-units)')
+    parser.add_argument('--overlap', choices=OVERLAP_MODES, default='none',
+                        help='Overlap of load/process/display across frames (default: none)')
+    parser.add_argument('--target-fps', type=float, default=30.0,
+                        help='Frame rate to size the MAC array for (default: 30)')
+    parser.add_argument('--json', help='Write the per-state cycles and summary here')
+
+    args = parser.parse_args()
+
+    try:
+        config = load_rtl_config(args.rtl_dir)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Error processing {args.rtl_dir}: {e}")
+        sys.exit(1)
+    if args.size:
+        config['width'], config['height'] = args.size
+    if args.clock_mhz:
+        config['sys_clock_hz'] = args.clock_mhz * 1e6
+    if args.burst_len:
+        config['burst_len'] = args.burst_len
+
+    stages = frame_cycles(config, args.mac_units, args.line_buffers, max(1, args.mem_ports))
+    check_states(config, stages)
+    summary = summarize(stages, args.overlap)
+
+    print(f"{'module':<24}{'state':<12}{'cycles':>14}{'ms':>12}")
+    for entry in stages:
+        print(f"{entry.module:<24}{entry.state:<12}{entry.cycles:>14,}"
+              f"{entry.cycles / entry.clock_hz * 1e3:>12.3f}")
+
+    phases = summary['phases_ms']
+    print(f"Load {phases['load']:.3f} ms, process {phases['process']:.3f} ms, "
+          f"display {phases['display']:.3f} ms")
+    print(f"Frame latency: {summary['latency_ms']:.3f} ms; throughput bound "
+          f"(overlap: {args.overlap}): {summary['fps']:.2f} FPS, limited by {summary['bottleneck']}")
+
+    macs = frame_macs(config)
+    needed = macs * args.target_fps / config['sys_clock_hz']
+    print(f"{macs:,} MACs per frame; {args.target_fps:g} FPS needs {needed:,.0f} MACs per cycle "
+          f"at {config['sys_clock_hz'] / 1e6:g} MHz")
+
+    if args.json:
+        report = {'config': {k: v for k, v in config.items() if k != 'states'},
+                  'options': {'mac_units': args.mac_units, 'mem_ports': args.mem_ports,
+                              'line_buffers': args.line_buffers, 'overlap': args.overlap},
+                  'states': [entry._asdict() for entry in stages],
+                  'summary': summary, 'frame_macs': macs}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
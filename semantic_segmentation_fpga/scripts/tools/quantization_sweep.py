@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Post-Training Quantization Sweep for the FPGA Segmentation Network
+
+Runs the U-Net implemented by the RTL (encoder_stage1..3, bottleneck,
+decoder_stage1..3, 21 classes) in floating point and under a list of
+fixed-point formats on a set of validation images. For every format it
+reports the mIoU next to a model of its Cyclone V DSP and M10K cost.
+
+Formats are written ACTIVATION[:WEIGHTS]:
+
+    Q8.8          signed 16-bit activations with 8 fractional bits, int8 weights
+    Q8.8:int8     same, one power-of-two weight scale per layer
+    Q4.4:int8pc   8-bit activations, int8 weights with per-channel scales
+    Q4.4:int4pc   8-bit activations, int4 weights with per-channel scales
+
+Unlike golden_model.py, which reproduces the RTL as written, this models
+the intended network. Skips come from the pre-pool encoder conv outputs at
+matching resolution. Every layer requantizes its output to the activation
+format with round-to-nearest and saturation (fake quantization in
+float32). Without --labels the float network's predictions are the
+reference, so the mIoU measures the agreement lost to quantization.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import argparse
+from collections import namedtuple
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from cityscapes_data_converter import (IGNORE_LABEL, find_images, letterbox_labels, resize_image,
+                                       run_tasks)
+from golden_model import LAYERS, layer_shapes
+from miou_evaluator import confusion_matrix, iou_scores
+
+DEFAULT_FORMATS = ['Q8.8:int8', 'Q8.8:int8pc', 'Q6.6:int8', 'Q4.4:int8', 'Q4.4:int4pc']
+
+# Cyclone V 5CSXFC6D6F31C6N on the DE10-Standard board
+DEVICE_DSP_BLOCKS = 112
+DEVICE_M10K_BLOCKS = 557
+M10K_BITS = 10240
+CLOCK_HZ = 50e6
+
+QuantFormat = namedtuple('QuantFormat', ['name', 'act_int', 'act_frac', 'weight_bits',
+                                         'per_channel'])
+
+def parse_format(text):
+    """Parse an ACTIVATION[:WEIGHTS] format such as 'Q8.8' or 'Q4.4:int8pc'"""
+    activation, _, weights = text.partition(':')
+    act = re.fullmatch(r'[Qq](\d+)\.(\d+)', activation)
+    weight = re.fullmatch(r'int(\d+)(pc)?', weights or 'int8')
+    if not act or not weight or int(weight.group(1)) < 2:
+        raise ValueError(f"Invalid format {text!r}, expected e.g. Q8.8 or Q4.4:int8pc")
+    return QuantFormat(text, int(act.group(1)), int(act.group(2)), int(weight.group(1)),
+                       weight.group(2) is not None)
+
+def quantize_activations(x, fmt):
+    """Round x in place to the activation format, saturating at its range"""
+    if fmt is None:
+        return x
+    scale = 2.0 ** fmt.act_frac
+    limit = 2.0 ** (fmt.act_int + fmt.act_frac - 1)
+    np.multiply(x, scale, out=x)
+    np.round(x, out=x)
+    np.clip(x, -limit, limit - 1, out=x)
+    np.divide(x, scale, out=x)
+    return x
+
+def quantize_weights(kernel, fmt):
+    """Round a (in_ch, taps, out_ch) kernel to integers with power-of-two scales"""
+    limit = 2 ** (fmt.weight_bits - 1) - 1
+    if fmt.per_channel:
+        max_abs = np.abs(kernel).max(axis=(0, 1), keepdims=True)
+    else:
+        max_abs = np.abs(kernel).max()
+    scale = 2.0 ** np.floor(np.log2(limit / np.maximum(max_abs, 1e-12)))
+    return (np.clip(np.round(kernel * scale), -limit - 1, limit) / scale).astype(np.float32)
+
+def random_float_weights(seed=0):
+    """He-initialized float weights; only useful to exercise the tool"""
+    rng = np.random.default_rng(seed)
+    weights = {}
+    for name, (in_ch, out_ch) in layer_shapes().items():
+        taps = 1 if name == 'decoder_stage3' else 9
+        std = math.sqrt(2.0 / (in_ch * taps))
+        weights[name] = (rng.normal(0, std, (in_ch, taps, out_ch)).astype(np.float32),
+                         np.zeros(out_ch, dtype=np.float32))
+    return weights
+
+def load_float_weights(path):
+    """Load float weights from an .npz with ``<layer>_kernel`` (in_ch, taps, out_ch) and ``<layer>_bias``"""
+    with np.load(path) as data:
+        weights = {}
+        for name in LAYERS:
+            kernel = data[f"{name}_kernel"].astype(np.float32)
+            if name == 'decoder_stage3':
+                kernel = kernel[:, :1]
+            weights[name] = (kernel, data[f"{name}_bias"].astype(np.float32))
+        return weights
+
+def conv(x, kernel, bias):
+    """Same-padded convolution of an (N, H, W, C) batch with a 1- or 9-tap kernel"""
+    n, height, width, channels = x.shape
+    taps, out_ch = kernel.shape[1:]
+    if taps == 1:
+        out = x.reshape(-1, channels) @ kernel[:, 0]
+    else:
+        padded = np.pad(x, ((0, 0), (1, 1), (1, 1), (0, 0)))
+        out = np.zeros((n * height * width, out_ch), dtype=np.float32)
+        for tap in range(9):
+            kh, kw = divmod(tap, 3)
+            out += padded[:, kh:kh + height, kw:kw + width].reshape(-1, channels) @ kernel[:, tap]
+    out += bias
+    return out.reshape(n, height, width, out_ch)
+
+def forward(images, weights, fmt=None):
+    """Class maps (N, H, W) for a uint8 (N, H, W, 3) batch, quantized to fmt if given"""
+    # Pixels enter the datapath as {8'h0, pixel}, i.e. pixel / 256 in Q8.8
+    x = quantize_activations(images.astype(np.float32) / 256.0, fmt)
+    skips = []
+    for name in LAYERS[:3]:
+        x = quantize_activations(np.maximum(conv(x, *weights[name]), 0), fmt)
+        skips.append(x)
+        n, height, width, channels = x.shape
+        x = x.reshape(n, height // 2, 2, width // 2, 2, channels).max(axis=(2, 4))
+
+    # The bottleneck is a ReLU pass-through; x is already non-negative
+    for name, skip in zip(LAYERS[3:], reversed(skips)):
+        x = np.concatenate([x.repeat(2, axis=1).repeat(2, axis=2), skip], axis=3)
+        x = conv(x, *weights[name])
+        if name != LAYERS[-1]:
+            x = quantize_activations(np.maximum(x, 0), fmt)
+    return quantize_activations(x, fmt).argmax(axis=3).astype(np.uint8)
+
+def quantized_weights(weights, fmt):
+    """Weights as seen by the datapath in fmt (biases use the activation format)"""
+    return {name: (quantize_weights(kernel, fmt), quantize_activations(bias.copy(), fmt))
+            for name, (kernel, bias) in weights.items()}
+
+def layer_geometry(size=(224, 224)):
+    """{layer: (output width, output height, in_ch, out_ch, taps)} at a network input size"""
+    width, height = size
+    scales = {'encoder_stage1': 1, 'encoder_stage2': 2, 'encoder_stage3': 4,
+              'decoder_stage1': 4, 'decoder_stage2': 2, 'decoder_stage3': 1}
+    return {name: (width // scales[name], height // scales[name], in_ch, out_ch,
+                   1 if name == 'decoder_stage3' else 9)
+            for name, (in_ch, out_ch) in layer_shapes().items()}
+
+def hardware_cost(fmt, size=(224, 224), macs=192):
+    """Modeled DSP/M10K cost and frame rate of a format
+
+    A Cyclone V DSP block computes three multiplies up to 9x9 bits, two up
+    to 18x18 or one up to 27x27 per cycle. Weights of all layers stay in
+    M10K next to a three-line buffer for the widest 3x3 layer input.
+    ``macs`` parallel multiply-accumulates run at CLOCK_HZ.
+    """
+    act_bits = fmt.act_int + fmt.act_frac
+    width = max(act_bits, fmt.weight_bits)
+    per_dsp = 3 if width <= 9 else 2 if width <= 18 else 1
+
+    geometry = layer_geometry(size)
+    frame_macs = sum(w * h * in_ch * out_ch * taps for w, h, in_ch, out_ch, taps in geometry.values())
+    weight_bits = sum(in_ch * out_ch * taps * fmt.weight_bits + out_ch * act_bits
+                      for _, _, in_ch, out_ch, taps in geometry.values())
+    if fmt.per_channel:
+        # One 5-bit shift per output channel
+        weight_bits += 5 * sum(out_ch for _, _, _, out_ch, _ in geometry.values())
+    line_bits = max(3 * w * in_ch * act_bits for w, _, in_ch, _, taps in geometry.values() if taps == 9)
+    m10k = math.ceil(weight_bits / M10K_BITS) + math.ceil(line_bits / M10K_BITS)
+
+    return {
+        'dsp_blocks': math.ceil(macs / per_dsp),
+        'm10k_blocks': m10k,
+        'fits': math.ceil(macs / per_dsp) <= DEVICE_DSP_BLOCKS and m10k <= DEVICE_M10K_BLOCKS,
+        'fps': CLOCK_HZ * macs / frame_macs,
+        'device_fps': CLOCK_HZ * DEVICE_DSP_BLOCKS * per_dsp / frame_macs,
+    }
+
+def load_label(path, size=(224, 224)):
+    """Letterbox a class-index label PNG with nearest sampling; padding is IGNORE_LABEL"""
+    return letterbox_labels(np.asarray(Image.open(path)), size, fill=IGNORE_LABEL)
+
+def _evaluate_chunk(chunk, weights, formats, size):
+    """Worker entry point: confusion matrices of every format over a batch of images"""
+    images = np.stack([resize_image(image, size) for image, _ in chunk])
+    reference = forward(images, weights)
+    if all(label is not None for _, label in chunk):
+        labels = np.stack([load_label(label, size) for _, label in chunk])
+    else:
+        labels = reference
+
+    results = {'float': confusion_matrix(labels, reference)}
+    for fmt in formats:
+        predictions = forward(images, quantized_weights(weights, fmt), fmt)
+        results[fmt.name] = confusion_matrix(labels, predictions)
+    return results
+
+def find_pairs(image_dir, label_dir=None, limit=None):
+    """(image, label or None) pairs; labels mirror the image paths as .png files"""
+    pairs = []
+    for image, _ in find_images(image_dir, image_dir)[:limit]:
+        label = None
+        if label_dir:
+            rel_path = os.path.relpath(image, image_dir)
+            label = os.path.join(label_dir, os.path.splitext(rel_path)[0] + '.png')
+            if not os.path.exists(label):
+                raise FileNotFoundError(f"No label for {image}: {label}")
+        pairs.append((image, label))
+    return pairs
+
+def run_sweep(pairs, weights, formats, size=(224, 224), workers=1, batch_size=4, macs=192):
+    """Evaluate all formats over all pairs; returns one result dict per format"""
+    chunks = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+    worker = partial(_evaluate_chunk, weights=weights, formats=formats, size=size)
+    totals = {}
+    for results in run_tasks(worker, chunks, workers, chunksize=1):
+        for name, confusion in results.items():
+            totals[name] = totals.get(name, 0) + confusion
+
+    report = []
+    for name in ['float'] + [fmt.name for fmt in formats]:
+        iou, miou, accuracy = iou_scores(totals[name])
+        entry = {'format': name, 'miou': miou, 'pixel_accuracy': accuracy,
+                 'class_iou': [None if np.isnan(v) else float(v) for v in iou]}
+        fmt = next((f for f in formats if f.name == name), None)
+        if fmt is not None:
+            entry.update(hardware_cost(fmt, size, macs))
+        report.append(entry)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Sweep fixed-point formats and report mIoU against modeled FPGA cost')
+
+    parser.add_argument('images', help='Directory of validation images')
+    parser.add_argument('--labels', help='Directory of class-index label PNGs mirroring the '
+                                         'image paths (default: compare against float predictions)')
+    parser.add_argument('--weights', help='Float weights .npz (default: random weights, '
+                                          'only useful to exercise the tool)')
+    parser.add_argument('--formats', nargs='+', default=DEFAULT_FORMATS,
+                        help='Formats as ACTIVATION[:WEIGHTS] (default: %(default)s)')
+    parser.add_argument('--limit', type=int, default=None, help='Use only the first N images')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'), help='Network input size (default: 224 224)')
+    parser.add_argument('--batch-size', type=int, default=4,
+                        help='Images evaluated together in one vectorized pass (default: 4)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes (0 = all cores, default: 1)')
+    parser.add_argument('--macs', type=int, default=192,
+                        help='Parallel MAC units assumed by the cost model (default: 192)')
+    parser.add_argument('--json', help='Write the full report, including per-class IoU, here')
+
+    args = parser.parse_args()
+
+    try:
+        formats = [parse_format(text) for text in args.formats]
+        if args.size[0] % 8 or args.size[1] % 8:
+            raise ValueError("Network size must be a multiple of 8")
+        weights = load_float_weights(args.weights) if args.weights else random_float_weights()
+        pairs = find_pairs(args.images, args.labels, args.limit)
+    except Exception as e:
+        print(f"Error processing {args.images}: {e}")
+        sys.exit(1)
+    if not pairs:
+        print(f"No images found in {args.images}")
+        sys.exit(1)
+
+    workers = args.workers or os.cpu_count()
+    report = run_sweep(pairs, weights, formats, tuple(args.size), workers,
+                       max(1, args.batch_size), args.macs)
+
+    print(f"{len(pairs)} images, {args.size[0]}x{args.size[1]}, "
+          f"reference: {'labels' if args.labels else 'float predictions'}")
+    print(f"{'format':<14}{'mIoU':>8}{'pix acc':>9}{'DSP':>6}{'M10K':>6}{'FPS':>9}{'max FPS':>9}")
+    for entry in report:
+        line = f"{entry['format']:<14}{entry['miou'] * 100:>7.2f}%{entry['pixel_accuracy'] * 100:>8.2f}%"
+        if 'dsp_blocks' in entry:
+            line += (f"{entry['dsp_blocks']:>6}{entry['m10k_blocks']:>6}{entry['fps']:>9.2f}"
+                     f"{entry['device_fps']:>9.2f}{'' if entry['fits'] else '  (does not fit)'}")
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
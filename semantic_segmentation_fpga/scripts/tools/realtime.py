@@ -0,0 +1,150 @@
+"""
+Keyframe scheduling and mask propagation for real-time video segmentation
+
+The full segmentation model only runs on keyframes. In between, the last
+keyframe's masks are carried forward, either unchanged or warped along a
+cheap dense optical flow, so the output frame rate can be held under load.
+"""
+
+import math
+import cv2
+import numpy as np
+
+# Width of the downscaled grayscale frames used for scene change and flow
+ANALYSIS_WIDTH = 160
+
+# Class-index color palette; index 0 is background and is never drawn
+PALETTE = np.random.default_rng(0).integers(64, 256, size=(256, 3), dtype=np.uint8)
+PALETTE[0] = 0
+
+
+def results_to_class_map(results, shape, out=None):
+    """Rasterize an Ultralytics result into a (H, W) uint8 class-index map
+
+    Pixels of instance masks hold class id + 1, background is 0. Instances
+    are drawn in order of increasing confidence, so the most confident
+    instance wins where masks overlap. The map is drawn into ``out`` if
+    given, which is cleared first.
+    """
+    if out is None:
+        class_map = np.zeros(shape[:2], dtype=np.uint8)
+    else:
+        class_map = out
+        class_map.fill(0)
+    if results.masks is None or results.boxes is None or len(results.boxes) == 0:
+        return class_map
+
+    classes = results.boxes.cls.cpu().numpy().astype(np.int64)
+    confidences = results.boxes.conf.cpu().numpy()
+    for i in np.argsort(confidences):
+        polygon = results.masks.xy[i]
+        if len(polygon):
+            cv2.fillPoly(class_map, [polygon.astype(np.int32)], int(min(classes[i] + 1, 255)))
+    return class_map
+
+
+class KeyframeScheduler:
+    """Decide which frames go through the model to hold a target frame rate
+
+    Latencies of keyframes (model) and intermediate frames (mask reuse) are
+    tracked as exponential moving averages. The interval k between
+    keyframes is the smallest one whose average cost fits the frame budget:
+
+        (t_key + (k - 1) * t_reuse) / k <= 1 / target_fps
+
+    Until an intermediate frame has been measured, the interval is at
+    most 2 so that t_reuse is sampled instead of assumed. A scene change
+    larger than ``scene_threshold`` (mean absolute difference of downscaled
+    grayscale frames, 0..1) forces a keyframe.
+    """
+
+    def __init__(self, target_fps=30.0, max_interval=10, scene_threshold=0.08, smoothing=0.2):
+        self.budget = 1.0 / target_fps
+        self.max_interval = max(1, max_interval)
+        self.scene_threshold = scene_threshold
+        self.smoothing = smoothing
+        self.key_latency = None
+        self.reuse_latency = None
+        self.interval = 1
+        self.since_key = 0
+        self.key_gray = None
+        self.keyframes = 0
+
+    def is_keyframe(self, gray):
+        """Return True if the frame with this analysis image needs the model"""
+        if self.key_gray is None or self.since_key + 1 >= self.interval:
+            return True
+        change = np.mean(cv2.absdiff(gray, self.key_gray)) / 255.0
+        return change > self.scene_threshold
+
+    def _average(self, old, new):
+        return new if old is None else old + self.smoothing * (new - old)
+
+    def update(self, gray, keyframe, latency):
+        """Record a processed frame and adapt the keyframe interval"""
+        if keyframe:
+            self.key_latency = self._average(self.key_latency, latency)
+            self.key_gray = gray
+            self.since_key = 0
+            self.keyframes += 1
+        else:
+            self.reuse_latency = self._average(self.reuse_latency, latency)
+            self.since_key += 1
+
+        if self.key_latency <= self.budget:
+            self.interval = 1
+        elif self.reuse_latency is None:
+            self.interval = min(self.max_interval, 2)
+        elif self.reuse_latency >= self.budget:
+            self.interval = self.max_interval
+        else:
+            needed = (self.key_latency - self.reuse_latency) / (self.budget - self.reuse_latency)
+            self.interval = min(self.max_interval, max(1, math.ceil(needed)))
+
+
+class MaskPropagator:
+    """Carry the last keyframe's class map forward to intermediate frames
+
+    With ``flow`` enabled the map is warped along dense Farneback optical
+    flow computed on downscaled grayscale frames; otherwise it is reused
+    unchanged.
+    """
+
+    def __init__(self, flow=False):
+        self.flow = flow
+        self.class_map = None
+        self.prev_gray = None
+        self._grid = None
+
+    def reset(self, class_map, gray):
+        """Start propagating from a new keyframe"""
+        self.class_map = class_map
+        self.prev_gray = gray
+
+    def propagate(self, gray):
+        """Return the class map for the current frame"""
+        if self.flow and self.prev_gray is not None:
+            height, width = self.class_map.shape
+            small_h, small_w = gray.shape
+
+            # Backward flow: where each current pixel came from in the previous frame
+            flow = cv2.calcOpticalFlowFarneback(gray, self.prev_gray, None,
+                                                0.5, 2, 9, 2, 5, 1.1, 0)
+            flow = cv2.resize(flow, (width, height), interpolation=cv2.INTER_LINEAR)
+            if self._grid is None or self._grid[0].shape != (height, width):
+                self._grid = np.meshgrid(np.arange(width, dtype=np.float32),
+                                         np.arange(height, dtype=np.float32))
+            map_x = self._grid[0] + flow[:, :, 0] * (width / small_w)
+            map_y = self._grid[1] + flow[:, :, 1] * (height / small_h)
+            self.class_map = cv2.remap(self.class_map, map_x, map_y, cv2.INTER_NEAREST,
+                                       borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        self.prev_gray = gray
+        return self.class_map
+
+
+def analysis_image(frame):
+    """Downscaled grayscale copy of a frame for scene change and flow estimation"""
+    height, width = frame.shape[:2]
+    size = (ANALYSIS_WIDTH, max(1, round(height * ANALYSIS_WIDTH / width)))
+    return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA),
+                        cv2.COLOR_BGR2GRAY)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+SDRAM Burst-Access Model for the Image Loader
+
+Replays the burst reads image_loader.v issues to fetch one frame against
+a timing model of a single-rank SDRAM (DE10-Standard: IS42S16320D, 4
+banks, 1024 columns per row) and reports the load time, effective
+bandwidth and stall cycles:
+
+- row hits read at once; row misses precharge the open row (after tRAS)
+  and activate the new one (tRCD)
+- every read waits the CAS latency, unless ``--pipelined`` lets the
+  controller issue the next read of an open row during the current burst
+- an auto-refresh (all banks precharged, tRFC) is due every tREFI;
+  rows are closed after it
+- the loader adds ``--overhead`` controller cycles per burst (READ_CMD
+  and WAIT_NEXT in image_loader.v)
+
+Addresses map to column, then bank, then row (row-bank-column), so a
+sequential stream moves to the next bank at every row boundary.
+
+The sweep covers burst lengths and frame layouts. ``packed`` (4 frame
+bytes per 32-bit SDRAM word) is what convert_to_binary writes, whatever
+its ``--word-bytes``: that option only changes the word grouping of the
+text formats, the .bin bytes are the same. ``sparse-half`` and
+``sparse-byte`` are hypothetical, less dense layouts with 2 and 1 frame
+bytes per word, e.g. for a loader that only uses the low byte of each
+word; nothing in the repo writes them.
+
+The ``rtl`` row replays image_loader.v as written: BURST_LEN words per
+burst, of which it keeps one byte per READ_DATA cycle, with mem_addr
+advancing by BURST_LEN*4. The RTL comment means bytes, but sdram_addr is
+a word address (tb_image_loader.v indexes its memory with it), so by
+default the stride is taken as BURST_LEN*4 words, skipping 3 of every 4
+bursts' worth of words; ``--rtl-address bytes`` models the intended
+contiguous stride instead. A trace printed by tb_image_loader.v ("SDRAM
+access at address ...") can be replayed with ``--trace``, with its
+addresses in the same unit.
+
+Note that READ_CMD drives RAS, CAS low and WE high together, which an
+SDRAM decodes as AUTO REFRESH; the model assumes a proper ACTIVATE/READ
+sequence.
+"""
+
+import re
+import sys
+import json
+import math
+import argparse
+from collections import namedtuple
+
+from performance_model import RTL_DIR, load_rtl_config
+
+SdramTiming = namedtuple('SdramTiming', ['cas', 'trcd', 'trp', 'tras', 'trfc', 'trefi'])
+SdramGeometry = namedtuple('SdramGeometry', ['banks', 'columns', 'bus_bytes'])
+Burst = namedtuple('Burst', ['address', 'words', 'useful_bytes'])
+
+# Frame layouts: bytes of the frame per 32-bit SDRAM word. Only 'packed' is
+# written by convert_to_binary; the sparse layouts are hypothetical
+LAYOUTS = {'packed': 4, 'sparse-half': 2, 'sparse-byte': 1}
+
+# Units the RTL's mem_addr can be read in
+ADDRESS_UNITS = ('words', 'bytes')
+
+DEFAULT_BURSTS = [1, 2, 4, 8, 16, 32, 64]
+
+def timing_cycles(clock_hz, cas=3, trcd_ns=15, trp_ns=15, tras_ns=37, trfc_ns=60,
+                  refresh_ms=64, refresh_rows=8192):
+    """SdramTiming in clock cycles from datasheet values (IS42S16320D-7 defaults)"""
+    period_ns = 1e9 / clock_hz
+    def cycles(ns):
+        return max(1, math.ceil(ns / period_ns - 1e-9))
+    trefi = int(refresh_ms * 1e-3 / refresh_rows * clock_hz)
+    return SdramTiming(cas, cycles(trcd_ns), cycles(trp_ns), cycles(tras_ns), cycles(trfc_ns),
+                       trefi)
+
+def sequential_trace(frame_bytes, burst_len, bytes_per_word=4, base=0):
+    """Bursts of a loader that uses every byte of every word it reads"""
+    words = math.ceil(frame_bytes / bytes_per_word)
+    bursts = []
+    for start in range(0, words, burst_len):
+        count = min(burst_len, words - start)
+        useful = min(count * bytes_per_word, frame_bytes - start * bytes_per_word)
+        bursts.append(Burst(base + start, count, useful))
+    return bursts
+
+def word_address(address, unit='words'):
+    """Word address of an RTL mem_addr value read in one of ADDRESS_UNITS"""
+    return address // 4 if unit == 'bytes' else address
+
+def rtl_trace(frame_bytes, burst_len, base=0, unit='words'):
+    """Bursts of image_loader.v as written
+
+    Each burst reads ``burst_len`` words but READ_DATA keeps one byte per
+    cycle, so it yields ``burst_len`` bytes; WAIT_NEXT then advances
+    mem_addr by ``burst_len * 4``, in ``unit`` (see ADDRESS_UNITS). ``base``
+    is a word address.
+    """
+    count = math.ceil(frame_bytes / burst_len)
+    return [Burst(base + word_address(i * burst_len * 4, unit), burst_len,
+                  min(burst_len, frame_bytes - i * burst_len))
+            for i in range(count)]
+
+def log_trace(path, burst_len, unit='words'):
+    """Bursts from the "SDRAM access at address" lines of a tb_image_loader.v log"""
+    with open(path) as f:
+        addresses = re.findall(r'SDRAM access at address\s+([0-9a-fA-FxX]+)', f.read())
+    return [Burst(word_address(int(address, 16), unit), burst_len, burst_len)
+            for address in addresses if not re.search(r'[xX]', address)]
+
+def simulate(trace, timing, geometry, overhead=2, pipelined=False, policy='open'):
+    """Cycle count of a burst trace; returns a dict of totals and stall categories"""
+    banks, columns = geometry.banks, geometry.columns
+    open_rows = [None] * banks
+    activated = [0] * banks
+    stats = {'cycles': 0, 'data': 0, 'row': 0, 'cas': 0, 'refresh': 0, 'overhead': 0,
+             'hits': 0, 'misses': 0, 'refreshes': 0, 'bursts': len(trace), 'useful_bytes': 0}
+    t = 0
+    next_refresh = timing.trefi
+    last = None   # (bank, row) of the previous read, for CAS pipelining
+
+    for burst in trace:
+        t += overhead
+        stats['overhead'] += overhead
+        stats['useful_bytes'] += burst.useful_bytes
+        address, remaining = burst.address, burst.words
+
+        while remaining:
+            column = address % columns
+            bank = (address // columns) % banks
+            row = address // (columns * banks)
+            words = min(remaining, columns - column)
+
+            if t >= next_refresh:
+                start = t
+                if any(r is not None for r in open_rows):
+                    t = max(t, max(activated) + timing.tras) + timing.trp
+                t += timing.trfc
+                stats['refresh'] += t - start
+                stats['refreshes'] += 1
+                open_rows = [None] * banks
+                next_refresh += timing.trefi
+                last = None
+
+            if open_rows[bank] == row:
+                stats['hits'] += 1
+            else:
+                stats['misses'] += 1
+                start = t
+                if open_rows[bank] is not None:
+                    t = max(t, activated[bank] + timing.tras) + timing.trp
+                activated[bank] = t
+                t += timing.trcd
+                open_rows[bank] = row
+                stats['row'] += t - start
+                last = None
+
+            # A pipelined controller overlaps the CAS latency with the previous burst
+            if not (pipelined and last == (bank, row)):
+                t += timing.cas
+                stats['cas'] += timing.cas
+            t += words
+            stats['data'] += words
+            last = (bank, row)
+
+            if policy == 'closed':
+                # Auto-precharge: the row closes after the burst (tRAS wait included)
+                start = t
+                t = max(t, activated[bank] + timing.tras) + timing.trp
+                stats['row'] += t - start
+                open_rows[bank] = None
+                last = None
+
+            address += words
+            remaining -= words
+
+    stats['cycles'] = t
+    stats['stalls'] = t - stats['data']
+    return stats
+
+def summarize(stats, clock_hz, geometry):
+    """Add load time, effective bandwidth and bus efficiency to simulate() totals"""
+    seconds = stats['cycles'] / clock_hz
+    stats['load_ms'] = seconds * 1e3
+    stats['bandwidth_mb_s'] = stats['useful_bytes'] / seconds / 1e6 if seconds else 0.0
+    peak = geometry.bus_bytes * clock_hz
+    stats['efficiency'] = stats['useful_bytes'] / seconds / peak if seconds else 0.0
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Model SDRAM timing of the image loader for burst lengths and frame layouts')
+
+    parser.add_argument('--rtl-dir', default=RTL_DIR, help='RTL source directory')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help='Frame size (default: from semantic_segmentation_top.v)')
+    parser.add_argument('--bursts', type=int, nargs='+', default=DEFAULT_BURSTS,
+                        help='Burst lengths in words to compare (default: 1 2 4 ... 64)')
+    parser.add_argument('--layouts', nargs='+', choices=sorted(LAYOUTS), default=sorted(LAYOUTS),
+                        help='Frame layouts to compare (default: all)')
+    parser.add_argument('--trace', help='Replay the SDRAM accesses printed by tb_image_loader.v')
+    parser.add_argument('--rtl-address', choices=ADDRESS_UNITS, default='words',
+                        help='Unit of the RTL mem_addr and its BURST_LEN*4 stride: words, as '
+                             'sdram_addr is wired, or bytes, as the RTL comment intends '
+                             '(default: words)')
+    parser.add_argument('--clock-mhz', type=float, help='SDRAM clock (default: system clock)')
+    parser.add_argument('--cas', type=int, default=3, help='CAS latency in cycles (default: 3)')
+    parser.add_argument('--trcd', type=float, default=15, help='tRCD in ns (default: 15)')
+    parser.add_argument('--trp', type=float, default=15, help='tRP in ns (default: 15)')
+    parser.add_argument('--tras', type=float, default=37, help='tRAS in ns (default: 37)')
+    parser.add_argument('--trfc', type=float, default=60, help='tRFC in ns (default: 60)')
+    parser.add_argument('--refresh-ms', type=float, default=64,
+                        help='Refresh period for all rows in ms (default: 64)')
+    parser.add_argument('--refresh-rows', type=int, default=8192,
+                        help='Refresh commands per period (default: 8192)')
+    parser.add_argument('--banks', type=int, default=4, help='Banks (default: 4)')
+    parser.add_argument('--columns', type=int, default=1024, help='Words per row (default: 1024)')
+    parser.add_argument('--base-addr', type=lambda v: int(v, 0), default=0,
+                        help='Word address of the frame (default: 0)')
+    parser.add_argument('--overhead', type=int, default=2,
+                        help='Controller cycles per burst (default: 2, READ_CMD + WAIT_NEXT)')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='Hide the CAS latency of consecutive reads to an open row')
+    parser.add_argument('--policy', choices=['open', 'closed'], default='open',
+                        help='Row policy: keep rows open or auto-precharge (default: open)')
+    parser.add_argument('--json', help='Write the results as JSON here')
+
+    args = parser.parse_args()
+
+    try:
+        config = load_rtl_config(args.rtl_dir)
+    except Exception as e:
+        print(f"Error processing {args.rtl_dir}: {e}")
+        sys.exit(1)
+
+    width, height = args.size or (config['width'], config['height'])
+    frame_bytes = width * height * config['channels']
+    clock_hz = args.clock_mhz * 1e6 if args.clock_mhz else config['sys_clock_hz']
+    timing = timing_cycles(clock_hz, args.cas, args.trcd, args.trp, args.tras, args.trfc,
+                           args.refresh_ms, args.refresh_rows)
+    geometry = SdramGeometry(args.banks, args.columns, 4)
+
+    cases = []
+    if args.trace:
+        try:
+            cases.append(('trace', config['burst_len'], log_trace(args.trace, config['burst_len'],
+                                                              args.rtl_address)))
+        except Exception as e:
+            print(f"Error processing {args.trace}: {e}")
+            sys.exit(1)
+    cases.append(('rtl', config['burst_len'], rtl_trace(frame_bytes, config['burst_len'],
+                                                        args.base_addr, args.rtl_address)))
+    for layout in args.layouts:
+        for burst_len in args.bursts:
+            cases.append((layout, burst_len, sequential_trace(frame_bytes, burst_len,
+                                                              LAYOUTS[layout], args.base_addr)))
+
+    print(f"Frame {width}x{height}x{config['channels']} ({frame_bytes} bytes), "
+          f"SDRAM clock {clock_hz / 1e6:g} MHz, CL{timing.cas} tRCD {timing.trcd} tRP {timing.trp} "
+          f"tRAS {timing.tras} tRFC {timing.trfc} tREFI {timing.trefi} cycles, "
+          f"{args.policy} rows{', pipelined' if args.pipelined else ''}")
+    print(f"rtl: mem_addr stride BURST_LEN*4 = {config['burst_len'] * 4} {args.rtl_address} "
+          f"({word_address(config['burst_len'] * 4, args.rtl_address)} words per "
+          f"{config['burst_len']}-word burst); sparse layouts are hypothetical")
+    print(f"{'layout':<12}{'burst':>6}{'cycles':>11}{'ms':>9}{'MB/s':>9}{'eff':>7}"
+          f"{'row':>9}{'cas':>9}{'refresh':>9}{'ctrl':>9}{'hits':>8}{'misses':>8}")
+
+    results = []
+    for layout, burst_len, trace in cases:
+        stats = summarize(simulate(trace, timing, geometry, args.overhead, args.pipelined,
+                                   args.policy), clock_hz, geometry)
+        stats.update(layout=layout, burst_len=burst_len)
+        results.append(stats)
+        print(f"{layout:<12}{burst_len:>6}{stats['cycles']:>11,}{stats['load_ms']:>9.3f}"
+              f"{stats['bandwidth_mb_s']:>9.1f}{stats['efficiency']:>7.1%}{stats['row']:>9,}"
+              f"{stats['cas']:>9,}{stats['refresh']:>9,}{stats['overhead']:>9,}"
+              f"{stats['hits']:>8,}{stats['misses']:>8,}")
+
+    # Only complete frames compete; a replayed trace may cover part of one
+    complete = [r for r in results if r['useful_bytes'] >= frame_bytes and r['layout'] != 'trace']
+    if complete:
+        best = min(complete, key=lambda r: r['cycles'])
+        print(f"Fastest: {best['layout']} layout, {best['burst_len']}-word bursts, "
+              f"{best['load_ms']:.3f} ms ({best['bandwidth_mb_s']:.1f} MB/s)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'frame_bytes': frame_bytes, 'clock_hz': clock_hz,
+                       'timing': timing._asdict(), 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
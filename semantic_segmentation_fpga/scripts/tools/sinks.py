@@ -0,0 +1,211 @@
+"""
+Asynchronous output sinks for segmented video
+
+A sink takes frames in order through write() and finishes the output in
+close(). Interchangeable sinks cover the ways main.py can store results:
+
+- video: cv2.VideoWriter (mp4v by default)
+- pipe:  raw BGR frames on the stdin of a local encoder process (ffmpeg
+         by default), which usually encodes faster and better than mp4v
+- png:   numbered PNG sequence of the annotated frames
+- masks: numbered single-channel PNGs of the class-index maps instead
+         of re-encoded RGB video. Pixels hold the model's class id and
+         background is IGNORE_LABEL (255), the value miou_evaluator.py
+         counts as a miss and display_emulator.py shows as black. The
+         files are named frame_NNNNNN.png, so miou_evaluator.py pairs
+         them with labels in frame order (``--pair-by order``)
+- null:  discards every frame, to benchmark without encoding cost
+
+AsyncSink runs any sink on its own thread behind a bounded queue. Writing
+blocks once the queue is full, so a slow encoder throttles the producer
+instead of buffering frames without limit. Frames are queued without
+copying: a frame must not be modified after it has been written.
+"""
+
+import os
+import queue
+import shlex
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+from cityscapes_data_converter import IGNORE_LABEL
+
+# Marks the end of a sink's queue
+_END = object()
+
+SINKS = ('video', 'pipe', 'png', 'masks', 'null')
+
+# Encoder run by the pipe sink; {width}, {height}, {fps} and {output} are filled in
+ENCODER_COMMAND = ('ffmpeg -hide_banner -loglevel error -y -f rawvideo -pix_fmt bgr24 '
+                   '-s {width}x{height} -r {fps} -i - -c:v libx264 -preset veryfast '
+                   '-pix_fmt yuv420p {output}')
+
+# zlib level of PNG sinks: fast, as class-index maps compress well anyway
+PNG_COMPRESSION = 1
+
+
+class VideoWriterSink:
+    """Encode frames with cv2.VideoWriter"""
+
+    masks = False
+
+    def __init__(self, path, fps, size, fourcc='mp4v'):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise IOError(f"Could not open a {fourcc} video writer for {path}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class PipeSink:
+    """Stream raw BGR frames to the stdin of an encoder process"""
+
+    masks = False
+
+    def __init__(self, path, fps, size, command=ENCODER_COMMAND):
+        self.size = size
+        fields = {'width': size[0], 'height': size[1], 'fps': fps, 'output': path}
+        args = [arg.format(**fields) for arg in shlex.split(command)]
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        if frame.shape[1::-1] != tuple(self.size):
+            raise ValueError(f"Frame of {frame.shape[1]}x{frame.shape[0]} pixels does not match "
+                             f"the {self.size[0]}x{self.size[1]} encoder input")
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError(f"Encoder exited with status {self.process.wait()}") from None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        finally:
+            status = self.process.wait()
+        if status:
+            raise RuntimeError(f"Encoder exited with status {status}")
+
+
+class PngSink:
+    """Write frames as a numbered PNG sequence into a directory"""
+
+    masks = False
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+
+    def write(self, frame):
+        path = os.path.join(self.directory, f"frame_{self.count:06d}.png")
+        if not cv2.imwrite(path, frame, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]):
+            raise IOError(f"Could not write {path}")
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class MaskSink(PngSink):
+    """Write (H, W) uint8 class-index maps instead of annotated frames
+
+    Takes maps of results_to_class_map() (class id + 1, background 0) and
+    writes class ids with IGNORE_LABEL as background.
+    """
+
+    masks = True
+
+    # class id + 1 -> class id, 0 -> IGNORE_LABEL
+    _LUT = np.roll(np.arange(256, dtype=np.uint8), 1)
+    _LUT[0] = IGNORE_LABEL
+
+    def write(self, frame):
+        super().write(cv2.LUT(frame, self._LUT))
+
+
+class NullSink:
+    """Discard all frames"""
+
+    masks = False
+
+    def write(self, frame):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_sink(kind, path, fps, size, command=ENCODER_COMMAND):
+    """Create a sink of one of SINKS for (width, height) frames at fps"""
+    if kind == 'video':
+        return VideoWriterSink(path, fps, size)
+    if kind == 'pipe':
+        return PipeSink(path, fps, size, command)
+    if kind == 'png':
+        return PngSink(path)
+    if kind == 'masks':
+        return MaskSink(path)
+    if kind == 'null':
+        return NullSink()
+    raise ValueError(f"Unknown sink {kind!r}, expected one of {', '.join(SINKS)}")
+
+
+class AsyncSink:
+    """Run a sink on its own thread behind a bounded queue
+
+    write() blocks while ``queue_size`` frames are waiting. A failure of
+    the sink is raised by the next write() or by close(); the queue is
+    still drained, so the producer never blocks on a dead sink. Time spent
+    in the sink is recorded as the 'encode' stage of ``timer``.
+    """
+
+    def __init__(self, sink, queue_size=8, timer=None):
+        self.sink = sink
+        self.masks = sink.masks
+        self.timer = timer
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.errors = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is _END:
+                    break
+                if self.errors:
+                    continue
+                try:
+                    if self.timer is None:
+                        self.sink.write(frame)
+                    else:
+                        with self.timer.measure('encode'):
+                            self.sink.write(frame)
+                except Exception as e:
+                    self.errors.append(e)
+        finally:
+            try:
+                self.sink.close()
+            except Exception as e:
+                self.errors.append(e)
+
+    def write(self, frame):
+        if self.errors:
+            raise self.errors[0]
+        self.queue.put(frame)
+
+    def close(self):
+        """Flush the queue, close the sink and raise its first error"""
+        if self.thread.is_alive():
+            self.queue.put(_END)
+            self.thread.join()
+        if self.errors:
+            raise self.errors[0]
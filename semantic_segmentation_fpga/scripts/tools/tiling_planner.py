@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Tiling and Line-Buffer Planner for a Streaming Datapath
+
+segmentation_processor.v keeps every feature map as a full-frame register
+array (encoder_stage1 alone is 112x112x64 16-bit words), which is far
+beyond the M10K memory of the Cyclone V. This script plans the streaming
+alternative: each layer's feature maps stay in SDRAM and the layer
+processes its output in tiles of
+
+    tile_width x tile_height pixels x tile_channels output channels
+
+with on-chip buffers for the input rows of one tile (tile_height +
+taps - 1 rows of tile_width + taps - 1 columns, all input channels: the
+line buffers), the weights of one output-channel group and the pooled
+outputs of one tile. A layer either keeps its input tile while it walks
+the channel groups (weights are re-read per tile) or keeps one weight
+group while it walks the tiles (inputs are re-read per group),
+whichever moves fewer bytes.
+
+For every layer the planner picks the tile that moves the fewest SDRAM
+bytes within a budget of M10K blocks. ``sequential`` plans share the
+budget between layers that run one after another, as the processor's
+FSM does; ``pipelined`` plans keep all layers resident at once for a
+layer-streaming pipeline and spend the budget where it saves the most
+traffic per block. Decoder inputs are upsampled on chip, so only the
+low-resolution rows are fetched; skip inputs are read at the stage's
+output size, as CONCAT indexes them.
+
+The schedule is written as Verilog localparams (``--output``), and the
+SDRAM time per layer uses the effective bandwidth of sdram_model.py.
+"""
+
+import sys
+import json
+import math
+import argparse
+from collections import namedtuple
+
+from performance_model import RTL_DIR, load_rtl_config
+from quantization_sweep import DEVICE_M10K_BLOCKS, M10K_BITS
+from sdram_model import SdramGeometry, sequential_trace, simulate, timing_cycles
+
+# Feature-map words and weights as stored by the RTL
+ACTIVATION_BITS = 16
+WEIGHT_BITS = 8
+
+# (depth, width) configurations of one M10K block
+M10K_CONFIGS = [(8192, 1), (4096, 2), (2048, 4), (1024, 8), (1024, 10), (512, 16), (512, 20),
+                (256, 32), (256, 40)]
+
+SCHEDULES = ['sequential', 'pipelined']
+
+# sources: [(channels, upsampled)]; width/height are the conv output size
+Layer = namedtuple('Layer', ['name', 'width', 'height', 'sources', 'out_ch', 'taps', 'pool'])
+Plan = namedtuple('Plan', ['layer', 'tile_width', 'tile_height', 'tile_channels', 'line_depth',
+                           'weight_stationary', 'blocks', 'input_bytes', 'weight_bytes',
+                           'output_bytes', 'traffic_bytes'])
+
+def network_layers(config):
+    """Convolution layers of the network, as segmentation_processor.v runs them"""
+    width, height = config['width'], config['height']
+    c1, c2, c3 = config['encoder_channels']
+    return [
+        Layer('encoder_stage1', width, height, [(config['channels'], False)], c1, 3, True),
+        Layer('encoder_stage2', width // 2, height // 2, [(c1, False)], c2, 3, True),
+        Layer('encoder_stage3', width // 4, height // 4, [(c2, False)], c3, 3, True),
+        Layer('decoder_stage1', width // 4, height // 4, [(c3, True), (c3, False)], c2, 3, False),
+        Layer('decoder_stage2', width // 2, height // 2, [(c2, True), (c2, False)], c1, 3, False),
+        Layer('decoder_stage3', width, height, [(c1, True), (c1, False)],
+              config['num_classes'], 1, False),
+    ]
+
+def m10k_blocks(depth, width):
+    """M10K blocks of a memory of ``depth`` words of ``width`` bits"""
+    if depth <= 0 or width <= 0:
+        return 0
+    return min(math.ceil(width / w) * math.ceil(depth / d) for d, w in M10K_CONFIGS)
+
+def _fetched(length, tile, taps, upsampled):
+    """(total, largest) source lines fetched along one axis over all tiles
+
+    ``length`` is the conv output extent; an upsampled source has half as
+    many lines and is repeated on chip.
+    """
+    pad = taps // 2
+    last = (length // 2 if upsampled else length) - 1
+    total = largest = 0
+    for start in range(0, length, tile):
+        end = min(start + tile, length) - 1
+        low, high = start - pad, end + pad
+        if upsampled:
+            low, high = low // 2, high // 2
+        span = min(high, last) - max(low, 0) + 1
+        total += span
+        largest = max(largest, span)
+    return total, largest
+
+def plan_layer(layer, tile_width, tile_height, tile_channels, double_buffer=False):
+    """Plan of one layer for a tile size, with the cheaper of the two loop orders"""
+    tiles = math.ceil(layer.width / tile_width) * math.ceil(layer.height / tile_height)
+    groups = math.ceil(layer.out_ch / tile_channels)
+    in_ch = sum(channels for channels, _ in layer.sources)
+    buffers = 2 if double_buffer else 1
+
+    input_bytes, blocks = 0, 0
+    line_depth = tile_height + layer.taps - 1
+    for channels, upsampled in layer.sources:
+        rows, max_rows = _fetched(layer.height, tile_height, layer.taps, upsampled)
+        columns, max_columns = _fetched(layer.width, tile_width, layer.taps, upsampled)
+        input_bytes += rows * columns * channels * ACTIVATION_BITS // 8
+        # One memory per buffered line, so all kernel rows are read in the same cycle
+        blocks += buffers * max_rows * m10k_blocks(max_columns * channels, ACTIVATION_BITS)
+
+    kernel = in_ch * layer.taps * layer.taps
+    blocks += m10k_blocks(tile_channels * kernel, WEIGHT_BITS)
+    blocks += m10k_blocks(tile_channels, ACTIVATION_BITS)
+    weight_bytes = layer.out_ch * (kernel * WEIGHT_BITS + ACTIVATION_BITS) // 8
+
+    scale = 2 if layer.pool else 1
+    outputs = (tile_width // scale) * (tile_height // scale) * tile_channels
+    blocks += buffers * m10k_blocks(outputs, ACTIVATION_BITS)
+    output_bytes = (layer.width // scale) * (layer.height // scale) * layer.out_ch * ACTIVATION_BITS // 8
+
+    # Input-stationary: inputs once, weights per tile unless one group holds them all
+    input_stationary = input_bytes + weight_bytes * (tiles if groups > 1 else 1)
+    # Weight-stationary: weights once, inputs per group unless one tile covers the map
+    weight_stationary = weight_bytes + input_bytes * (groups if tiles > 1 else 1)
+    if weight_stationary < input_stationary:
+        return Plan(layer.name, tile_width, tile_height, tile_channels, line_depth, True, blocks,
+                    input_bytes * (groups if tiles > 1 else 1), weight_bytes, output_bytes,
+                    weight_stationary + output_bytes)
+    return Plan(layer.name, tile_width, tile_height, tile_channels, line_depth, False, blocks,
+                input_bytes, weight_bytes * (tiles if groups > 1 else 1), output_bytes,
+                input_stationary + output_bytes)
+
+def _candidates(extent, minimum=1):
+    sizes = {extent}
+    size = minimum
+    while size < extent:
+        sizes.add(size)
+        size *= 2
+    return sorted(sizes)
+
+def layer_plans(layer, double_buffer=False):
+    """Pareto-optimal plans of a layer: fewer blocks always means more traffic"""
+    step = 2 if layer.pool else 1
+    plans = [plan_layer(layer, width, height, channels, double_buffer)
+             for width in _candidates(layer.width, max(step, 8)) if width % step == 0
+             for height in _candidates(layer.height, step) if height % step == 0
+             for channels in _candidates(layer.out_ch)]
+    plans.sort(key=lambda plan: (plan.blocks, plan.traffic_bytes))
+    frontier = []
+    for plan in plans:
+        if not frontier or plan.traffic_bytes < frontier[-1].traffic_bytes:
+            frontier.append(plan)
+    return frontier
+
+def plan_network(layers, budget, schedule='sequential', double_buffer=False):
+    """One Plan per layer within ``budget`` M10K blocks; raises ValueError if none fits"""
+    frontiers = [layer_plans(layer, double_buffer) for layer in layers]
+    for layer, frontier in zip(layers, frontiers):
+        if frontier[0].blocks > budget:
+            raise ValueError(f"{layer.name} needs at least {frontier[0].blocks} M10K blocks")
+
+    if schedule == 'sequential':
+        return [[plan for plan in frontier if plan.blocks <= budget][-1] for frontier in frontiers]
+
+    chosen = [0] * len(layers)
+    used = sum(frontier[0].blocks for frontier in frontiers)
+    if used > budget:
+        raise ValueError(f"All layers resident need at least {used} M10K blocks")
+    # Greedy upgrades by traffic saved per extra block
+    while True:
+        best = None
+        for i, frontier in enumerate(frontiers):
+            current = frontier[chosen[i]]
+            for j in range(chosen[i] + 1, len(frontier)):
+                extra = frontier[j].blocks - current.blocks
+                if used + extra > budget:
+                    break
+                gain = (current.traffic_bytes - frontier[j].traffic_bytes) / max(extra, 1)
+                if best is None or gain > best[0]:
+                    best = (gain, i, j, extra)
+        if best is None:
+            return [frontier[index] for frontier, index in zip(frontiers, chosen)]
+        _, i, j, extra = best
+        chosen[i] = j
+        used += extra
+
+def full_frame_blocks(config):
+    """M10K blocks of the full-frame arrays declared in segmentation_processor.v"""
+    width, height, channels = config['width'], config['height'], config['channels']
+    c1, c2, c3 = config['encoder_channels']
+    pixels = width * height
+    arrays = {
+        'input_buffer': (pixels * channels, 8),
+        'scaled_input': (pixels * channels, 16),
+        'encoder_stage1': (pixels // 4 * c1, 16),
+        'encoder_stage2': (pixels // 16 * c2, 16),
+        'encoder_stage3': (pixels // 64 * c3, 16),
+        'bottleneck': (pixels // 64 * c3, 16),
+        'decoder_stage1': (pixels // 16 * c2, 16),
+        'decoder_stage2': (pixels // 4 * c1, 16),
+        'logits': (pixels * config['num_classes'], 16),
+        'output_buffer': (pixels, 8),
+    }
+    return {name: m10k_blocks(depth, bits) for name, (depth, bits) in arrays.items()}
+
+def sdram_bandwidth(clock_hz, burst_len):
+    """Effective bytes per second of long sequential bursts (sdram_model.py defaults)"""
+    timing = timing_cycles(clock_hz)
+    geometry = SdramGeometry(4, 1024, 4)
+    stats = simulate(sequential_trace(1 << 18, burst_len), timing, geometry, overhead=0,
+                     pipelined=True)
+    return stats['useful_bytes'] / stats['cycles'] * clock_hz
+
+def write_parameters(plans, path, schedule, budget):
+    """Write the tile schedule as Verilog localparams"""
+    lines = [f"// Generated by tiling_planner.py: {schedule} schedule, "
+             f"{budget} M10K blocks",
+             "// layer            tile (w x h x ch)   lines  order    M10K  SDRAM bytes"]
+    for plan in plans:
+        order = 'weight' if plan.weight_stationary else 'input'
+        tile = f"{plan.tile_width} x {plan.tile_height} x {plan.tile_channels}"
+        lines.append(f"// {plan.layer:<16} {tile:<19} {plan.line_depth:>5}  {order:<7} "
+                     f"{plan.blocks:>5}  {plan.traffic_bytes}")
+    for plan in plans:
+        prefix = plan.layer.upper()
+        lines += [f"localparam {prefix}_TILE_WIDTH = {plan.tile_width};",
+                  f"localparam {prefix}_TILE_HEIGHT = {plan.tile_height};",
+                  f"localparam {prefix}_TILE_CHANNELS = {plan.tile_channels};",
+                  f"localparam {prefix}_LINE_BUFFER_DEPTH = {plan.line_depth};",
+                  f"localparam {prefix}_WEIGHT_STATIONARY = {int(plan.weight_stationary)};"]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Choose per-layer tiles and line buffers under an M10K budget')
+
+    parser.add_argument('--rtl-dir', default=RTL_DIR, help='RTL source directory (default: hdl/rtl)')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help='Override the frame size from the RTL')
+    parser.add_argument('--budget', type=int, default=DEVICE_M10K_BLOCKS,
+                        help=f'M10K blocks available (default: {DEVICE_M10K_BLOCKS}, 5CSXFC6)')
+    parser.add_argument('--reserve', type=int, default=0,
+                        help='M10K blocks kept for the rest of the design (default: 0)')
+    parser.add_argument('--schedule', choices=SCHEDULES, default='sequential',
+                        help='Layers one at a time sharing the budget, or all resident '
+                             '(default: sequential)')
+    parser.add_argument('--double-buffer', action='store_true',
+                        help='Double the input and output buffers to overlap transfers and compute')
+    parser.add_argument('--burst-len', type=int, default=8,
+                        help='SDRAM burst length in words for the transfer times (default: 8)')
+    parser.add_argument('--mac-units', type=int, default=None,
+                        help='Also estimate compute cycles with this many MACs per cycle')
+    parser.add_argument('--output', help='Write the schedule as Verilog localparams here')
+    parser.add_argument('--json', help='Write the plans as JSON here')
+
+    args = parser.parse_args()
+
+    try:
+        config = load_rtl_config(args.rtl_dir)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Error processing {args.rtl_dir}: {e}")
+        sys.exit(1)
+    if args.size:
+        config['width'], config['height'] = args.size
+
+    budget = args.budget - args.reserve
+    layers = network_layers(config)
+    try:
+        plans = plan_network(layers, budget, args.schedule, args.double_buffer)
+    except ValueError as e:
+        print(f"Error: no plan fits in {budget} M10K blocks: {e}")
+        sys.exit(1)
+
+    clock_hz = config['sys_clock_hz']
+    bandwidth = sdram_bandwidth(clock_hz, args.burst_len)
+    full_frame = sum(full_frame_blocks(config).values())
+    print(f"Full-frame arrays of segmentation_processor.v: {full_frame:,} M10K blocks "
+          f"({full_frame * M10K_BITS / 8e6:.1f} MB); budget {budget} blocks")
+    print(f"{'layer':<16}{'tile':>16}{'lines':>7}{'order':>8}{'M10K':>6}"
+          f"{'input MB':>10}{'weight MB':>11}{'output MB':>11}{'SDRAM ms':>10}"
+          + (f"{'compute ms':>12}" if args.mac_units else ''))
+
+    transfer_ms, compute_ms = [], []
+    for layer, plan in zip(layers, plans):
+        transfer_ms.append(plan.traffic_bytes / bandwidth * 1e3)
+        compute = ''
+        if args.mac_units:
+            in_ch = sum(channels for channels, _ in layer.sources)
+            macs = layer.width * layer.height * in_ch * layer.out_ch * layer.taps * layer.taps
+            compute_ms.append(macs / args.mac_units / clock_hz * 1e3)
+            compute = f"{compute_ms[-1]:>12.3f}"
+        tile = f"{plan.tile_width}x{plan.tile_height}x{plan.tile_channels}"
+        print(f"{plan.layer:<16}{tile:>16}{plan.line_depth:>7}"
+              f"{'weight' if plan.weight_stationary else 'input':>8}{plan.blocks:>6}"
+              f"{plan.input_bytes / 1e6:>10.3f}{plan.weight_bytes / 1e6:>11.3f}"
+              f"{plan.output_bytes / 1e6:>11.3f}{transfer_ms[-1]:>10.3f}{compute}")
+
+    # All layers share the one SDRAM; compute overlaps transfers only with double buffers
+    if not compute_ms:
+        frame_ms = sum(transfer_ms)
+    elif args.schedule == 'pipelined':
+        frame_ms = max(sum(transfer_ms), max(compute_ms))
+    elif args.double_buffer:
+        frame_ms = sum(map(max, transfer_ms, compute_ms))
+    else:
+        frame_ms = sum(transfer_ms) + sum(compute_ms)
+    total_bytes = sum(plan.traffic_bytes for plan in plans)
+    blocks = (sum(plan.blocks for plan in plans) if args.schedule == 'pipelined'
+              else max(plan.blocks for plan in plans))
+    print(f"{blocks} of {budget} M10K blocks, {total_bytes / 1e6:.2f} MB of SDRAM traffic per frame "
+          f"at {bandwidth / 1e6:.0f} MB/s: {frame_ms:.2f} ms per frame"
+          f"{'' if compute_ms else ' of transfers'}")
+
+    if args.output:
+        write_parameters(plans, args.output, args.schedule, budget)
+        print(f"Wrote {args.output}")
+    if args.json:
+        report = {'config': {k: v for k, v in config.items() if k != 'states'},
+                  'schedule': args.schedule, 'budget_blocks': budget, 'used_blocks': blocks,
+                  'double_buffer': args.double_buffer, 'bandwidth_bytes_s': bandwidth,
+                  'full_frame_blocks': full_frame_blocks(config),
+                  'plans': [plan._asdict() for plan in plans],
+                  'traffic_bytes': total_bytes, 'frame_ms': frame_ms}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Video to SDRAM Frame Stream Converter
+
+Decodes a video with OpenCV, letterboxes every frame exactly like
+cityscapes_data_converter.resize_image(), packs it into SDRAM words and
+appends it to a packed frame stream (see packed_dataset.py).
+
+Decode, resize/pack and write run as a pipeline connected by bounded
+queues, so memory use is limited to a few frames in flight regardless of
+the video length.
+"""
+
+import sys
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from cityscapes_data_converter import (RESAMPLE_FILTERS, RESIZE_BACKENDS, WORD_DTYPES,
+                                       letterbox_into, convert_to_binary)
+from packed_dataset import PackedDatasetWriter
+
+# Marks the end of a queue's stream
+_END = object()
+
+# Per-thread letterbox buffers for pack_frame()
+_thread_state = threading.local()
+
+def read_frames(cap, frame_queue, stop, max_frames=None, stride=1):
+    """Decode frames from an open cv2.VideoCapture into a bounded queue
+
+    Every ``stride``-th frame is queued as (frame_number, BGR array) until
+    the video ends or ``stop`` is set. The end marker is always queued, even
+    if decoding fails.
+    """
+    try:
+        frame_number = 0
+        queued = 0
+        while (max_frames is None or queued < max_frames) and not stop.is_set():
+            if frame_number % stride:
+                # grab() skips the decode-to-BGR step for dropped frames
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_queue.put((frame_number, frame))
+                queued += 1
+            frame_number += 1
+    finally:
+        frame_queue.put(_END)
+
+def pack_frame(frame, target_size, resample, word_bytes, byteorder, backend='pil'):
+    """Letterbox one BGR frame and pack it into SDRAM words
+
+    Each pipeline thread letterboxes into its own reusable buffer; only the
+    packed words handed to the writer are copied out.
+    """
+    buffer = getattr(_thread_state, 'buffer', None)
+    if buffer is None or buffer.shape[:2] != (target_size[1], target_size[0]):
+        buffer = _thread_state.buffer = np.empty((target_size[1], target_size[0], 3),
+                                                 dtype=np.uint8)
+    letterbox_into(frame, buffer, resample, backend, channel_order='bgr')
+    return convert_to_binary(buffer, word_bytes, byteorder).copy()
+
+def write_frames(writer, packed_queue, errors):
+    """Append packed frames from a queue to a PackedDatasetWriter until the end marker
+
+    A write error is recorded in ``errors`` and the rest of the queue is
+    drained, so the producer never blocks on a dead writer.
+    """
+    while True:
+        item = packed_queue.get()
+        if item is _END:
+            break
+        if not errors:
+            try:
+                writer.append(item)
+            except Exception as e:
+                errors.append(e)
+
+def convert_video(video_path, output_file, target_size=(224, 224), resample='lanczos',
+                  word_bytes=4, byteorder='little', max_frames=None, stride=1,
+                  threads=2, queue_depth=8, backend='pil'):
+    """Convert a video into a packed frame stream and return (frames, seconds)
+
+    ``threads`` frames are letterboxed and packed concurrently (OpenCV and
+    PIL release the GIL while decoding and resizing); results are written
+    in frame order. At most ``queue_depth`` frames wait in each queue.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+
+    frame_queue = queue.Queue(maxsize=queue_depth)
+    packed_queue = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    write_errors = []
+    frame_shape = (target_size[1], target_size[0], 3)
+    count = 0
+    start_time = time.perf_counter()
+
+    with PackedDatasetWriter(output_file, frame_shape, word_bytes, byteorder) as writer:
+        reader = threading.Thread(target=read_frames,
+                                  args=(cap, frame_queue, stop, max_frames, stride),
+                                  daemon=True)
+        output = threading.Thread(target=write_frames,
+                                  args=(writer, packed_queue, write_errors), daemon=True)
+        reader.start()
+        output.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                # Futures are kept in submission order, so frames leave in order
+                pending = deque()
+                while True:
+                    item = frame_queue.get()
+                    if item is _END:
+                        break
+                    _, frame = item
+                    pending.append(executor.submit(pack_frame, frame, target_size, resample,
+                                                   word_bytes, byteorder, backend))
+                    if len(pending) >= threads:
+                        packed_queue.put(pending.popleft().result())
+                        count += 1
+                while pending:
+                    packed_queue.put(pending.popleft().result())
+                    count += 1
+        finally:
+            packed_queue.put(_END)
+            output.join()
+            # Unblock the reader if the pipeline stopped early
+            stop.set()
+            while reader.is_alive():
+                try:
+                    frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            cap.release()
+
+        if write_errors:
+            raise write_errors[0]
+
+    return count, time.perf_counter() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert a video into a packed SDRAM frame stream')
+
+    parser.add_argument('input', help='Input video file')
+    parser.add_argument('output', help='Output packed frame stream')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'), help='Target frame size (default: 224 224)')
+    parser.add_argument('--resample', choices=sorted(RESAMPLE_FILTERS), default='lanczos',
+                        help='Resampling filter for the resize step (default: lanczos)')
+    parser.add_argument('--backend', choices=RESIZE_BACKENDS, default='pil',
+                        help='Resize implementation: PIL or OpenCV (default: pil)')
+    parser.add_argument('--word-bytes', type=int, choices=sorted(WORD_DTYPES), default=4,
+                        help='SDRAM word size in bytes (default: 4)')
+    parser.add_argument('--byteorder', choices=['little', 'big'], default='little',
+                        help='Byte order inside each SDRAM word (default: little)')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='Stop after this many output frames')
+    parser.add_argument('--stride', type=int, default=1,
+                        help='Keep every N-th frame of the video (default: 1)')
+    parser.add_argument('--threads', type=int, default=2,
+                        help='Frames resized and packed concurrently (default: 2)')
+    parser.add_argument('--queue-depth', type=int, default=8,
+                        help='Maximum frames waiting between pipeline stages (default: 8)')
+
+    args = parser.parse_args()
+
+    try:
+        count, elapsed = convert_video(args.input, args.output, tuple(args.size), args.resample,
+                                       args.word_bytes, args.byteorder, args.max_frames,
+                                       max(1, args.stride), max(1, args.threads),
+                                       max(1, args.queue_depth), args.backend)
+    except Exception as e:
+        print(f"Error processing {args.input}: {e}")
+        sys.exit(1)
+
+    fps = count / elapsed if elapsed > 0 else 0.0
+    print(f"Processed: {args.input} -> {args.output} ({count} frames, "
+          f"{elapsed:.2f}s, {fps:.1f} FPS)")
+
+if __name__ == "__main__":
+    main()
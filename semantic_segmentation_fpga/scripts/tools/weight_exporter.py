@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Trained Weight Exporter for the FPGA Segmentation Network
+
+Quantizes the convolution layers of a PyTorch checkpoint (an Ultralytics
+model such as main.py's last.pt, or a plain U-Net state_dict) and writes
+them as $readmemh images laid out like the RTL memories:
+
+    kernel[in_ch][k][out_ch]   (k = kh * 3 + kw)
+    bias[out_ch]
+
+Weights are int8 with a power-of-two scale per layer, so requantization
+is a plain shift. The int8 bias is added at the accumulator scale, so the
+weight scale of a layer is lowered until its biases fit; a layer whose
+biases would need so coarse a scale that most weights round to zero is
+rejected. Activations are Q8.8 by default; with a calibration set
+the number of fractional bits of each layer's input and output is
+reduced where the observed range would overflow 16 bits. BatchNorm layers
+directly following a convolution are folded into its weights and bias,
+with the eps of the BatchNorm module (``--bn-eps`` for bare state_dicts).
+
+The checkpoint is memory-mapped where PyTorch supports it, and layers are
+converted and written one at a time, so only one layer's float and
+quantized copies exist next to the checkpoint at any point. The model is
+only converted to float as a whole when calibration runs it.
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import torch
+
+from cityscapes_data_converter import find_images, resize_image, save_memory_file
+from golden_model import LAYERS, layer_shapes
+
+# Fractional bits of Q8.8 activations
+ACTIVATION_FRAC_BITS = 8
+
+MANIFEST_NAME = 'quantization.json'
+
+# BatchNorm eps of checkpoints without modules (PyTorch's default)
+BN_EPS = 1e-5
+
+# Fraction of a layer's biases allowed to saturate at int8
+MAX_BIAS_CLIPPED = 0.01
+
+# A layer is unrepresentable if fitting its biases rounds more than this
+# fraction of its nonzero weights to zero
+MAX_ZEROED_WEIGHTS = 0.5
+
+# (kh, kw) of each RTL layer; decoder_stage3 only uses kernel tap 0
+RTL_KERNEL_SIZES = {name: (1, 1) if name == 'decoder_stage3' else (3, 3) for name in LAYERS}
+
+def load_checkpoint(path):
+    """Load a checkpoint on the CPU, memory-mapped where possible"""
+    try:
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=False)
+    except (TypeError, RuntimeError):
+        # Older PyTorch or a legacy (non-zip) checkpoint: no memory mapping
+        return torch.load(path, map_location='cpu', weights_only=False)
+
+def checkpoint_model(checkpoint):
+    """Return (module or None, state_dict) from an Ultralytics or plain checkpoint
+
+    Tensors are returned as stored (e.g. fp16 and memory-mapped); nothing is
+    converted here.
+    """
+    if isinstance(checkpoint, torch.nn.Module):
+        return checkpoint, checkpoint.state_dict()
+    if isinstance(checkpoint, dict):
+        # Ultralytics stores the EMA and raw models as pickled modules
+        for key in ('ema', 'model'):
+            if isinstance(checkpoint.get(key), torch.nn.Module):
+                module = checkpoint[key].eval()
+                return module, module.state_dict()
+        for key in ('state_dict', 'model_state_dict', 'model'):
+            if isinstance(checkpoint.get(key), dict):
+                return None, checkpoint[key]
+        return None, checkpoint
+    raise ValueError(f"Unsupported checkpoint type: {type(checkpoint).__name__}")
+
+def batchnorm_pairs(module):
+    """{conv name: BatchNorm name} of Conv2d modules directly followed by a BatchNorm2d sibling"""
+    pairs = {}
+    for parent_name, parent in module.named_modules():
+        prefix = f"{parent_name}." if parent_name else ''
+        children = list(parent.named_children())
+        for (conv_name, conv), (norm_name, norm) in zip(children, children[1:]):
+            if (isinstance(conv, torch.nn.Conv2d) and
+                    isinstance(norm, (torch.nn.BatchNorm2d, torch.nn.SyncBatchNorm))):
+                pairs[prefix + conv_name] = prefix + norm_name
+    return pairs
+
+def conv_layers(state_dict, pairs=None):
+    """Yield (name, weight, bias, batchnorm prefix or None) for each conv layer
+
+    Layers come in state_dict order. BatchNorms are taken from ``pairs``
+    (see batchnorm_pairs()) when the checkpoint has modules. For a bare
+    state_dict a BatchNorm is recognized as the next module in state_dict
+    order having running statistics, as in Conv-BN blocks.
+    """
+    prefixes = list(dict.fromkeys(key.rpartition('.')[0] for key in state_dict))
+    for i, prefix in enumerate(prefixes):
+        weight = state_dict.get(f"{prefix}.weight")
+        if weight is None or weight.ndim != 4:
+            continue
+        if pairs is None:
+            batchnorm = prefixes[i + 1] if i + 1 < len(prefixes) else None
+        else:
+            batchnorm = pairs.get(prefix)
+        if f"{batchnorm}.running_mean" not in state_dict:
+            # Without running statistics (or a BatchNorm) there is nothing to fold
+            batchnorm = None
+        yield prefix, weight, state_dict.get(f"{prefix}.bias"), batchnorm
+
+def _numpy(tensor):
+    return tensor.detach().to(torch.float32).cpu().numpy()
+
+def fold_batchnorm(weight, bias, state_dict, prefix, eps=BN_EPS):
+    """Fold BatchNorm statistics into float conv weights and bias
+
+    A BatchNorm without affine parameters (affine=False) scales by 1 and
+    shifts by 0.
+    """
+    mean = _numpy(state_dict[f"{prefix}.running_mean"])
+    var = _numpy(state_dict[f"{prefix}.running_var"])
+    gamma = state_dict.get(f"{prefix}.weight")
+    gamma = np.ones_like(mean) if gamma is None else _numpy(gamma)
+    beta = state_dict.get(f"{prefix}.bias")
+    beta = np.zeros_like(mean) if beta is None else _numpy(beta)
+    factor = gamma / np.sqrt(var + eps)
+    if bias is None:
+        bias = np.zeros_like(mean)
+    return weight * factor[:, None, None, None], beta + (bias - mean) * factor
+
+def frac_bits(max_abs, total_bits=8, limit=None):
+    """Largest number of fractional bits that keeps max_abs inside a signed total_bits value"""
+    if max_abs <= 0:
+        return limit if limit is not None else total_bits - 1
+    bits = int(np.floor(np.log2((2 ** (total_bits - 1) - 1) / max_abs)))
+    return bits if limit is None else min(bits, limit)
+
+def _bias_clipped(bias, acc_frac):
+    """Biases rounded at the accumulator scale, and how many fall outside int8"""
+    scaled = np.round(bias * 2.0 ** acc_frac)
+    return scaled, int(np.count_nonzero((scaled < -128) | (scaled > 127)))
+
+def quantize_layer(weight, bias, in_frac=ACTIVATION_FRAC_BITS, out_frac=ACTIVATION_FRAC_BITS,
+                   taps=None, max_bias_clipped=MAX_BIAS_CLIPPED):
+    """Quantize one float conv layer (out_ch, in_ch, kh, kw) for the RTL
+
+    Returns (kernel[in_ch][k][out_ch] int8, bias[out_ch] int8, info). With
+    ``taps`` the kernel is zero-padded to that many taps per input channel,
+    e.g. 9 for a 1x1 layer stored in a 3x3 kernel memory.
+
+    The bias is added at the accumulator scale (input + weight fractional
+    bits), so the weight fractional bits are lowered until at most
+    ``max_bias_clipped`` of the biases saturate. Raises ValueError if that
+    rounds more than MAX_ZEROED_WEIGHTS of the nonzero weights to zero.
+    """
+    out_ch, in_ch = weight.shape[:2]
+    bias = np.zeros(out_ch, dtype=np.float32) if bias is None else bias
+    if not (np.all(np.isfinite(weight)) and np.all(np.isfinite(bias))):
+        raise ValueError("non-finite weights or biases")
+    best_frac = w_frac = frac_bits(np.abs(weight).max())
+    scaled, clipped = _bias_clipped(bias, in_frac + w_frac)
+    while clipped > max_bias_clipped * out_ch:
+        w_frac -= 1
+        scaled, clipped = _bias_clipped(bias, in_frac + w_frac)
+
+    quantized = np.clip(np.round(weight * 2.0 ** w_frac), -128, 127)
+    nonzero = np.count_nonzero(weight)
+    zeroed = np.count_nonzero((quantized == 0) & (weight != 0))
+    if nonzero and zeroed > MAX_ZEROED_WEIGHTS * nonzero:
+        raise ValueError(f"unrepresentable: biases up to {np.abs(bias).max():.3g} need "
+                         f"{w_frac} weight fractional bits (instead of {best_frac}) at "
+                         f"{in_frac} input fractional bits, which rounds "
+                         f"{zeroed}/{nonzero} weights to zero")
+    weight_error = float(np.abs(weight - quantized * 2.0 ** -w_frac).max())
+    kernel = quantized.astype(np.int8).reshape(out_ch, in_ch, -1).transpose(1, 2, 0)
+    if taps is not None and kernel.shape[1] < taps:
+        kernel = np.concatenate([kernel, np.zeros((in_ch, taps - kernel.shape[1], out_ch),
+                                                  dtype=np.int8)], axis=1)
+    acc_frac = in_frac + w_frac
+    bias_q = np.clip(scaled, -128, 127).astype(np.int8)
+
+    info = {
+        'shape': [in_ch, kernel.shape[1], out_ch],
+        'weight_frac_bits': w_frac,
+        'weight_frac_bits_lost': best_frac - w_frac,
+        'input_frac_bits': in_frac,
+        'output_frac_bits': out_frac,
+        'shift': acc_frac - out_frac,
+        'weight_max_abs': float(np.abs(weight).max()),
+        'weight_error': weight_error,
+        'weights_zeroed': int(zeroed),
+        'bias_clipped': clipped,
+    }
+    return kernel, bias_q, info
+
+def calibrate(module, state_dict, images, size=(224, 224), resample='lanczos'):
+    """Record max |input| and max |output| of every conv layer over sample images
+
+    The output of a conv followed by BatchNorm is taken after the
+    BatchNorm, matching the folded layer. Images are fed one at a time as
+    RGB scaled to 0..1, as Ultralytics models expect.
+    """
+    modules = dict(module.named_modules())
+    ranges = {}
+    hooks = []
+
+    def record(name, index):
+        def hook(_module, inputs, output):
+            tensor = inputs[0] if index == 0 else output
+            value = float(tensor.detach().abs().max())
+            entry = ranges.setdefault(name, [0.0, 0.0])
+            entry[index] = max(entry[index], value)
+        return hook
+
+    for name, _, _, batchnorm in conv_layers(state_dict, batchnorm_pairs(module)):
+        if name in modules:
+            hooks.append(modules[name].register_forward_hook(record(name, 0)))
+            output_module = modules.get(batchnorm, modules[name])
+            hooks.append(output_module.register_forward_hook(record(name, 1)))
+
+    try:
+        with torch.no_grad():
+            for path in images:
+                image = resize_image(path, size, resample)
+                batch = torch.from_numpy(image).permute(2, 0, 1)[None].float() / 255.0
+                module(batch)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return ranges
+
+def export_weights(checkpoint_path, output_dir, layer_map=None, calibration_images=(),
+                   size=(224, 224), resample='lanczos', bn_eps=BN_EPS,
+                   max_bias_clipped=MAX_BIAS_CLIPPED):
+    """Quantize and write every conv layer (or only the mapped ones) to output_dir
+
+    ``layer_map`` maps RTL layer names (golden_model.LAYERS) to checkpoint
+    layer names; mapped layers are written under the RTL name, checked
+    against the RTL memory shape and kernel size and padded to 9 taps.
+    BatchNorm pairs and eps are taken from the modules if the checkpoint
+    has them, otherwise from state_dict order and ``bn_eps``. Layers whose
+    biases cannot be represented (see quantize_layer()) raise ValueError.
+    Returns the manifest.
+    """
+    module, state_dict = checkpoint_model(load_checkpoint(checkpoint_path))
+    ranges = {}
+    if calibration_images:
+        if module is None:
+            print("Warning: checkpoint has no model to run, skipping calibration")
+        else:
+            # The forward pass needs the whole model in float
+            module = module.float()
+            state_dict = module.state_dict()
+            ranges = calibrate(module, state_dict, calibration_images, size, resample)
+    modules = dict(module.named_modules()) if module is not None else {}
+    pairs = batchnorm_pairs(module) if module is not None else None
+
+    rtl_names = {source: target for target, source in (layer_map or {}).items()}
+    rtl_shapes = layer_shapes()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {'checkpoint': checkpoint_path, 'calibration_images': len(calibration_images),
+                'layers': {}}
+
+    for name, weight, bias, batchnorm in conv_layers(state_dict, pairs):
+        if layer_map and name not in rtl_names:
+            continue
+        output_name = rtl_names.get(name, name.replace('.', '_'))
+
+        # Only this layer is converted to float; the checkpoint tensors stay mapped
+        weight = _numpy(weight)
+        bias = None if bias is None else _numpy(bias)
+        eps = None
+        if batchnorm:
+            eps = float(getattr(modules.get(batchnorm), 'eps', bn_eps))
+            weight, bias = fold_batchnorm(weight, bias, state_dict, batchnorm, eps)
+
+        in_range, out_range = ranges.get(name, (0.0, 0.0))
+        in_frac = frac_bits(in_range, 16, ACTIVATION_FRAC_BITS)
+        out_frac = frac_bits(out_range, 16, ACTIVATION_FRAC_BITS)
+        if output_name in rtl_shapes:
+            kernel_size = tuple(weight.shape[2:])
+            if kernel_size != RTL_KERNEL_SIZES[output_name]:
+                raise ValueError(f"{name}: {kernel_size[0]}x{kernel_size[1]} kernel does not match "
+                                 f"RTL layer {output_name} "
+                                 f"({'x'.join(map(str, RTL_KERNEL_SIZES[output_name]))})")
+            if (weight.shape[1], weight.shape[0]) != rtl_shapes[output_name]:
+                raise ValueError(f"{name}: shape {weight.shape[1]}->{weight.shape[0]} channels "
+                                 f"does not match RTL layer {output_name} "
+                                 f"{rtl_shapes[output_name]}")
+        taps = 9 if output_name in rtl_shapes else None
+        try:
+            kernel, bias_q, info = quantize_layer(weight, bias, in_frac, out_frac, taps,
+                                                  max_bias_clipped)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from None
+
+        save_memory_file(kernel.view(np.uint8).ravel(),
+                         os.path.join(output_dir, f"{output_name}_kernel.memh"), 'readmemh')
+        save_memory_file(bias_q.view(np.uint8),
+                         os.path.join(output_dir, f"{output_name}_bias.memh"), 'readmemh')
+        info['source'] = name
+        info['batchnorm'] = batchnorm
+        info['batchnorm_eps'] = eps
+        manifest['layers'][output_name] = info
+        print(f"Exported: {name} -> {output_name} {info['shape']} "
+              f"(w frac {info['weight_frac_bits']}, shift {info['shift']})")
+        if info['weight_frac_bits_lost']:
+            print(f"Warning: {output_name}: weight scale lowered by "
+                  f"{info['weight_frac_bits_lost']} bits to fit the biases "
+                  f"({info['weights_zeroed']} weights rounded to zero)")
+        if info['bias_clipped']:
+            print(f"Warning: {output_name}: {info['bias_clipped']} biases clipped to int8")
+        del weight, bias, kernel, bias_q
+
+    missing = set(rtl_names) - {info['source'] for info in manifest['layers'].values()}
+    if missing:
+        raise ValueError(f"Layers not found in checkpoint: {', '.join(sorted(missing))}")
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def parse_layer_map(items):
+    """Parse RTL=CHECKPOINT_LAYER arguments into a dict"""
+    layer_map = {}
+    for item in items:
+        target, sep, source = item.partition('=')
+        if not sep or target not in LAYERS:
+            raise ValueError(f"Invalid layer mapping {item!r}, expected "
+                             f"<{'|'.join(LAYERS)}>=<checkpoint layer>")
+        layer_map[target] = source
+    return layer_map
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Quantize checkpoint conv weights into $readmemh files for the RTL')
+
+    parser.add_argument('checkpoint', help='PyTorch checkpoint (.pt/.pth)')
+    parser.add_argument('output_dir', help='Directory for the .memh files and the manifest')
+    parser.add_argument('--map', nargs='+', default=[], metavar='RTL=LAYER',
+                        help='Export only these layers under RTL names, '
+                             'e.g. encoder_stage1=model.0.conv')
+    parser.add_argument('--calibrate', metavar='DIR',
+                        help='Sample images used to calibrate activation ranges')
+    parser.add_argument('--samples', type=int, default=32,
+                        help='Number of calibration images (default: 32)')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224],
+                        metavar=('WIDTH', 'HEIGHT'), help='Calibration image size (default: 224 224)')
+    parser.add_argument('--max-bias-clipped', type=float, default=MAX_BIAS_CLIPPED,
+                        help=f'Fraction of biases per layer allowed to saturate at int8 before '
+                             f'the weight scale is lowered (default: {MAX_BIAS_CLIPPED:g})')
+    parser.add_argument('--bn-eps', type=float, default=BN_EPS,
+                        help=f'BatchNorm eps of state_dict checkpoints without modules '
+                             f'(default: {BN_EPS:g}); modules use their own eps')
+
+    args = parser.parse_args()
+
+    try:
+        layer_map = parse_layer_map(args.map)
+        images = []
+        if args.calibrate:
+            images = [path for path, _ in find_images(args.calibrate, args.calibrate)][:args.samples]
+        manifest = export_weights(args.checkpoint, args.output_dir, layer_map, images,
+                                  tuple(args.size), bn_eps=args.bn_eps,
+                                  max_bias_clipped=args.max_bias_clipped)
+    except Exception as e:
+        print(f"Error processing {args.checkpoint}: {e}")
+        sys.exit(1)
+
+    print(f"Processed: {args.checkpoint} -> {args.output_dir} "
+          f"({len(manifest['layers'])} layers)")
+
+if __name__ == "__main__":
+    main()